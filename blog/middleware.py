@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.db.models import F
 
 from .models import SiteStat
@@ -8,15 +9,35 @@ from .models import SiteStat
 class SiteStatsMiddleware:
     """Very lightweight visitor counting.
 
-    Counts a "visitor" once per session.
+    Counts a "visitor" once per session. Async-capable, so async views under
+    ASGI don't pay a thread hop for paths that are never counted.
     """
 
     SESSION_FLAG = "uzwire_counted_visitor"
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        if self._should_count(request):
+            self._count(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self._should_count(request):
+            await sync_to_async(self._count)(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def _should_count(request) -> bool:
         path = getattr(request, "path", "") or ""
 
         should_count = True
@@ -30,16 +51,15 @@ class SiteStatsMiddleware:
             should_count = False
         elif path.startswith("/robots.txt") or path.startswith("/sitemap.xml"):
             should_count = False
+        return should_count
 
-        if should_count:
-            try:
-                session = request.session
-                if not session.get(self.SESSION_FLAG):
-                    SiteStat.objects.get_or_create(key="visitors")
-                    SiteStat.objects.filter(key="visitors").update(value=F("value") + 1)
-                    session[self.SESSION_FLAG] = True
-            except Exception:
-                # Never block the request for stats.
-                pass
-
-        return self.get_response(request)
+    def _count(self, request) -> None:
+        try:
+            session = request.session
+            if not session.get(self.SESSION_FLAG):
+                SiteStat.objects.get_or_create(key="visitors")
+                SiteStat.objects.filter(key="visitors").update(value=F("value") + 1)
+                session[self.SESSION_FLAG] = True
+        except Exception:
+            # Never block the request for stats.
+            pass
@@ -1,6 +1,15 @@
 from django.db import migrations, models
 
 
+def drop_stale_sitestat(apps, schema_editor):
+	# Clears a leftover table/sequence from an earlier Postgres deployment;
+	# CASCADE is Postgres-only and other backends never had them.
+	if schema_editor.connection.vendor != "postgresql":
+		return
+	schema_editor.execute("DROP TABLE IF EXISTS blog_sitestat CASCADE;")
+	schema_editor.execute("DROP SEQUENCE IF EXISTS blog_sitestat_id_seq CASCADE;")
+
+
 class Migration(migrations.Migration):
 
 	dependencies = [
@@ -8,13 +17,7 @@ class Migration(migrations.Migration):
 	]
 
 	operations = [
-		migrations.RunSQL(
-			sql=(
-				"DROP TABLE IF EXISTS blog_sitestat CASCADE;"
-				"DROP SEQUENCE IF EXISTS blog_sitestat_id_seq CASCADE;"
-			),
-			reverse_sql=migrations.RunSQL.noop,
-		),
+		migrations.RunPython(drop_stale_sitestat, migrations.RunPython.noop),
 		migrations.CreateModel(
 			name="SiteStat",
 			fields=[
@@ -7,8 +7,7 @@ from .models import BlogPost
 from .models import SiteStat
 from billing.models import Account
 from news.services import fetch_news
-from markets.models import MarketLatest
-from markets.services import get_market_snapshot
+from markets.services import get_market_snapshot, ticker_latest
 
 
 def home(request):
@@ -22,7 +21,7 @@ def home(request):
 	except Exception:
 		news_items = []
 	try:
-		latest_rows = list(MarketLatest.objects.all().order_by("category", "name"))
+		latest_rows = list(ticker_latest())
 		market_rows = latest_rows if latest_rows else get_market_snapshot()
 	except Exception:
 		market_rows = []
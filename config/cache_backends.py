@@ -0,0 +1,136 @@
+"""Two-tier cache: a small per-process LRU (L1) in front of a shared cache (L2).
+
+Configure with the L2 alias as LOCATION::
+
+    "default": {
+        "BACKEND": "config.cache_backends.TieredCache",
+        "LOCATION": "shared",
+        "OPTIONS": {"L1_MAX_ENTRIES": 512, "L1_TTL": 5},
+    }
+
+Every L2 value is written with a version token, also stored under a small
+sibling key. An L1 entry is trusted for ``L1_TTL`` seconds; after that only
+the version key is read from L2, and the (possibly large) value is reloaded
+only if the version changed. So a set/delete in any process reaches every
+other process within ``L1_TTL``, without unpickling big values on every read.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+_counter = itertools.count()
+
+
+def _new_version() -> str:
+    return f"{time.time_ns():x}.{os.getpid():x}.{next(_counter):x}"
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location: str, params: dict[str, Any]):
+        super().__init__(params)
+        options = params.get("OPTIONS") or {}
+        self._l2_alias = location or "shared"
+        self._l1_max = int(options.get("L1_MAX_ENTRIES", 512))
+        self._l1_ttl = float(options.get("L1_TTL", 5))
+        # full key -> (recheck_at (monotonic), version, value)
+        self._l1: OrderedDict[str, tuple[float, str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def l2(self) -> BaseCache:
+        return caches[self._l2_alias]
+
+    @staticmethod
+    def _version_key(key: str) -> str:
+        return f"{key}:l2ver"
+
+    def _l1_get(self, full_key: str):
+        with self._lock:
+            entry = self._l1.get(full_key)
+            if entry is not None:
+                self._l1.move_to_end(full_key)
+            return entry
+
+    def _l1_put(self, full_key: str, version: str, value: Any, timeout) -> None:
+        ttl = self._l1_ttl
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            ttl = min(ttl, max(0.0, float(timeout)))
+        with self._lock:
+            self._l1[full_key] = (time.monotonic() + ttl, version, value)
+            self._l1.move_to_end(full_key)
+            while len(self._l1) > self._l1_max:
+                self._l1.popitem(last=False)
+
+    def _l1_drop(self, full_key: str) -> None:
+        with self._lock:
+            self._l1.pop(full_key, None)
+
+    def get(self, key, default=None, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        entry = self._l1_get(full_key)
+        if entry is not None:
+            recheck_at, l1_version, value = entry
+            if time.monotonic() < recheck_at:
+                return value
+            if self.l2.get(self._version_key(key), version=version) == l1_version:
+                with self._lock:
+                    if full_key in self._l1:
+                        self._l1[full_key] = (time.monotonic() + self._l1_ttl, l1_version, value)
+                return value
+
+        stored = self.l2.get(key, _MISSING, version=version)
+        if stored is _MISSING or not isinstance(stored, dict) or "v" not in stored:
+            self._l1_drop(full_key)
+            return default
+        self._l1_put(full_key, stored["ver"], stored["v"], DEFAULT_TIMEOUT)
+        return stored["v"]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        ver = _new_version()
+        self.l2.set(key, {"ver": ver, "v": value}, timeout=timeout, version=version)
+        self.l2.set(self._version_key(key), ver, timeout=timeout, version=version)
+        self._l1_put(full_key, ver, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        ver = _new_version()
+        if not self.l2.add(key, {"ver": ver, "v": value}, timeout=timeout, version=version):
+            return False
+        self.l2.set(self._version_key(key), ver, timeout=timeout, version=version)
+        self._l1_put(full_key, ver, value, timeout)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.make_and_validate_key(key, version=version)
+        touched = self.l2.touch(key, timeout=timeout, version=version)
+        self.l2.touch(self._version_key(key), timeout=timeout, version=version)
+        return touched
+
+    def delete(self, key, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        self._l1_drop(full_key)
+        deleted = self.l2.delete(key, version=version)
+        self.l2.delete(self._version_key(key), version=version)
+        return deleted
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
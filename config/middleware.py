@@ -0,0 +1,46 @@
+"""Async-capable wrappers for third-party middleware.
+
+Under ASGI a sync-only middleware forces every request through a thread, so
+async views lose their benefit. These subclasses keep the sync behaviour for
+WSGI and add a native async path.
+"""
+
+from __future__ import annotations
+
+from importlib.metadata import version
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+# __acall__ mirrors WhiteNoiseMiddleware.__call__ and relies on its
+# autorefresh/find_file/files internals, as of the release pinned in
+# requirements.txt. Any other release gets the plain sync middleware (Django
+# adapts it) until the async path has been checked against it.
+WHITENOISE_ASYNC_RELEASE = "6.6."
+_WHITENOISE_ASYNC = version("whitenoise").startswith(WHITENOISE_ASYNC_RELEASE)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = _WHITENOISE_ASYNC
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self._is_async = _WHITENOISE_ASYNC and iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Opens the file; keep that off the event loop.
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
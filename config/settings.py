@@ -60,7 +60,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'config.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'blog.middleware.SiteStatsMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -85,6 +85,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'billing.context_processors.billing_account',
+                'markets.context_processors.live_ticker',
             ],
         },
     },
@@ -160,13 +161,45 @@ STORAGES = {
 LOGIN_REDIRECT_URL = "dashboard:home"
 LOGOUT_REDIRECT_URL = "blog:home"
 
+# Two tiers: "default" is a small per-process LRU (L1) in front of "shared"
+# (L2), which every gunicorn worker and the scheduler see and which survives
+# restarts. "shared" is file-backed on a single box, or Redis when
+# DJANGO_REDIS_URL is set. Circuit breakers and cache locks use "shared"
+# directly.
+if env("DJANGO_REDIS_URL", default=""):
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": env("DJANGO_REDIS_URL"),
+    }
+else:
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": env("DJANGO_SHARED_CACHE_DIR", default="/tmp/uzwire-cache"),
+        "OPTIONS": {"MAX_ENTRIES": env.int("DJANGO_SHARED_CACHE_MAX_ENTRIES", default=5000)},
+    }
+
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "uzsite",
-    }
+        "BACKEND": "config.cache_backends.TieredCache",
+        "LOCATION": "shared",
+        "OPTIONS": {
+            "L1_MAX_ENTRIES": env.int("DJANGO_L1_CACHE_MAX_ENTRIES", default=512),
+            "L1_TTL": env.float("DJANGO_L1_CACHE_TTL", default=5.0),
+        },
+    },
+    "shared": SHARED_CACHE,
 }
 
+# Send a second (hedged) upstream request when the first exceeds the host's p95 latency.
+MARKETS_HEDGED_REQUESTS = env.bool("MARKETS_HEDGED_REQUESTS", default=False)
+
+# Route snapshot/ticker/series/crypto through the async views in markets/views.py.
+# Off by default: under WSGI each request would run its own event loop.
+# The Dockerfile turns it on for its ASGI (uvicorn) workers.
+MARKETS_ASYNC_VIEWS = env.bool("MARKETS_ASYNC_VIEWS", default=False)
+
+MARKETS_COINGECKO_API_URL = env("MARKETS_COINGECKO_API_URL", default="https://api.coingecko.com/api/v3")
+
 NEWS_FEEDS = [
     {
         "name": "Gazeta.uz (RU)",
@@ -0,0 +1,106 @@
+"""Array-based backtest engine for weighted portfolios.
+
+Each holding's close history (a ``markets.packed.History``, as stored by
+``dashboard.history``) becomes a pair of arrays: day ordinals and daily
+returns. The holdings are aligned once on the days they all have a return
+for, giving a (days x holdings) returns matrix. The portfolio's daily return
+is then a matrix-vector product with the weights, and its index is a
+cumulative product.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Sequence
+
+import numpy as np
+
+from markets.packed import History
+
+# date.toordinal() of 1970-01-01, to turn day ordinals into numpy datetimes.
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@dataclass(frozen=True)
+class IndexSeries:
+    """A daily index: ascending ``date.toordinal()`` days and their values."""
+
+    days: np.ndarray  # int64
+    values: np.ndarray  # float64
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def tail(self, n: int) -> "IndexSeries":
+        """The last ``n`` points (views, not copies)."""
+
+        return IndexSeries(self.days[-n:], self.values[-n:]) if n > 0 else IndexSeries(self.days[:0], self.values[:0])
+
+    def at(self, days: np.ndarray) -> np.ndarray:
+        """Values on ``days``, each of which must be in the series."""
+
+        return self.values[np.searchsorted(self.days, days)]
+
+    def epoch_ms(self) -> np.ndarray:
+        return (self.days - EPOCH_ORDINAL) * 86_400_000
+
+    def pairs(self) -> list[tuple[date, float]]:
+        return list(zip(map(date.fromordinal, self.days.tolist()), self.values.tolist()))
+
+
+EMPTY = IndexSeries(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+
+def price_returns(history: History) -> tuple[np.ndarray, np.ndarray]:
+    """``(days, returns)`` of a daily close history with ascending, unique days.
+
+    A day's return is its close over the previous one's. It is skipped when
+    either close is zero, or the previous one is negative.
+    """
+
+    if len(history) < 2:
+        return EMPTY.days, EMPTY.values
+    days = np.frombuffer(history.days, dtype=np.int32).astype(np.int64) + EPOCH_ORDINAL
+    px = np.frombuffer(history.values, dtype=np.float64)
+    prev, cur = px[:-1], px[1:]
+    keep = (prev > 0) & (cur != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets = cur / prev - 1.0
+    return days[1:][keep], rets[keep]
+
+
+def align(returns: Sequence[tuple[np.ndarray, np.ndarray]]) -> tuple[np.ndarray, np.ndarray]:
+    """Common days of several ``price_returns`` results and the (days x holdings) matrix."""
+
+    if not returns or not all(len(days) for days, _ in returns):
+        return EMPTY.days, np.empty((0, len(returns)))
+    lo = max(int(days[0]) for days, _ in returns)
+    hi = min(int(days[-1]) for days, _ in returns)
+    if lo > hi:
+        return EMPTY.days, np.empty((0, len(returns)))
+    # Days are ascending and unique per holding: count holdings per day.
+    seen = np.zeros(hi - lo + 1, dtype=np.intp)
+    for days, _ in returns:
+        seen[days[(days >= lo) & (days <= hi)] - lo] += 1
+    common = np.flatnonzero(seen == len(returns)) + lo
+    matrix = np.empty((len(common), len(returns)))
+    for j, (days, rets) in enumerate(returns):
+        matrix[:, j] = rets[np.searchsorted(days, common)]
+    return common, matrix
+
+
+def weighted_index(days: np.ndarray, matrix: np.ndarray, weights: Sequence[float], start: float = 100.0) -> IndexSeries:
+    """Index starting from ``start``, compounding the weighted daily returns."""
+
+    if not len(days):
+        return EMPTY
+    daily = matrix @ np.asarray(weights, dtype=np.float64)
+    return IndexSeries(days, start * np.cumprod(1.0 + daily))
+
+
+def backtest(histories: Sequence[History], weights: Sequence[float]) -> IndexSeries:
+    """Index of holdings with ``histories`` held at constant ``weights`` (rebalanced daily)."""
+
+    days, matrix = align([price_returns(h) for h in histories])
+    return weighted_index(days, matrix, weights)
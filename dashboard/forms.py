@@ -2,14 +2,18 @@ from __future__ import annotations
 
 from django import forms
 
-from .services import PRESET_PORTFOLIOS
+from .services import get_preset_portfolios
+
+
+def _preset_choices():
+    return [("", "Custom")] + [(k, v["label"]) for k, v in get_preset_portfolios().items()]
 
 
 class CreatePortfolioForm(forms.Form):
     name = forms.CharField(max_length=120, required=True)
     preset = forms.ChoiceField(
         required=False,
-        choices=[("", "Custom")] + [(k, v["label"]) for k, v in PRESET_PORTFOLIOS.items()],
+        choices=_preset_choices,
     )
     custom_lines = forms.CharField(
         required=False,
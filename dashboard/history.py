@@ -0,0 +1,153 @@
+"""Stored Stooq daily closes for the dashboard backtests.
+
+Each symbol's history is kept in the database as packed per-year rows (the
+markets.packed encoding). It is downloaded once, ``HISTORY_DAYS`` rows deep,
+the first time the symbol is asked for. After that it is topped up at most once
+per UTC day, downloading only the range from its last stored date. Any
+``days`` window is the tail of the stored series, so every window shares one
+download and the data survives cache expiry and restarts. When Stooq fails,
+whatever is stored is served and the download is retried a few minutes later.
+"""
+
+from __future__ import annotations
+
+import logging
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, datetime, timezone
+
+from django.core.cache import cache
+from django.db import transaction
+
+from markets import packed
+from markets.caching import get_or_set_coalesced
+from markets.services import fetch_stooq_history
+
+from .models import PriceHistory, PriceHistoryYear
+
+logger = logging.getLogger(__name__)
+
+# Rows downloaded for a new symbol: the longest window the dashboard shows.
+HISTORY_DAYS = 4200
+MAX_DAYS = 9000
+
+# Marks a symbol as synced for the day, so most requests skip the PriceHistory read.
+_SYNCED_SECONDS = 24 * 60 * 60
+# After a failed download, requests serve what is stored until this has passed.
+_RETRY_SECONDS = 5 * 60
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _write_years(symbol: str, history: packed.History) -> None:
+    by_year: dict[int, tuple[list[int], list[float]]] = defaultdict(lambda: ([], []))
+    for day, v in zip(history.days, history.values):
+        days, values = by_year[packed.from_epoch_day(day).year]
+        days.append(day)
+        values.append(v)
+    if by_year:
+        PriceHistoryYear.objects.bulk_create(
+            [
+                PriceHistoryYear(symbol=symbol, year=year, count=len(days), data=packed.encode_year(days, values))
+                for year, (days, values) in by_year.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["symbol", "year"],
+            update_fields=["count", "data"],
+        )
+
+
+def _as_history(rows: list[tuple[date, float]]) -> packed.History:
+    return packed.History(
+        days=array("i", (packed.epoch_day(d) for d, _ in rows)),
+        values=array("d", (v for _, v in rows)),
+    )
+
+
+def _download(symbol: str, depth: int, today: date) -> bool:
+    """Replace the stored history with ``depth`` rows; False if the download failed."""
+
+    try:
+        rows = fetch_stooq_history(symbol, days=depth)
+    except Exception:
+        logger.warning("history download failed for %s", symbol, exc_info=True)
+        return False
+    with transaction.atomic():
+        PriceHistoryYear.objects.filter(symbol=symbol).delete()
+        _write_years(symbol, _as_history(rows))
+        PriceHistory.objects.update_or_create(
+            symbol=symbol,
+            defaults={"depth": depth, "complete": len(rows) < depth, "fetched_on": today},
+        )
+    return True
+
+
+def _top_up(meta: PriceHistory, last_year: packed.History, today: date) -> bool:
+    """Download from the last stored date on; that date's close is replaced too.
+
+    Returns False if the download failed (what is stored is served meanwhile).
+    """
+
+    last = packed.from_epoch_day(last_year.days[-1])
+    try:
+        rows = fetch_stooq_history(meta.symbol, days=(today - last).days + 1, start=last, end=today)
+    except Exception:
+        logger.warning("history top-up failed for %s", meta.symbol, exc_info=True)
+        return False
+    with transaction.atomic():
+        if rows:
+            fresh = _as_history(rows)
+            cut = bisect_left(last_year.days, fresh.days[0])
+            _write_years(
+                meta.symbol,
+                packed.History(days=last_year.days[:cut] + fresh.days, values=last_year.values[:cut] + fresh.values),
+            )
+        meta.fetched_on = today
+        meta.save(update_fields=["fetched_on"])
+    return True
+
+
+def _sync(symbol: str, depth: int, today: date) -> bool:
+    """Bring the stored history up to date; False if a download failed."""
+
+    meta = PriceHistory.objects.filter(symbol=symbol).first()
+    if meta is not None and meta.fetched_on >= today and (meta.complete or meta.depth >= depth):
+        return True
+    newest = PriceHistoryYear.objects.filter(symbol=symbol).order_by("-year").values_list("data", flat=True).first()
+    if meta is None or newest is None or (not meta.complete and meta.depth < depth):
+        return _download(symbol, depth, today)
+    return _top_up(meta, packed.decode_year(newest), today)
+
+
+def _read(symbol: str) -> packed.History:
+    return packed.decode_years(
+        PriceHistoryYear.objects.filter(symbol=symbol).order_by("year").values_list("data", flat=True)
+    )
+
+
+def load(symbol: str, days: int) -> packed.History:
+    """The last ``days`` daily closes of a Stooq symbol, syncing the stored history first.
+
+    Concurrent first requests for a symbol share one download. If it fails,
+    the stored history (possibly empty) is returned.
+    """
+
+    symbol = symbol.strip().lower()
+    days = max(2, min(int(days), MAX_DAYS))
+    depth = max(days, HISTORY_DAYS)
+    today = _today()
+    key = f"dashboard:v1:history_synced:{symbol}:{today:%Y%m%d}:{depth}"
+
+    def sync() -> bool | None:
+        if _sync(symbol, depth, today):
+            return True
+        # Cached briefly instead of for the day, so the next requests don't
+        # each hit Stooq again.
+        cache.set(key, False, timeout=_RETRY_SECONDS)
+        return None
+
+    get_or_set_coalesced(key, sync, timeout=_SYNCED_SECONDS)
+    return _read(symbol).tail(days)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard.backtest import align, backtest, price_returns, weighted_index
+from dashboard.tests_support import legacy_backtest, packed_history, synthetic_histories
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Benchmark the legacy loop vs the array backtest engine (offline, synthetic histories)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=4200)
+        parser.add_argument("--holdings", type=int, action="append", help="Holding counts (repeatable).")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        for holdings in options["holdings"] or [1, 5, 20]:
+            histories = synthetic_histories(days, holdings)
+            weights = [1.0 / holdings] * holdings
+            stored = [packed_history(h) for h in histories]
+
+            legacy = legacy_backtest(histories, weights)
+            engine = backtest(stored, weights).pairs()
+            err = max((abs(a[1] - b[1]) / a[1] for a, b in zip(legacy, engine)), default=0.0)
+            if [d for d, _ in legacy] != [d for d, _ in engine] or err > 1e-9:
+                self.stderr.write(f"WARN: outputs differ for holdings={holdings} (max rel err {err:.2e})")
+
+            lt = _best(lambda: legacy_backtest(histories, weights), options["repeat"])
+            et = _best(lambda: backtest(stored, weights), options["repeat"])
+            # Without computing the returns arrays.
+            returns = [price_returns(h) for h in stored]
+            kt = _best(lambda: weighted_index(*align(returns), weights), options["repeat"])
+            self.stdout.write(
+                f"{days} days x {holdings:>2} holdings ({len(engine)} aligned)  "
+                f"legacy {lt * 1000:6.1f}ms  |  arrays {et * 1000:5.1f}ms ({lt / et:.1f}x), "
+                f"of which align+index {kt * 1000:4.1f}ms ({lt / kt:.0f}x)  max rel err {err:.1e}"
+            )
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from dashboard.backtest import backtest
+from dashboard.management.commands.bench_backtest import _best
+from dashboard.metrics import horizon, portfolio_metrics
+from dashboard.tests_support import close_enough, legacy_metrics, packed_history, synthetic_histories
+
+HORIZONS = (1260, 2520, 3780)
+
+
+def _fused(series, spx, ndx) -> dict:
+    m = portfolio_metrics(series, {"spx": spx, "ndx": ndx})
+    return {
+        "horizons": [(h.total_return, h.cagr) for s in (series, spx, ndx) for h in (horizon(s, d) for d in HORIZONS)],
+        "drawdown": m.drawdown,
+        "best_worst_month": m.best_worst_month,
+        "total_return": m.total_return,
+        "cagr": m.cagr,
+        "max_drawdown": m.max_drawdown,
+        "vol": m.vol,
+        "correlations": m.correlations,
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark the per-statistic dashboard metrics vs the fused kernel (offline, synthetic series)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=4200)
+        parser.add_argument("--holdings", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        histories = [packed_history(h) for h in synthetic_histories(options["days"], options["holdings"] + 2)]
+        weights = [1.0 / options["holdings"]] * options["holdings"]
+        series = backtest(histories[:-2], weights)
+        spx = backtest(histories[-2:-1], [1.0])
+        ndx = backtest(histories[-1:], [1.0])
+        lists = (series.pairs(), spx.pairs(), ndx.pairs())
+
+        if not close_enough(legacy_metrics(*lists, HORIZONS), _fused(series, spx, ndx)):
+            self.stderr.write("WARN: fused metrics differ from the per-statistic functions")
+
+        lt = _best(lambda: legacy_metrics(*lists, HORIZONS), options["repeat"])
+        ft = _best(lambda: _fused(series, spx, ndx), options["repeat"])
+        self.stdout.write(
+            f"{len(series)}-point index, 2 benchmarks, {len(HORIZONS)} horizons each  "
+            f"per-statistic {lt * 1000:6.1f}ms  |  fused {ft * 1000:5.1f}ms  ({lt / ft:.0f}x faster)"
+        )
@@ -0,0 +1,159 @@
+"""Portfolio statistics computed together over one index series.
+
+``portfolio_metrics`` replaces calling ``total_return``, ``cagr``,
+``max_drawdown``, ``annualized_volatility``, ``max_drawdown_window``,
+``best_worst_month`` and ``correlation`` one by one on the same series. Those
+calls each walk the full series and rebuild return maps. Here the daily
+returns, running peak and month endpoints are computed once as arrays, and
+every statistic is read from them. The results match the list-based
+functions, edge cases included.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+
+from .backtest import EPOCH_ORDINAL, IndexSeries
+
+TRADING_DAYS = 252.0
+
+
+@dataclass(frozen=True)
+class Horizon:
+    days: int
+    total_return: float | None
+    cagr: float | None
+
+
+@dataclass(frozen=True)
+class Metrics:
+    total_return: float | None
+    cagr: float | None
+    max_drawdown: float | None
+    vol: float | None
+    # {"drawdown", "peak_date", "trough_date"}, as max_drawdown_window returned.
+    drawdown: dict | None
+    # {"best": {...}, "worst": {...}}, as best_worst_month returned.
+    best_worst_month: dict | None
+    correlations: dict[str, float | None] = field(default_factory=dict)
+
+
+def _growth(series: IndexSeries, start: int) -> tuple[float | None, float | None]:
+    """(total return, CAGR) from point ``start`` to the last one."""
+
+    v0, v1 = float(series.values[start]), float(series.values[-1])
+    tr = (v1 / v0) - 1.0 if v0 > 0 else None
+    if v0 <= 0 or v1 <= 0:
+        return tr, None
+    years = max(0.0001, (int(series.days[-1]) - int(series.days[start])) / 365.25)
+    return tr, (v1 / v0) ** (1.0 / years) - 1.0
+
+
+def horizon(series: IndexSeries, days: int) -> Horizon:
+    """Total return and CAGR over the last ``days`` points (None if the series is shorter)."""
+
+    if days < 2 or len(series) < days:
+        return Horizon(days, None, None)
+    return Horizon(days, *_growth(series, len(series) - days))
+
+
+def daily_returns(series: IndexSeries) -> tuple[np.ndarray, np.ndarray]:
+    """``(days, returns)`` between consecutive points, skipping zero or negative bases."""
+
+    prev, cur = series.values[:-1], series.values[1:]
+    keep = (prev > 0) & (cur != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets = cur / prev - 1.0
+    return series.days[1:][keep], rets[keep]
+
+
+def _drawdown(series: IndexSeries) -> tuple[float, dict] | None:
+    values = series.values
+    if values[0] <= 0:
+        return None
+    peak = np.maximum.accumulate(values)
+    dd = values / peak - 1.0
+    trough = int(np.argmin(dd))
+    if dd[trough] >= 0:
+        first = date.fromordinal(int(series.days[0]))
+        return 0.0, {"drawdown": 0.0, "peak_date": first, "trough_date": first}
+    # The peak is where the running maximum was first reached.
+    start = int(np.argmax(values[: trough + 1] == peak[trough]))
+    mdd = float(dd[trough])
+    return mdd, {
+        "drawdown": mdd,
+        "peak_date": date.fromordinal(int(series.days[start])),
+        "trough_date": date.fromordinal(int(series.days[trough])),
+    }
+
+
+def _volatility(rets: np.ndarray) -> float | None:
+    if len(rets) < 2:
+        return None
+    return float(np.std(rets, ddof=1)) * math.sqrt(TRADING_DAYS)
+
+
+def _best_worst_month(series: IndexSeries) -> dict | None:
+    months = (series.days - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    # Last point of each calendar month.
+    ends = np.flatnonzero(np.append(months[1:] != months[:-1], True))
+    if len(ends) < 2:
+        return None
+    v = series.values[ends]
+    prev, cur = v[:-1], v[1:]
+    valid = (prev > 0) & (cur != 0)
+    if not valid.any():
+        return None
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets = np.where(valid, cur / prev - 1.0, np.nan)
+
+    def item(i: int) -> dict:
+        m = int(months[ends[i + 1]])
+        return {
+            "year": 1970 + m // 12,
+            "month": m % 12 + 1,
+            "date": date.fromordinal(int(series.days[ends[i + 1]])),
+            "return": float(rets[i]),
+        }
+
+    return {"best": item(int(np.nanargmax(rets))), "worst": item(int(np.nanargmin(rets)))}
+
+
+def _correlation(a: tuple[np.ndarray, np.ndarray], b: tuple[np.ndarray, np.ndarray]) -> float | None:
+    _common, ia, ib = np.intersect1d(a[0], b[0], assume_unique=True, return_indices=True)
+    if len(ia) < 5:
+        return None
+    x = a[1][ia] - a[1][ia].mean()
+    y = b[1][ib] - b[1][ib].mean()
+    vx, vy = float(x @ x), float(y @ y)
+    if vx <= 0 or vy <= 0:
+        return None
+    return float(x @ y) / math.sqrt(vx * vy)
+
+
+def portfolio_metrics(series: IndexSeries, benchmarks: dict[str, IndexSeries] | None = None) -> Metrics:
+    """Every summary statistic of ``series``, plus its return correlation with each benchmark."""
+
+    n = len(series)
+    total = growth = mdd = vol = None
+    drawdown = best_worst = None
+    correlations: dict[str, float | None] = {}
+    if n >= 2:
+        total, growth = _growth(series, 0)
+        dd = _drawdown(series)
+        if dd is not None:
+            mdd, drawdown = dd
+        rets = daily_returns(series)
+        if n >= 3:
+            vol = _volatility(rets[1])
+        if n >= 25:
+            best_worst = _best_worst_month(series)
+    for name, bench in (benchmarks or {}).items():
+        correlations[name] = (
+            _correlation(rets, daily_returns(bench)) if n >= 3 and len(bench) >= 3 else None
+        )
+    return Metrics(total, growth, mdd, vol, drawdown, best_worst, correlations)
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=32, unique=True)),
+                ('depth', models.PositiveIntegerField()),
+                ('complete', models.BooleanField(default=False)),
+                ('fetched_on', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceHistoryYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=32)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+            ],
+            options={
+                'unique_together': {('symbol', 'year')},
+            },
+        ),
+    ]
@@ -24,3 +24,30 @@ class PortfolioItem(models.Model):
 
     def __str__(self) -> str:
         return f"{self.portfolio_id}:{self.symbol}={self.weight}%"
+
+
+class PriceHistory(models.Model):
+    """Sync state of a Stooq symbol's stored daily closes (see dashboard.history)."""
+
+    symbol = models.CharField(max_length=32, unique=True)
+    # Rows asked for by the last full download.
+    depth = models.PositiveIntegerField()
+    # Upstream returned fewer rows than asked: the stored history starts at the listing.
+    complete = models.BooleanField(default=False)
+    # UTC day of the last upstream fetch; histories are topped up at most once a day.
+    fetched_on = models.DateField()
+
+    def __str__(self) -> str:
+        return f"PriceHistory({self.symbol}, fetched_on={self.fetched_on})"
+
+
+class PriceHistoryYear(models.Model):
+    """One symbol's daily closes for a calendar year, packed like markets.PackedYear."""
+
+    symbol = models.CharField(max_length=32)
+    year = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        unique_together = ("symbol", "year")
@@ -0,0 +1,141 @@
+from datetime import date, timedelta
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from markets import packed
+
+from . import history
+from .backtest import IndexSeries, backtest
+from .metrics import Metrics, horizon, portfolio_metrics
+from .tests_support import close_enough, legacy_backtest, legacy_metrics, packed_history, synthetic_histories
+
+
+def _index(rows: list[tuple[date, float]]) -> IndexSeries:
+    return IndexSeries(
+        np.array([d.toordinal() for d, _ in rows], dtype=np.int64), np.array([v for _, v in rows], dtype=np.float64)
+    )
+
+
+def _stats(m: Metrics) -> dict:
+    # Shaped like tests_support.legacy_metrics without its "horizons".
+    return {
+        "total_return": m.total_return,
+        "cagr": m.cagr,
+        "max_drawdown": m.max_drawdown,
+        "vol": m.vol,
+        "drawdown": m.drawdown,
+        "best_worst_month": m.best_worst_month,
+        "correlations": m.correlations,
+    }
+
+
+class BacktestTests(SimpleTestCase):
+    def test_matches_list_backtest(self):
+        histories = synthetic_histories(600, 4)
+        weights = [0.4, 0.3, 0.2, 0.1]
+        series = backtest([packed_history(h) for h in histories], weights)
+        self.assertTrue(close_enough(series.pairs(), legacy_backtest(histories, weights)))
+
+    def test_no_common_days(self):
+        a = [(date(2024, 1, 1) + timedelta(days=i), 1.0 + i) for i in range(5)]
+        b = [(date(2025, 1, 1) + timedelta(days=i), 1.0 + i) for i in range(5)]
+        self.assertEqual(len(backtest([packed_history(a), packed_history(b)], [0.5, 0.5])), 0)
+
+
+class PortfolioMetricsTests(SimpleTestCase):
+    def test_matches_per_statistic_functions(self):
+        histories = synthetic_histories(4000, 5)
+        series = backtest([packed_history(h) for h in histories[:3]], [0.5, 0.3, 0.2])
+        spx = backtest([packed_history(histories[3])], [1.0])
+        ndx = backtest([packed_history(histories[4])], [1.0])
+        legacy = legacy_metrics(series.pairs(), spx.pairs(), ndx.pairs())
+        legacy.pop("horizons")
+        fused = _stats(portfolio_metrics(series, {"spx": spx, "ndx": ndx}))
+        self.assertTrue(close_enough(fused, legacy), (fused, legacy))
+
+    def test_edge_cases_match(self):
+        start = date(2024, 1, 1)
+        cases = {
+            "flat": [(start + timedelta(days=i), 5.0) for i in range(40)],
+            "rising": [(start + timedelta(days=i), 1.0 + i) for i in range(30)],
+            "zero start": [(start + timedelta(days=i), float(i)) for i in range(30)],
+            "short": [(start, 1.0), (start + timedelta(days=1), 2.0)],
+        }
+        for name, rows in cases.items():
+            legacy = legacy_metrics(rows, rows, rows)
+            legacy.pop("horizons")
+            fused = _stats(portfolio_metrics(_index(rows), {"spx": _index(rows), "ndx": _index(rows)}))
+            self.assertTrue(close_enough(fused, legacy), (name, fused, legacy))
+
+    def test_horizon_needs_enough_points(self):
+        rows = [(date(2024, 1, 1) + timedelta(days=i), 100.0 + i) for i in range(10)]
+        self.assertIsNone(horizon(_index(rows), 11).total_return)
+        self.assertAlmostEqual(horizon(_index(rows), 5).total_return, 109.0 / 105.0 - 1.0)
+
+
+# The sync markers and coalescing locks live in the caches; keep tests off the shared cache directory.
+LOCAL_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "dashboard-tests"},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "dashboard-tests-shared"},
+}
+
+
+def _closes(first: date, last: date, base: float = 100.0) -> list[tuple[date, float]]:
+    return [(first + timedelta(days=i), base + i) for i in range((last - first).days + 1)]
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class HistoryTests(TestCase):
+    today = date(2024, 6, 3)
+
+    def setUp(self):
+        self.fetch = self.patch("dashboard.history.fetch_stooq_history")
+        self.patch("dashboard.history._today", side_effect=lambda: self.today)
+
+    def patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_downloads_once_then_tops_up_daily(self):
+        self.fetch.return_value = _closes(date(2023, 12, 20), self.today)
+        tail = history.load("SMH.US", 10)
+        self.assertEqual(packed.from_epoch_day(tail.days[-1]), self.today)
+        self.assertEqual(len(tail), 10)
+        self.fetch.assert_called_once_with("smh.us", days=history.HISTORY_DAYS)
+        # Any window on the same day is served from the stored history.
+        self.assertEqual(len(history.load("smh.us", 100)), 100)
+        self.assertEqual(self.fetch.call_count, 1)
+
+        # Next day: only the range from the last stored date, whose close is replaced.
+        self.today = date(2024, 6, 4)
+        self.fetch.return_value = [(date(2024, 6, 3), 1.0), (date(2024, 6, 4), 2.0)]
+        june_2 = tail.values[-2]
+        tail = history.load("smh.us", 3)
+        self.fetch.assert_called_with("smh.us", days=2, start=date(2024, 6, 3), end=self.today)
+        self.assertEqual(list(tail.values), [june_2, 1.0, 2.0])
+
+    def test_failed_download_is_served_and_retried_later(self):
+        self.fetch.side_effect = TimeoutError()
+        self.assertEqual(len(history.load("xlf.us", 30)), 0)
+        self.assertEqual(len(history.load("xlf.us", 30)), 0)
+        self.assertEqual(self.fetch.call_count, 1)
+
+        # The failure marker expires after _RETRY_SECONDS; then it downloads again.
+        cache_key = f"dashboard:v1:history_synced:xlf.us:{self.today:%Y%m%d}:{history.HISTORY_DAYS}"
+        self.assertIs(history.cache.get(cache_key), False)
+        history.cache.delete(cache_key)
+        self.fetch.side_effect = None
+        self.fetch.return_value = _closes(date(2024, 5, 1), self.today)
+        self.assertEqual(len(history.load("xlf.us", 30)), 30)
+
+    def test_failed_top_up_serves_stored_history(self):
+        self.fetch.return_value = _closes(date(2024, 5, 1), self.today)
+        stored = list(history.load("xle.us", 20).values)
+        self.today = date(2024, 6, 4)
+        self.fetch.side_effect = TimeoutError()
+        self.assertEqual(list(history.load("xle.us", 20).values), stored)
+        self.assertEqual(list(history.load("xle.us", 20).values), stored)
+        self.assertEqual(self.fetch.call_count, 2)
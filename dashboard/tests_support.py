@@ -0,0 +1,260 @@
+"""Fixtures and reference implementations shared by dashboard tests and benchmarks."""
+
+from __future__ import annotations
+
+import math
+from array import array
+from datetime import date, timedelta
+
+from markets import packed
+
+
+def synthetic_histories(days: int, holdings: int) -> list[list[tuple[date, float]]]:
+    # Weekday closes; each holding also misses its own handful of days, so the
+    # holdings have to be aligned.
+    start = date(2026, 1, 1) - timedelta(days=days * 7 // 5)
+    calendar = [start + timedelta(days=i) for i in range(days * 7 // 5 + 7)]
+    calendar = [d for d in calendar if d.weekday() < 5][:days]
+    out = []
+    for j in range(holdings):
+        px = 50.0 + j
+        hist = []
+        for i, d in enumerate(calendar):
+            if (i * (j + 3)) % 997 == 0:
+                continue
+            px *= 1.0 + (((i + 1) * (7919 + j * 104729)) % 400 - 199) / 10000.0
+            hist.append((d, px))
+        out.append(hist)
+    return out
+
+
+def packed_history(rows: list[tuple[date, float]]) -> packed.History:
+    # What dashboard.history serves for the same closes.
+    return packed.History(array("i", (packed.epoch_day(d) for d, _ in rows)), array("d", (v for _, v in rows)))
+
+
+def legacy_backtest(histories: list[list[tuple[date, float]]], weights: list[float]) -> list[tuple[date, float]]:
+    # The pre-vectorization backtest_weighted_index on (date, close) lists:
+    # per-holding return dicts, set intersection, then a date x holding loop.
+    def returns(series):
+        out = {}
+        prev = None
+        for d, px in series:
+            if prev is None:
+                prev = px
+                continue
+            if prev and px and prev > 0:
+                out[d] = (px / prev) - 1.0
+            prev = px
+        return out
+
+    by_holding = [returns(h) for h in histories]
+    common = set(by_holding[0])
+    for rets in by_holding[1:]:
+        common &= set(rets)
+    value = 100.0
+    out = []
+    for d in sorted(common):
+        daily = 0.0
+        for rets, w in zip(by_holding, weights):
+            daily += w * rets[d]
+        value *= 1.0 + daily
+        out.append((d, value))
+    return out
+
+
+# The per-statistic list functions dashboard.views.home called before the
+# fused kernel (dashboard.metrics), kept as its reference.
+
+
+def total_return(series: list[tuple[date, float]]) -> float | None:
+    if len(series) < 2:
+        return None
+    start = series[0][1]
+    end = series[-1][1]
+    if start <= 0:
+        return None
+    return (end / start) - 1.0
+
+
+def cagr(series: list[tuple[date, float]]) -> float | None:
+    if len(series) < 2:
+        return None
+    d0, v0 = series[0]
+    d1, v1 = series[-1]
+    if v0 <= 0 or v1 <= 0:
+        return None
+    years = max(0.0001, (d1 - d0).days / 365.25)
+    return (v1 / v0) ** (1.0 / years) - 1.0
+
+
+def max_drawdown(series: list[tuple[date, float]]) -> float | None:
+    if len(series) < 2:
+        return None
+    peak = series[0][1]
+    if peak <= 0:
+        return None
+    mdd = 0.0
+    for _d, v in series:
+        if v > peak:
+            peak = v
+            continue
+        if peak > 0:
+            dd = (v / peak) - 1.0
+            if dd < mdd:
+                mdd = dd
+    return mdd
+
+
+def annualized_volatility(series: list[tuple[date, float]]) -> float | None:
+    if len(series) < 3:
+        return None
+    rets: list[float] = []
+    prev = series[0][1]
+    for _d, v in series[1:]:
+        if prev and v and prev > 0:
+            rets.append((v / prev) - 1.0)
+        prev = v
+    if len(rets) < 2:
+        return None
+    mean = sum(rets) / len(rets)
+    var = sum((r - mean) ** 2 for r in rets) / (len(rets) - 1)
+    return math.sqrt(var) * math.sqrt(252.0)
+
+
+def correlation(a: list[tuple[date, float]], b: list[tuple[date, float]]) -> float | None:
+    """Pearson correlation of daily returns between two index series."""
+
+    if len(a) < 3 or len(b) < 3:
+        return None
+
+    def _ret_map(series: list[tuple[date, float]]) -> dict[date, float]:
+        out: dict[date, float] = {}
+        prev = None
+        for d, v in series:
+            if prev is None:
+                prev = v
+                continue
+            if prev and v and prev > 0:
+                out[d] = (v / prev) - 1.0
+            prev = v
+        return out
+
+    ra = _ret_map(a)
+    rb = _ret_map(b)
+    common = sorted(set(ra.keys()) & set(rb.keys()))
+    if len(common) < 5:
+        return None
+
+    xs = [ra[d] for d in common]
+    ys = [rb[d] for d in common]
+
+    mx = sum(xs) / len(xs)
+    my = sum(ys) / len(ys)
+    vx = sum((x - mx) ** 2 for x in xs)
+    vy = sum((y - my) ** 2 for y in ys)
+    if vx <= 0 or vy <= 0:
+        return None
+    cov = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+    return cov / math.sqrt(vx * vy)
+
+
+def best_worst_month(series: list[tuple[date, float]]) -> dict[str, object] | None:
+    """Return best/worst calendar-month total returns based on month endpoints."""
+
+    if len(series) < 25:
+        return None
+
+    # Keep the last value per month.
+    month_last: dict[tuple[int, int], tuple[date, float]] = {}
+    for d, v in series:
+        key = (d.year, d.month)
+        month_last[key] = (d, v)
+
+    # Need previous month endpoint to compute returns.
+    months = sorted(month_last.keys())
+    if len(months) < 2:
+        return None
+
+    best = None
+    worst = None
+    prev_v = month_last[months[0]][1]
+
+    for key in months[1:]:
+        d, v = month_last[key]
+        if prev_v and v and prev_v > 0:
+            r = (v / prev_v) - 1.0
+            item = {"year": key[0], "month": key[1], "date": d, "return": r}
+            if best is None or r > best["return"]:
+                best = item
+            if worst is None or r < worst["return"]:
+                worst = item
+        prev_v = v
+
+    if best is None or worst is None:
+        return None
+    return {"best": best, "worst": worst}
+
+
+def max_drawdown_window(series: list[tuple[date, float]]) -> dict[str, object] | None:
+    """Max drawdown with peak/trough dates (drawdown is negative)."""
+
+    if len(series) < 2:
+        return None
+    peak_d, peak_v = series[0]
+    if peak_v <= 0:
+        return None
+
+    best_dd = 0.0
+    best_peak = peak_d
+    best_trough = peak_d
+
+    for d, v in series:
+        if v > peak_v:
+            peak_d, peak_v = d, v
+            continue
+        if peak_v > 0:
+            dd = (v / peak_v) - 1.0
+            if dd < best_dd:
+                best_dd = dd
+                best_peak = peak_d
+                best_trough = d
+
+    return {
+        "drawdown": best_dd,
+        "peak_date": best_peak,
+        "trough_date": best_trough,
+    }
+
+
+
+def legacy_metrics(series, spx, ndx, horizons: tuple[int, ...] = ()) -> dict:
+    # What dashboard.views.home computed before the fused kernel, call for call.
+    def what_if(s, days):
+        seg = s[-days:] if s and len(s) >= days else []
+        return total_return(seg), cagr(seg)
+
+    out = {
+        "horizons": [what_if(s, d) for s in (series, spx, ndx) for d in horizons],
+        "drawdown": max_drawdown_window(series),
+        "best_worst_month": best_worst_month(series),
+    }
+    for _ in range(2):  # raw value, then again for the pct() variant
+        out.update(
+            total_return=total_return(series),
+            cagr=cagr(series),
+            max_drawdown=max_drawdown(series),
+            vol=annualized_volatility(series),
+        )
+    out["correlations"] = {"spx": correlation(series, spx), "ndx": correlation(series, ndx)}
+    return out
+
+
+def close_enough(a, b) -> bool:
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(close_enough(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(close_enough(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float):
+        return abs(a - b) <= 1e-9 * max(1.0, abs(a))
+    return a == b
@@ -8,21 +8,18 @@ from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.views.decorators.http import require_GET, require_POST
 
-from markets.models import MarketLatest
+from markets.downsample import parse_max_points
+from markets.services import ticker_latest
 
 from .forms import CreatePortfolioForm
 from .models import Portfolio, PortfolioItem
+from .metrics import horizon, portfolio_metrics
 from .services import (
-    PRESET_PORTFOLIOS,
-    annualized_volatility,
-    backtest_weighted_index,
-    best_worst_month,
-    cagr,
-    correlation,
-    max_drawdown,
-    max_drawdown_window,
+    backtest_index,
+    get_preset_portfolios,
     normalize_allocations,
-    total_return,
+    portfolio_chart_rows,
+    resolve_preset,
 )
 
 
@@ -46,7 +43,7 @@ def _parse_custom_lines(text: str) -> list[tuple[str, float]]:
 
 @login_required
 def home(request):
-    latest = list(MarketLatest.objects.all().order_by("category", "name")[:12])
+    latest = list(ticker_latest()[:12])
 
     portfolios = list(Portfolio.objects.filter(user=request.user).order_by("-created_at")[:5])
 
@@ -63,25 +60,19 @@ def home(request):
             selected_portfolio = None
 
     # Default backtest: Semiconductor preset
-    selected_preset = request.GET.get("preset") or "semi"
-    if selected_preset not in PRESET_PORTFOLIOS:
-        selected_preset = "semi"
-    allocations = normalize_allocations(PRESET_PORTFOLIOS[selected_preset]["items"])
+    presets = get_preset_portfolios()
+    selected_preset = resolve_preset(request.GET.get("preset"), presets)
+    allocations = normalize_allocations(presets[selected_preset]["items"] if selected_preset else [])
 
     if selected_portfolio and portfolio_items:
         allocations = normalize_allocations([(it.symbol, it.weight) for it in portfolio_items])
 
     days_15y = 4200
-    series = backtest_weighted_index(allocations, days=days_15y)
+    series = backtest_index(allocations, days=days_15y)
 
     def pct(x):
         return (x * 100.0) if x is not None else None
 
-    def slice_last(n: int):
-        if len(series) < n:
-            return None
-        return series[-n:]
-
     horizons = {
         "5y": 1260,
         "10y": 2520,
@@ -90,52 +81,47 @@ def home(request):
 
     def what_if_row(s, days: int):
         # assumes index series starting at 100
-        seg = s[-days:] if s and len(s) >= days else []
-        tr = total_return(seg)
-        cg = cagr(seg)
+        h = horizon(s, days)
         end_value = None
-        if tr is not None:
-            end_value = 10000.0 * (1.0 + tr)
+        if h.total_return is not None:
+            end_value = 10000.0 * (1.0 + h.total_return)
         return {
             "days": days,
-            "total_return": tr,
-            "cagr": cg,
-            "total_return_pct": pct(tr),
-            "cagr_pct": pct(cg),
+            "total_return": h.total_return,
+            "cagr": h.cagr,
+            "total_return_pct": pct(h.total_return),
+            "cagr_pct": pct(h.cagr),
             "end_value": end_value,
         }
 
     portfolio_backtests = {k: what_if_row(series, v) for k, v in horizons.items()}
 
     # Benchmarks (more reliable proxies)
-    spx = backtest_weighted_index(normalize_allocations([("spy.us", 1.0)]), days=days_15y)
-    ndx = backtest_weighted_index(normalize_allocations([("qqq.us", 1.0)]), days=days_15y)
+    spx = backtest_index(normalize_allocations([("spy.us", 1.0)]), days=days_15y)
+    ndx = backtest_index(normalize_allocations([("qqq.us", 1.0)]), days=days_15y)
 
     bench = {
         "spx": {k: what_if_row(spx, v) for k, v in horizons.items()},
         "ndx": {k: what_if_row(ndx, v) for k, v in horizons.items()},
     }
 
-    dd_info = max_drawdown_window(series)
-    bw = best_worst_month(series)
+    m = portfolio_metrics(series, {"spx": spx, "ndx": ndx})
+    bw = m.best_worst_month
     if bw:
-        try:
-            bw["best"]["return_pct"] = pct(bw["best"].get("return"))
-            bw["worst"]["return_pct"] = pct(bw["worst"].get("return"))
-        except Exception:
-            pass
+        bw["best"]["return_pct"] = pct(bw["best"]["return"])
+        bw["worst"]["return_pct"] = pct(bw["worst"]["return"])
     insights = {
-        "total_return": total_return(series),
-        "cagr": cagr(series),
-        "max_drawdown": max_drawdown(series),
-        "vol": annualized_volatility(series),
-        "total_return_pct": pct(total_return(series)),
-        "cagr_pct": pct(cagr(series)),
-        "max_drawdown_pct": pct(max_drawdown(series)),
-        "vol_pct": pct(annualized_volatility(series)),
-        "corr_spx": correlation(series, spx),
-        "corr_ndx": correlation(series, ndx),
-        "drawdown": dd_info,
+        "total_return": m.total_return,
+        "cagr": m.cagr,
+        "max_drawdown": m.max_drawdown,
+        "vol": m.vol,
+        "total_return_pct": pct(m.total_return),
+        "cagr_pct": pct(m.cagr),
+        "max_drawdown_pct": pct(m.max_drawdown),
+        "vol_pct": pct(m.vol),
+        "corr_spx": m.correlations["spx"],
+        "corr_ndx": m.correlations["ndx"],
+        "drawdown": m.drawdown,
         "best_worst_month": bw,
     }
 
@@ -154,9 +140,9 @@ def home(request):
             "benchmarks": bench,
             "insights": insights,
             "form": form,
-            "presets": PRESET_PORTFOLIOS,
+            "presets": presets,
             "selected_preset": selected_preset,
-            "selected_preset_label": PRESET_PORTFOLIOS[selected_preset]["label"],
+            "selected_preset_label": presets[selected_preset]["label"] if selected_preset else "",
         },
     )
 
@@ -175,7 +161,7 @@ def create_portfolio(request):
     custom_lines = form.cleaned_data.get("custom_lines") or ""
 
     if preset:
-        items = PRESET_PORTFOLIOS[preset]["items"]
+        items = get_preset_portfolios().get(preset, {}).get("items", [])
     else:
         items = _parse_custom_lines(custom_lines)
 
@@ -209,36 +195,20 @@ def portfolio_series(request):
         allocs = normalize_allocations([(it.symbol, it.weight) for it in items])
         portfolio_id = p.id
     else:
-        preset = preset or "semi"
-        if preset not in PRESET_PORTFOLIOS:
-            preset = "semi"
-        allocs = normalize_allocations(PRESET_PORTFOLIOS[preset]["items"])
+        presets = get_preset_portfolios()
+        preset = resolve_preset(preset, presets)
+        allocs = normalize_allocations(presets[preset]["items"] if preset else [])
         portfolio_id = 0
 
     days = int(request.GET.get("days", "1260"))
     days = max(30, min(days, 4200))
-    series = backtest_weighted_index(allocs, days=days)
-    spx = backtest_weighted_index(normalize_allocations([("spy.us", 1.0)]), days=days)
-    ndx = backtest_weighted_index(normalize_allocations([("qqq.us", 1.0)]), days=days)
-
-    # Align by common dates for clean multi-line chart.
-    map_p = {d: v for d, v in series}
-    map_spx = {d: v for d, v in spx}
-    map_ndx = {d: v for d, v in ndx}
-    common = sorted(set(map_p.keys()) & set(map_spx.keys()) & set(map_ndx.keys()))
+    max_points = parse_max_points(request.GET.get("max_points"))
 
     return JsonResponse(
         {
             "portfolio": portfolio_id,
             "days": days,
-            "series": [
-                {
-                    "t": int(datetime.combine(d, datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000),
-                    "p": map_p[d],
-                    "spx": map_spx[d],
-                    "ndx": map_ndx[d],
-                }
-                for d in common
-            ],
+            "max_points": max_points,
+            "series": portfolio_chart_rows(allocs, days=days, max_points=max_points),
         }
     )
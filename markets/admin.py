@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Instrument
+
+
+@admin.register(Instrument)
+class InstrumentAdmin(admin.ModelAdmin):
+    list_display = ("symbol", "name", "provider", "provider_symbol", "category", "refresh_interval", "enabled", "show_in_ticker", "preset")
+    list_filter = ("provider", "category", "enabled", "show_in_ticker")
+    list_editable = ("enabled", "show_in_ticker")
+    search_fields = ("symbol", "name", "provider_symbol")
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MarketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'markets'
+
+    def ready(self):
+        # Registers the catalog cache invalidation signals.
+        from . import catalog  # noqa: F401
@@ -0,0 +1,148 @@
+"""Weekly and monthly OHLC rollups of daily market points.
+
+MarketBar rows are materialized from the packed daily history
+(markets.packed) and refreshed by ingest from the first changed period
+onwards, so long-range charts read a few hundred bars instead of thousands of
+daily points. ``pick_interval`` chooses the resolution for a date range and
+point budget.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from typing import Iterable
+
+from django.db.models import Min
+
+from . import packed
+from .models import MarketBar, PackedYear
+
+DAILY = "1d"
+WEEKLY = "1w"
+MONTHLY = "1mo"
+BAR_INTERVALS = (WEEKLY, MONTHLY)
+# Finest first; average calendar days per point, for estimating point counts.
+INTERVAL_DAYS: dict[str, float] = {DAILY: 1.0, WEEKLY: 7.0, MONTHLY: 365.25 / 12}
+
+_FIELDS = ("start", "open", "high", "low", "close", "last_date", "count")
+
+
+@dataclass(frozen=True)
+class Bar:
+    start: date
+    open: float
+    high: float
+    low: float
+    close: float
+    last_date: date
+    count: int
+
+
+def period_start(d: date, interval: str) -> date:
+    if interval == WEEKLY:
+        return d - timedelta(days=d.weekday())
+    if interval == MONTHLY:
+        return d.replace(day=1)
+    raise ValueError(f"unknown bar interval {interval!r}")
+
+
+def build_bars(history: packed.History, interval: str) -> list[Bar]:
+    """Bars over ``history`` (ascending daily values), one per period with data."""
+
+    out: list[Bar] = []
+    start = o = h = lo = c = None
+    last = count = 0
+    for day, v in zip(history.days, history.values):
+        d = packed.from_epoch_day(day)
+        p = period_start(d, interval)
+        if p != start:
+            if start is not None:
+                out.append(Bar(start, o, h, lo, c, packed.from_epoch_day(last), count))
+            start, o, h, lo, count = p, v, v, v, 0
+        elif v > h:
+            h = v
+        elif v < lo:
+            lo = v
+        c, last, count = v, day, count + 1
+    if start is not None:
+        out.append(Bar(start, o, h, lo, c, packed.from_epoch_day(last), count))
+    return out
+
+
+def refresh(changed_since: dict[str, date]) -> int:
+    """Rebuild each instrument's bars from the period containing its first changed date.
+
+    ``changed_since`` maps instrument -> earliest date whose value changed.
+    Call after the packed history was synced (``packed.sync_years``).
+    Bars from that period on whose points were all deleted or nulled are
+    removed. Returns the number of bars written.
+    """
+
+    rows: list[MarketBar] = []
+    for instrument, since in changed_since.items():
+        history = packed.read_range(instrument, min(period_start(since, i) for i in BAR_INTERVALS))
+        for interval in BAR_INTERVALS:
+            first = period_start(since, interval)
+            built = build_bars(packed.slice_range(history, first, None), interval)
+            rows.extend(MarketBar(instrument=instrument, interval=interval, **asdict(bar)) for bar in built)
+            existing = MarketBar.objects.filter(instrument=instrument, interval=interval, start__gte=first)
+            emptied = set(existing.values_list("start", flat=True)) - {bar.start for bar in built}
+            if emptied:
+                existing.filter(start__in=emptied).delete()
+    if rows:
+        MarketBar.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["instrument", "interval", "start"],
+            update_fields=["open", "high", "low", "close", "last_date", "count"],
+        )
+    return len(rows)
+
+
+def rebuild(instruments: Iterable[str] | None = None) -> int:
+    """Rebuild all bars of ``instruments`` (default: every instrument with packed history)."""
+
+    years = PackedYear.objects.all()
+    stale = MarketBar.objects.all()
+    if instruments is not None:
+        instruments = list(instruments)
+        years = years.filter(instrument__in=instruments)
+        stale = stale.filter(instrument__in=instruments)
+    first_years = dict(years.values("instrument").annotate(first=Min("year")).values_list("instrument", "first"))
+    stale.delete()
+    return refresh({instrument: date(year, 1, 1) for instrument, year in first_years.items()})
+
+
+def _bars(instrument: str, interval: str, start: date, end: date):
+    return (
+        MarketBar.objects.filter(instrument=instrument, interval=interval, start__lte=end, last_date__gte=start)
+        .order_by("start")
+        .values_list(*_FIELDS)
+    )
+
+
+def read_bars(instrument: str, interval: str, start: date, end: date) -> list[Bar]:
+    """Bars overlapping ``start..end`` (the first and last may extend past it)."""
+
+    return [Bar(*row) for row in _bars(instrument, interval, start, end)]
+
+
+async def aread_bars(instrument: str, interval: str, start: date, end: date) -> list[Bar]:
+    return [Bar(*row) async for row in _bars(instrument, interval, start, end)]
+
+
+def pick_interval(start: date, end: date, budget: int) -> str:
+    """Coarsest interval that still yields at least ``budget`` points over the range.
+
+    Fewer rows are read and the payload is then downsampled to the budget.
+    Falls back to daily when even that is short of the budget.
+    """
+
+    span = (end - start).days + 1
+    chosen = DAILY
+    for interval in INTERVAL_DAYS:
+        if span / INTERVAL_DAYS[interval] >= budget:
+            chosen = interval
+    return chosen
@@ -0,0 +1,258 @@
+"""Cache helpers shared by market views and services.
+
+``get_or_set_coalesced`` collapses concurrent misses into one computation.
+``aget_or_set_coalesced`` is the same for async views, without blocking the
+event loop. ``get_stale_while_revalidate`` adds a soft TTL on top: past it the stale value
+is served while exactly one caller (holding a ``resilience.try_lock`` lock)
+recomputes it in the background, until the hard TTL drops the entry.
+
+Cross-process locks go through ``resilience.try_lock``: Redis SET NX, or a
+flock-guarded lock file with the file-based cache, whose ``add`` is not
+atomic. A lock expires after its timeout, so a leader that overruns it may
+be joined by a second one.
+
+Values go through the default cache (an L1 in front of the shared cache, see
+config.cache_backends).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, TypeVar
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+
+from . import resilience
+
+T = TypeVar("T")
+
+# How long followers wait for the request computing a value before computing it themselves.
+COALESCE_WAIT_SECONDS = 10.0
+_POLL_SECONDS = 0.05
+# Upper bound on a background refresh; after this another caller may take over.
+REFRESH_LOCK_SECONDS = 60
+
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+# Async leaders, per event loop (one per ASGI worker process).
+_ainflight: dict[tuple[int, str], asyncio.Future] = {}
+
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="markets-swr")
+
+_stats: dict[str, dict[str, int]] = defaultdict(lambda: {"hit": 0, "stale": 0, "miss": 0, "refresh_error": 0})
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, outcome: str) -> None:
+    with _stats_lock:
+        _stats[name][outcome] += 1
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Per-cache hit/stale/miss counters for this process."""
+
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+def _coalesce(key: str, load: Callable[[], Any], compute_and_store: Callable[[], T], wait_seconds: float) -> T:
+    """Run ``compute_and_store`` once per key across threads and processes.
+
+    ``load`` returns the stored value (or None); followers in other processes
+    poll it while the leader holds the cross-process lock.
+    """
+
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = _inflight[key] = Future()
+    if not leader:
+        return fut.result()
+
+    try:
+        value = _compute_once(key, load, compute_and_store, wait_seconds)
+        fut.set_result(value)
+        return value
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _compute_once(key: str, load: Callable[[], Any], compute_and_store: Callable[[], T], wait_seconds: float) -> T:
+    lock_key = f"{key}:lock"
+    if not resilience.try_lock(lock_key, wait_seconds):
+        deadline = time.monotonic() + wait_seconds
+        while time.monotonic() < deadline:
+            time.sleep(_POLL_SECONDS)
+            value = load()
+            if value is not None:
+                return value
+        lock_key = None
+    try:
+        return compute_and_store()
+    finally:
+        if lock_key is not None:
+            resilience.release_lock(lock_key)
+
+
+def get_or_set_coalesced(
+    key: str,
+    compute: Callable[[], T],
+    timeout: int,
+    *,
+    wait_seconds: float = COALESCE_WAIT_SECONDS,
+) -> T:
+    """Cached value for ``key``; on a miss only one caller runs ``compute``.
+
+    Concurrent misses in this process wait on the leader's result. Across
+    processes a ``resilience.try_lock`` lock elects one leader while the others
+    poll for the value it stores. If the leader fails, its error is raised in
+    the waiting threads too; if it takes longer than ``wait_seconds``,
+    followers in other processes compute the value themselves.
+    """
+
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    def compute_and_store() -> T:
+        value = compute()
+        if value is not None:
+            cache.set(key, value, timeout=timeout)
+        return value
+
+    return _coalesce(key, lambda: cache.get(key), compute_and_store, wait_seconds)
+
+
+async def aget_or_set_coalesced(
+    key: str,
+    compute: Callable[[], Awaitable[T]],
+    timeout: int,
+    *,
+    wait_seconds: float = COALESCE_WAIT_SECONDS,
+) -> T:
+    """Async ``get_or_set_coalesced``: ``compute`` is a coroutine function.
+
+    Followers on the same event loop await the leader's future; across
+    processes the same lock elects one leader.
+    """
+
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    inflight_key = (id(asyncio.get_running_loop()), key)
+    fut = _ainflight.get(inflight_key)
+    if fut is not None:
+        return await asyncio.shield(fut)
+    fut = _ainflight[inflight_key] = asyncio.get_running_loop().create_future()
+
+    lock_key = f"{key}:lock"
+    try:
+        if not await sync_to_async(resilience.try_lock, thread_sensitive=False)(lock_key, wait_seconds):
+            deadline = time.monotonic() + wait_seconds
+            while time.monotonic() < deadline:
+                await asyncio.sleep(_POLL_SECONDS)
+                value = await cache.aget(key)
+                if value is not None:
+                    fut.set_result(value)
+                    return value
+            lock_key = None
+        try:
+            value = await compute()
+            if value is not None:
+                await cache.aset(key, value, timeout=timeout)
+        finally:
+            if lock_key is not None:
+                await sync_to_async(resilience.release_lock, thread_sensitive=False)(lock_key)
+        fut.set_result(value)
+        return value
+    except BaseException as e:
+        fut.set_exception(e)
+        # Mark retrieved so a leader-only failure doesn't log "never retrieved".
+        fut.exception()
+        raise
+    finally:
+        _ainflight.pop(inflight_key, None)
+
+
+def get_stale_while_revalidate(
+    key: str,
+    compute: Callable[[], T],
+    *,
+    soft_ttl: int,
+    hard_ttl: int,
+    name: str | None = None,
+    wait_seconds: float = COALESCE_WAIT_SECONDS,
+) -> T:
+    """Value for ``key`` from the shared cache with stale-while-revalidate.
+
+    - younger than ``soft_ttl``: served as is (a "hit");
+    - older, but within ``hard_ttl``: served as is ("stale") and one caller
+      across all processes schedules a background refresh;
+    - missing: computed once, with concurrent misses coalesced ("miss").
+
+    ``name`` labels the counters in ``cache_stats()`` (defaults to ``key``).
+    A failed background refresh keeps the stale value until ``hard_ttl``.
+    """
+
+    name = name or key
+
+    def store(value: T) -> None:
+        cache.set(key, {"value": value, "fresh_until": time.time() + soft_ttl}, timeout=hard_ttl)
+
+    entry = cache.get(key)
+    if entry is not None:
+        if time.time() < entry["fresh_until"]:
+            _count(name, "hit")
+        else:
+            _count(name, "stale")
+            _schedule_refresh(key, compute, store, name)
+        return entry["value"]
+
+    _count(name, "miss")
+
+    def compute_and_store() -> T:
+        value = compute()
+        store(value)
+        return value
+
+    def load():
+        entry = cache.get(key)
+        return None if entry is None else entry["value"]
+
+    return _coalesce(key, load, compute_and_store, wait_seconds)
+
+
+def _schedule_refresh(key: str, compute: Callable[[], T], store: Callable[[T], None], name: str) -> None:
+    """Start a background refresh of ``key`` unless another caller (in any process) holds its refresh lock."""
+
+    lock_key = f"{key}:refresh"
+    if not resilience.try_lock(lock_key, REFRESH_LOCK_SECONDS):
+        return
+
+    def refresh() -> None:
+        try:
+            store(compute())
+        except Exception:
+            _count(name, "refresh_error")
+        finally:
+            resilience.release_lock(lock_key)
+            # Refreshes may touch the ORM; don't leak this pool thread's connection.
+            connection.close()
+
+    try:
+        _refresh_pool.submit(refresh)
+    except RuntimeError:
+        # Interpreter shutting down; let the next caller retry.
+        resilience.release_lock(lock_key)
@@ -0,0 +1,105 @@
+"""Read access to the Instrument catalog.
+
+The catalog is small and read on hot paths (ticker, snapshot, dashboard), so
+it is loaded with one query and cached; saving or deleting an Instrument
+bumps the cache key.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import versions
+from .models import Instrument
+
+CACHE_KEY = "markets:v1:catalog"
+CACHE_SECONDS = 5 * 60
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    symbol: str
+    provider: str
+    provider_symbol: str
+    category: str
+    name: str
+    refresh_interval: int
+    enabled: bool
+    show_in_ticker: bool
+    preset: str
+    preset_label: str
+    preset_weight: float
+
+
+def all_instruments() -> list[CatalogEntry]:
+    cached = cache.get(CACHE_KEY)
+    if cached is not None:
+        return cached
+    rows = [
+        CatalogEntry(
+            symbol=i.symbol,
+            provider=i.provider,
+            provider_symbol=i.provider_symbol,
+            category=i.category,
+            name=i.name,
+            refresh_interval=i.refresh_interval,
+            enabled=i.enabled,
+            show_in_ticker=i.show_in_ticker,
+            preset=i.preset,
+            preset_label=i.preset_label,
+            preset_weight=i.preset_weight,
+        )
+        for i in Instrument.objects.all()
+    ]
+    cache.set(CACHE_KEY, rows, timeout=CACHE_SECONDS)
+    return rows
+
+
+def enabled_instruments() -> list[CatalogEntry]:
+    return [i for i in all_instruments() if i.enabled]
+
+
+def instruments_by_provider(*, enabled_only: bool = True) -> dict[str, list[CatalogEntry]]:
+    out: dict[str, list[CatalogEntry]] = defaultdict(list)
+    for i in enabled_instruments() if enabled_only else all_instruments():
+        out[i.provider].append(i)
+    return dict(out)
+
+
+def ticker_instruments() -> list[CatalogEntry]:
+    """Enabled instruments shown in the ticker and market snapshot."""
+
+    return [i for i in enabled_instruments() if i.show_in_ticker]
+
+
+def ticker_symbols() -> set[str]:
+    return {i.symbol for i in ticker_instruments()}
+
+
+def preset_portfolios() -> dict[str, dict]:
+    """Dashboard presets as ``{key: {"label": ..., "items": [(symbol, weight), ...]}}``."""
+
+    out: dict[str, dict] = {}
+    for i in all_instruments():
+        if not i.preset:
+            continue
+        p = out.setdefault(i.preset, {"label": i.preset_label or i.name, "items": []})
+        p["items"].append((i.provider_symbol, i.preset_weight))
+    return out
+
+
+def invalidate() -> None:
+    cache.delete(CACHE_KEY)
+    # The ticker/snapshot instrument set may have changed.
+    versions.bump(latest=True)
+
+
+@receiver(post_save, sender=Instrument)
+@receiver(post_delete, sender=Instrument)
+def _instrument_changed(sender, **kwargs):
+    invalidate()
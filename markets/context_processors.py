@@ -0,0 +1,8 @@
+from __future__ import annotations
+
+from django.conf import settings
+
+
+def live_ticker(request):
+    # The SSE ticker route only exists with the async views (markets.urls).
+    return {"markets_ticker_stream": settings.MARKETS_ASYNC_VIEWS}
@@ -0,0 +1,67 @@
+"""Largest-Triangle-Three-Buckets downsampling for chart payloads."""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+MIN_POINTS = 3
+MAX_POINTS = 5000
+
+
+def parse_max_points(raw: str | None) -> int | None:
+    """``max_points`` query param -> clamped int, or None for "no downsampling"."""
+
+    if not raw:
+        return None
+    try:
+        n = int(raw)
+    except ValueError:
+        return None
+    if n <= 0:
+        return None
+    return max(MIN_POINTS, min(n, MAX_POINTS))
+
+
+def lttb_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> list[int]:
+    """Indices of the points LTTB keeps; first and last are always kept.
+
+    ``xs`` must be ascending. Returns every index when ``threshold`` is not
+    smaller than the input.
+    """
+
+    n = len(xs)
+    if threshold >= n or threshold < MIN_POINTS:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    out = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex.
+        nxt_lo = int((i + 1) * every) + 1
+        nxt_hi = min(int((i + 2) * every) + 1, n)
+        span = nxt_hi - nxt_lo
+        avg_x = sum(xs[nxt_lo:nxt_hi]) / span
+        avg_y = sum(ys[nxt_lo:nxt_hi]) / span
+
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        a = best
+    out.append(n - 1)
+    return out
+
+
+def lttb(points: Sequence[tuple[float, float]], threshold: int | None) -> list[tuple[float, float]]:
+    """Downsample ``(x, y)`` points to at most ``threshold`` points."""
+
+    if not threshold or threshold >= len(points):
+        return list(points)
+    idx = lttb_indices([p[0] for p in points], [p[1] for p in points], threshold)
+    return [points[i] for i in idx]
@@ -0,0 +1,483 @@
+"""Shared keep-alive HTTP client for upstream market data providers.
+
+Connections are pooled per (scheme, host, port) and reused across calls and
+threads, responses are requested gzip-compressed, and callers can opt into
+conditional requests (ETag / Last-Modified) so unchanged payloads come back
+as a cheap 304 served from the last stored body. Async views use ``aget``,
+backed by an httpx client per event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+import weakref
+import zlib
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+import httpx
+from django.core.cache import cache
+
+
+USER_AGENT = "uzwire/1.0 (+https://uzwire.uz)"
+
+# Idle connections kept per host; extra concurrent connections are closed after use.
+MAX_IDLE_PER_HOST = 4
+MAX_REDIRECTS = 3
+
+# Validators + last body for conditional requests.
+VALIDATOR_CACHE_SECONDS = 24 * 60 * 60
+
+# Timeouts and connection failures, from the sync client or from ``aget``.
+TRANSPORT_ERRORS = (OSError, asyncio.TimeoutError, http.client.HTTPException, httpx.TransportError)
+
+
+class HttpError(Exception):
+    def __init__(self, url: str, status: int, reason: str = ""):
+        super().__init__(f"HTTP {status} {reason} for {url}".strip())
+        self.url = url
+        self.status = status
+
+
+@dataclass(frozen=True)
+class HttpResponse:
+    url: str
+    status: int
+    body: bytes
+    headers: dict[str, str]
+    # True when the upstream answered 304 and ``body`` is the stored copy.
+    not_modified: bool = False
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode("utf-8"))
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    errors: int = 0
+    not_modified: int = 0
+    reused: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seconds: float = 0.0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=200))
+
+    @property
+    def avg_seconds(self) -> float:
+        return self.total_seconds / self.requests if self.requests else 0.0
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        values = sorted(self.latencies)
+        idx = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+        return values[idx]
+
+
+class LineStream:
+    """Lines of a streamed response body, plus its status and validators."""
+
+    def __init__(self, resp: http.client.HTTPResponse, chunk_size: int):
+        self._resp = resp
+        self._chunk_size = chunk_size
+        self.status = resp.status
+        self.not_modified = resp.status == 304
+        self.etag = resp.getheader("ETag")
+        self.last_modified = resp.getheader("Last-Modified")
+
+    @property
+    def validators(self) -> dict[str, str | None] | None:
+        """``validators`` for the next ``stream_lines`` call, or None if the upstream sent none."""
+
+        if not (self.etag or self.last_modified):
+            return None
+        return {"etag": self.etag, "last_modified": self.last_modified}
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self.not_modified:
+            return
+        decoder = _stream_decoder(self._resp.getheader("Content-Encoding") or "")
+        carry = b""
+        while True:
+            chunk = self._resp.read(self._chunk_size)
+            if not chunk:
+                break
+            data = carry + (decoder.decompress(chunk) if decoder else chunk)
+            parts = data.split(b"\n")
+            carry = parts.pop()
+            yield from parts
+        if decoder:
+            carry += decoder.flush()
+        if carry:
+            yield carry
+
+
+def _conditional_headers(headers: dict[str, str], stored: dict | None) -> dict[str, str]:
+    if stored:
+        if stored.get("etag"):
+            headers["If-None-Match"] = stored["etag"]
+        if stored.get("last_modified"):
+            headers["If-Modified-Since"] = stored["last_modified"]
+    return headers
+
+
+class HttpClient:
+    def __init__(self, *, max_idle_per_host: int = MAX_IDLE_PER_HOST, user_agent: str = USER_AGENT):
+        self.max_idle_per_host = max_idle_per_host
+        self.user_agent = user_agent
+        self._lock = threading.Lock()
+        self._idle: dict[tuple[str, str, int], deque[http.client.HTTPConnection]] = {}
+        self._stats: dict[str, HostStats] = {}
+
+    # -- connection pool -------------------------------------------------
+
+    @staticmethod
+    def _connect(key: tuple[str, str, int], timeout: float) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=timeout)
+
+    def _acquire(self, key: tuple[str, str, int], timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused)."""
+
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            return self._connect(key, timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, key: tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, deque())
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._idle.values())
+            self._idle.clear()
+        for idle in pools:
+            for conn in idle:
+                conn.close()
+
+    # -- stats -----------------------------------------------------------
+
+    def _record(self, host: str, seconds: float, *, error: bool = False, not_modified: bool = False, reused: bool = False):
+        with self._lock:
+            st = self._stats.setdefault(host, HostStats())
+            st.requests += 1
+            st.total_seconds += seconds
+            st.last_seconds = seconds
+            st.max_seconds = max(st.max_seconds, seconds)
+            st.latencies.append(seconds)
+            if error:
+                st.errors += 1
+            if not_modified:
+                st.not_modified += 1
+            if reused:
+                st.reused += 1
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Per-host latency/volume counters for this process."""
+
+        with self._lock:
+            return {
+                host: {
+                    "requests": st.requests,
+                    "errors": st.errors,
+                    "not_modified": st.not_modified,
+                    "reused": st.reused,
+                    "avg_ms": st.avg_seconds * 1000.0,
+                    "p95_ms": st.percentile(0.95) * 1000.0,
+                    "max_ms": st.max_seconds * 1000.0,
+                    "last_ms": st.last_seconds * 1000.0,
+                }
+                for host, st in self._stats.items()
+            }
+
+    # -- requests --------------------------------------------------------
+
+    def _open(self, url: str, headers: dict[str, str], timeout: float):
+        """Send a GET and return (key, conn, resp, reused, t0) with the body unread."""
+
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname or "", port)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        conn, reused = self._acquire(key, timeout)
+        t0 = time.monotonic()
+        try:
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server dropped an idle keep-alive connection; retry once on a fresh one.
+                conn.close()
+                if not reused:
+                    raise
+                conn, reused = self._connect(key, timeout), False
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+        except Exception:
+            conn.close()
+            self._record(key[1], time.monotonic() - t0, error=True, reused=reused)
+            raise
+        return key, conn, resp, reused, t0
+
+    def _finish(self, key, conn, resp, reused: bool, t0: float, *, error: bool = False) -> None:
+        """Return the connection to the pool (if the body was fully read) and record timing."""
+
+        if error or resp.will_close or not resp.isclosed():
+            conn.close()
+        else:
+            self._release(key, conn)
+        self._record(
+            key[1],
+            time.monotonic() - t0,
+            error=error or resp.status >= 400,
+            not_modified=resp.status == 304,
+            reused=reused,
+        )
+
+    def _send(self, url: str, headers: dict[str, str], timeout: float) -> tuple[int, str, dict[str, str], bytes]:
+        key, conn, resp, reused, t0 = self._open(url, headers, timeout)
+        try:
+            body = resp.read()
+        except Exception:
+            self._finish(key, conn, resp, reused, t0, error=True)
+            raise
+        self._finish(key, conn, resp, reused, t0)
+        return resp.status, resp.reason, {k.lower(): v for k, v in resp.getheaders()}, body
+
+    @contextmanager
+    def stream_lines(
+        self,
+        url: str,
+        *,
+        accept: str = "*/*",
+        timeout: float = 10,
+        chunk_size: int = 64 * 1024,
+        validators: dict[str, str | None] | None = None,
+    ) -> Iterator[LineStream]:
+        """Yield a ``LineStream`` over response lines, decompressed as they arrive.
+
+        Only ``chunk_size`` bytes (plus one partial line) are held at a time.
+        Leaving the block early closes the connection instead of pooling it.
+
+        ``validators`` (``{"etag", "last_modified"}`` from an earlier
+        ``LineStream``) makes the request conditional. The body is not stored
+        here, so on a 304 the stream is empty with ``not_modified`` set, and the
+        caller serves whatever it kept from the earlier response.
+        """
+
+        headers = _conditional_headers(self._headers(accept), validators)
+        target = url
+        for _hop in range(MAX_REDIRECTS + 1):
+            key, conn, resp, reused, t0 = self._open(target, headers, timeout)
+            location = resp.getheader("Location")
+            if resp.status in (301, 302, 303, 307, 308) and location:
+                resp.read()
+                self._finish(key, conn, resp, reused, t0)
+                target = urllib.parse.urljoin(target, location)
+                continue
+            break
+        else:
+            raise HttpError(url, resp.status, "too many redirects")
+
+        if resp.status >= 400 or (resp.status == 304 and not validators):
+            resp.read()
+            self._finish(key, conn, resp, reused, t0)
+            raise HttpError(url, resp.status, resp.reason)
+
+        error = True
+        try:
+            yield LineStream(resp, chunk_size)
+            error = False
+        finally:
+            self._finish(key, conn, resp, reused, t0, error=error)
+
+    def _headers(self, accept: str) -> dict[str, str]:
+        return {
+            "User-Agent": self.user_agent,
+            "Accept": accept,
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+
+    def get(
+        self,
+        url: str,
+        *,
+        accept: str = "*/*",
+        timeout: float = 10,
+        conditional: bool = False,
+    ) -> HttpResponse:
+        headers = self._headers(accept)
+
+        validator_key = None
+        stored = None
+        if conditional:
+            validator_key = "http:v1:validators:" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+            stored = cache.get(validator_key)
+            headers = _conditional_headers(headers, stored)
+
+        target = url
+        for _hop in range(MAX_REDIRECTS + 1):
+            status, reason, resp_headers, raw = self._send(target, headers, timeout)
+            if status in (301, 302, 303, 307, 308) and resp_headers.get("location"):
+                target = urllib.parse.urljoin(target, resp_headers["location"])
+                continue
+            break
+        else:
+            raise HttpError(url, status, "too many redirects")
+
+        if status == 304 and stored is not None:
+            return HttpResponse(url=url, status=304, body=stored["body"], headers=resp_headers, not_modified=True)
+        if status >= 400:
+            raise HttpError(url, status, reason)
+
+        body = _decode_body(raw, resp_headers.get("content-encoding", ""))
+
+        if validator_key and (resp_headers.get("etag") or resp_headers.get("last-modified")):
+            cache.set(
+                validator_key,
+                {
+                    "etag": resp_headers.get("etag"),
+                    "last_modified": resp_headers.get("last-modified"),
+                    "body": body,
+                },
+                timeout=VALIDATOR_CACHE_SECONDS,
+            )
+
+        return HttpResponse(url=url, status=status, body=body, headers=resp_headers)
+
+
+# Per event loop: an httpx.AsyncClient's connections belong to the loop that opened them.
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = weakref.WeakKeyDictionary()
+
+
+def _async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    aclient = _async_clients.get(loop)
+    if aclient is None:
+        aclient = _async_clients[loop] = httpx.AsyncClient(
+            follow_redirects=True,
+            max_redirects=MAX_REDIRECTS,
+            limits=httpx.Limits(max_keepalive_connections=MAX_IDLE_PER_HOST),
+        )
+    return aclient
+
+
+async def aget(url: str, *, accept: str = "*/*", timeout: float = 10) -> HttpResponse:
+    """Non-blocking GET for async views (pooled per event loop, no conditional caching).
+
+    Latency is recorded in the same per-host stats as the pooled sync client.
+    """
+
+    headers = client._headers(accept)
+    host = urllib.parse.urlsplit(url).hostname or ""
+    t0 = time.monotonic()
+    try:
+        resp = await asyncio.wait_for(_async_client().get(url, headers=headers, timeout=timeout), timeout)
+    except httpx.TooManyRedirects:
+        client._record(host, time.monotonic() - t0, error=True)
+        raise HttpError(url, 0, "too many redirects") from None
+    except Exception:
+        client._record(host, time.monotonic() - t0, error=True)
+        raise
+    client._record(host, time.monotonic() - t0, error=resp.status_code >= 400)
+    if resp.status_code >= 400:
+        raise HttpError(url, resp.status_code, resp.reason_phrase)
+    # httpx has already undone any gzip/deflate Content-Encoding.
+    return HttpResponse(url=url, status=resp.status_code, body=resp.content, headers=dict(resp.headers))
+
+
+def _decode_body(raw: bytes, encoding: str) -> bytes:
+    encoding = (encoding or "").strip().lower()
+    if encoding == "gzip":
+        return gzip.decompress(raw)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(raw)
+        except zlib.error:
+            # Some servers send raw deflate without the zlib header.
+            return zlib.decompress(raw, -zlib.MAX_WBITS)
+    return raw
+
+
+class _DeflateDecoder:
+    """Streaming ``deflate`` that, like ``_decode_body``, also accepts raw deflate without the zlib header."""
+
+    def __init__(self):
+        self._obj = None
+        self._head = b""
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._obj is None:
+            # The zlib header is two bytes; wait for both before choosing.
+            self._head += data
+            if len(self._head) < 2:
+                return b""
+            data, self._head = self._head, b""
+            self._obj = zlib.decompressobj()
+            try:
+                return self._obj.decompress(data)
+            except zlib.error:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(data)
+
+    def flush(self) -> bytes:
+        if self._obj is None:
+            if not self._head:
+                return b""
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._obj.decompress(self._head) + self._obj.flush()
+        return self._obj.flush()
+
+
+def _stream_decoder(encoding: str):
+    encoding = (encoding or "").strip().lower()
+    if encoding == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _DeflateDecoder()
+    return None
+
+
+# Process-wide client shared by all markets fetchers.
+client = HttpClient()
+
+
+def get_json(url: str, *, timeout: float = 10, conditional: bool = False) -> Any:
+    return client.get(url, accept="application/json", timeout=timeout, conditional=conditional).json()
+
+
+def get_text(url: str, *, timeout: float = 10, conditional: bool = False) -> str:
+    return client.get(url, accept="text/plain,*/*", timeout=timeout, conditional=conditional).text()
+
+
+def host_stats() -> dict[str, dict[str, float]]:
+    return client.stats()
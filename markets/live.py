@@ -0,0 +1,201 @@
+"""Live ticker deltas over Server-Sent Events.
+
+Ingest publishes a compact delta (changed/added items, removed symbols) to an
+event log in the shared cache whenever the ticker payload changes. Each ASGI
+process runs a single ``TickerHub`` task that polls that log and fans new
+events out to its connected clients, so upstream load is one small cache read
+per process per poll interval, whatever the number of clients.
+
+Each client has a bounded queue. A client that falls behind gets its queue
+dropped and a ``reset`` event, telling it to refetch the full ticker, as does
+a client reconnecting with a Last-Event-ID older than the retained log.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import resilience
+
+LOG_KEY = "markets:v1:live:ticker:log"
+LAST_ID_KEY = "markets:v1:live:ticker:last_id"
+# Ticker items as of the last published event, to diff the next one against.
+ITEMS_KEY = "markets:v1:live:ticker:items"
+# Events kept for Last-Event-ID replay.
+LOG_SIZE = 200
+
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 15.0
+CLIENT_BUFFER = 32
+# Django 4.2 doesn't notice client disconnects while streaming, so streams are
+# closed after this long and EventSource reconnects with Last-Event-ID.
+STREAM_MAX_SECONDS = 5 * 60
+RETRY_MS = 3000
+
+_publish_lock = threading.RLock()
+
+
+def ticker_delta(old_items: list[dict], new_items: list[dict]) -> dict | None:
+    """Items that are new or changed, plus symbols that disappeared; None if nothing changed."""
+
+    old = {i["symbol"]: i for i in old_items}
+    new = {i["symbol"]: i for i in new_items}
+    changed = [i for sym, i in new.items() if old.get(sym) != i]
+    removed = [sym for sym in old if sym not in new]
+    if not changed and not removed:
+        return None
+    return {"items": changed, "removed": removed}
+
+
+def publish(event: str, data: dict) -> int:
+    """Append an event to the shared log; returns its id. Called from ingest."""
+
+    cache = resilience.shared_cache()
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+    with _publish_lock:
+        log = cache.get(LOG_KEY) or []
+        event_id = (log[-1][0] if log else int(cache.get(LAST_ID_KEY) or 0)) + 1
+        log.append((event_id, event, payload))
+        cache.set(LOG_KEY, log[-LOG_SIZE:], timeout=None)
+        cache.set(LAST_ID_KEY, event_id, timeout=None)
+    return event_id
+
+
+def publish_ticker(items: list[dict], as_of: str | None) -> int | None:
+    """Publish the delta between the last published ticker items and ``items``."""
+
+    cache = resilience.shared_cache()
+    with _publish_lock:
+        previous = cache.get(ITEMS_KEY)
+        cache.set(ITEMS_KEY, items, timeout=None)
+        if previous is None:
+            return None
+        delta = ticker_delta(previous, items)
+        if delta is None:
+            return None
+        return publish("ticker", {"as_of": as_of, **delta})
+
+
+def _format(event_id: int | None, event: str, payload: str) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+RESET = (None, "reset", "{}")
+
+
+@dataclass(eq=False)
+class Subscriber:
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=CLIENT_BUFFER))
+
+    def offer(self, item: tuple) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Too far behind: drop the backlog and make the client resync.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+
+class TickerHub:
+    """One poller per process/event loop, fanning out to every subscriber."""
+
+    def __init__(self):
+        self._subscribers: set[Subscriber] = set()
+        self._task: asyncio.Task | None = None
+        self._last_id = 0
+
+    async def _read_log(self) -> list[tuple[int, str, str]]:
+        return await resilience.shared_cache().aget(LOG_KEY) or []
+
+    async def subscribe(self, last_event_id: int | None) -> tuple[Subscriber, list[tuple]]:
+        """Register a client; returns it with the events to replay first."""
+
+        sub = Subscriber()
+        replay: list[tuple] = []
+        if last_event_id is not None:
+            last_id = int(await resilience.shared_cache().aget(LAST_ID_KEY) or 0)
+            log = await self._read_log()
+            if last_event_id > last_id or (log and last_event_id < log[0][0] - 1):
+                # Log was reset or has rotated past the client: resync.
+                replay = [RESET]
+            else:
+                replay = [e for e in log if e[0] > last_event_id]
+        if self._task is None or self._task.done():
+            self._last_id = int(await resilience.shared_cache().aget(LAST_ID_KEY) or 0)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._subscribers.add(sub)
+        return sub, replay
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self._subscribers.discard(sub)
+
+    async def _run(self) -> None:
+        cache = resilience.shared_cache()
+        while self._subscribers:
+            await asyncio.sleep(POLL_SECONDS)
+            try:
+                last_id = int(await cache.aget(LAST_ID_KEY) or 0)
+                if last_id == self._last_id:
+                    continue
+                log = await self._read_log()
+            except Exception:
+                continue
+            fresh = [e for e in log if e[0] > self._last_id]
+            if log and log[0][0] > self._last_id + 1:
+                # Missed events that already rotated out of the log.
+                fresh = [RESET]
+            self._last_id = last_id
+            for sub in list(self._subscribers):
+                for e in fresh:
+                    sub.offer(e)
+
+
+_hubs: dict[int, TickerHub] = {}
+
+
+def hub() -> TickerHub:
+    # One hub per event loop (one loop per ASGI worker process).
+    loop = asyncio.get_running_loop()
+    h = _hubs.get(id(loop))
+    if h is None:
+        h = _hubs[id(loop)] = TickerHub()
+    return h
+
+
+async def event_stream(last_event_id: int | None) -> AsyncIterator[bytes]:
+    h = hub()
+    sub, replay = await h.subscribe(last_event_id)
+    deadline = time.monotonic() + STREAM_MAX_SECONDS
+    # Events can arrive both via replay and the hub; send each id once.
+    sent_id = 0 if replay and replay[0] is RESET else (last_event_id or 0)
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode("utf-8")
+        for e in replay:
+            if e[0] is not None:
+                sent_id = e[0]
+            yield _format(*e)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                e = await asyncio.wait_for(sub.queue.get(), timeout=min(HEARTBEAT_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if e[0] is not None:
+                if e[0] <= sent_id:
+                    continue
+                sent_id = e[0]
+            yield _format(*e)
+    finally:
+        h.unsubscribe(sub)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from asgiref.sync import ThreadSensitiveContext
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import path
+
+from markets import catalog, resilience, views
+from markets.models import Instrument
+
+BENCH_PREFIX = "__bench_async_"
+
+# URLconf used while benchmarking (ROOT_URLCONF points here): both variants of
+# the crypto chart view behind the full middleware stack. Under /api/ so that
+# site stats don't count the requests.
+urlpatterns = [
+    path("api/bench/sync/<str:coin_id>/", views.crypto_chart),
+    path("api/bench/async/<str:coin_id>/", views.crypto_chart_async),
+]
+
+
+def _slow_upstream(delay: float) -> ThreadingHTTPServer:
+    """Local stand-in for CoinGecko answering every market_chart request after ``delay`` seconds."""
+
+    now_ms = int(time.time() * 1000)
+    body = json.dumps({"prices": [[now_ms - i * 60_000, 100.0 + i % 7] for i in range(288)]}).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _summary(label: str, n: int, errors: int, elapsed: float, latencies: list[float]) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return (
+        f"{label:<6} {n} requests in {elapsed:6.2f}s  {n / elapsed:7.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.1f}ms  p95 {p95 * 1000:7.1f}ms  errors {errors}"
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sync and async crypto chart view throughput against a slow local upstream "
+        "(every request is a cache miss)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--upstream-delay", type=float, default=0.5, help="Upstream latency in seconds.")
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=3,
+            help="Sync worker threads (the sync side can't serve more concurrent requests than this).",
+        )
+        parser.add_argument("--concurrency", type=int, default=100, help="Concurrent requests on the async side.")
+
+    def handle(self, *args, **options):
+        n = options["requests"]
+        server = _slow_upstream(options["upstream_delay"])
+        upstream = f"http://127.0.0.1:{server.server_port}/api/v3"
+
+        # One throwaway catalog coin per request, variant and run, so every
+        # request misses the view and upstream caches.
+        run = f"{int(time.time()):x}"
+        coins = {variant: [f"{BENCH_PREFIX}{run}_{variant[0]}{i}" for i in range(n)] for variant in ("sync", "async")}
+        Instrument.objects.bulk_create(
+            [
+                Instrument(
+                    symbol=coin.upper()[:32],
+                    provider=Instrument.PROVIDER_COINGECKO,
+                    provider_symbol=coin,
+                    category="Bench",
+                    name=coin[:64],
+                    enabled=False,
+                    show_in_ticker=False,
+                )
+                for ids in coins.values()
+                for coin in ids
+            ]
+        )
+        catalog.invalidate()
+        # A previous run may have tripped the local host's breaker.
+        resilience.breaker_for("127.0.0.1").record_success()
+        try:
+            with override_settings(
+                ROOT_URLCONF=__name__,
+                MARKETS_COINGECKO_API_URL=upstream,
+                ALLOWED_HOSTS=["testserver"],
+            ):
+                self.stdout.write(
+                    f"upstream delay {options['upstream_delay'] * 1000:.0f}ms; "
+                    f"sync: {options['threads']} threads, async: {options['concurrency']} concurrent"
+                )
+                self.stdout.write(self._run_sync(coins["sync"], options["threads"]))
+                self.stdout.write(asyncio.run(self._run_async(coins["async"], options["concurrency"])))
+        finally:
+            server.shutdown()
+            Instrument.objects.filter(symbol__startswith=BENCH_PREFIX.upper()).delete()
+            catalog.invalidate()
+
+    def _run_sync(self, coins: list[str], threads: int) -> str:
+        client = Client()
+
+        def one(coin: str) -> tuple[float, bool]:
+            t0 = time.perf_counter()
+            response = client.get(f"/api/bench/sync/{coin}/", {"days": 1})
+            return time.perf_counter() - t0, response.status_code == 200
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(one, coins))
+        elapsed = time.perf_counter() - t0
+        return _summary("sync", len(coins), sum(not ok for _, ok in results), elapsed, [lat for lat, _ in results])
+
+    async def _run_async(self, coins: list[str], concurrency: int) -> str:
+        client = AsyncClient()
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(coin: str) -> tuple[float, bool]:
+            # ASGIHandler gives each request its own thread for thread-sensitive
+            # work; AsyncClient doesn't, so do the same here.
+            async with gate, ThreadSensitiveContext():
+                t0 = time.perf_counter()
+                response = await client.get(f"/api/bench/async/{coin}/", {"days": 1})
+                return time.perf_counter() - t0, response.status_code == 200
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(coin) for coin in coins))
+        elapsed = time.perf_counter() - t0
+        return _summary("async", len(coins), sum(not ok for _, ok in results), elapsed, [lat for lat, _ in results])
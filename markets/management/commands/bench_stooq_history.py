@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import time
+import tracemalloc
+import zlib
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+
+from markets.services import parse_stooq_history_tail
+
+
+def _synthetic_csv(rows: int) -> bytes:
+    buf = io.StringIO()
+    buf.write("Date,Open,High,Low,Close,Volume\r\n")
+    d = date(2026, 1, 1) - timedelta(days=rows)
+    px = 100.0
+    for i in range(rows):
+        px *= 1.0 + ((i * 7919) % 200 - 100) / 10000.0
+        buf.write(f"{d.isoformat()},{px:.2f},{px * 1.01:.2f},{px * 0.99:.2f},{px:.2f},{1000 + i}\r\n")
+        d += timedelta(days=1)
+    return buf.getvalue().encode("utf-8")
+
+
+def _legacy_parse(body: bytes, days: int) -> list[tuple[date, float]]:
+    # The pre-streaming fetch_stooq_history path: whole text, every row as a dict.
+    text = body.decode("utf-8", errors="replace")
+    rows = list(csv.DictReader(text.splitlines()))
+    out: list[tuple[date, float]] = []
+    for row in rows[-max(2, days):]:
+        ds = (row.get("Date") or "").strip()
+        close_s = (row.get("Close") or "").strip()
+        if not ds or not close_s or close_s == "N/A":
+            continue
+        try:
+            out.append((datetime.strptime(ds, "%Y-%m-%d").date(), float(close_s)))
+        except Exception:
+            continue
+    out.sort(key=lambda t: t[0])
+    return out
+
+
+def _streaming_parse(gz_body: bytes, days: int, chunk_size: int = 64 * 1024) -> list[tuple[date, float]]:
+    # Mirrors HttpClient.stream_lines: gzip chunks in, lines out.
+    def lines():
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        carry = b""
+        src = io.BytesIO(gz_body)
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            parts = (carry + decoder.decompress(chunk)).split(b"\n")
+            carry = parts.pop()
+            yield from parts
+        carry += decoder.flush()
+        if carry:
+            yield carry
+
+    return parse_stooq_history_tail(lines(), max(2, days))
+
+
+def _measure(fn, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+class Command(BaseCommand):
+    help = "Benchmark legacy vs streaming tail-only parsing of Stooq history CSVs (offline, synthetic data)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=40000, help="Rows in the synthetic CSV.")
+        parser.add_argument("--days", type=int, action="append", help="Tail sizes to keep (repeatable).")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        body = _synthetic_csv(options["rows"])
+        gz_body = gzip.compress(body)
+        self.stdout.write(
+            f"{options['rows']} rows, {len(body) / 1024:.0f} KiB raw, {len(gz_body) / 1024:.0f} KiB gzip"
+        )
+
+        for days in options["days"] or [45, 1260, 4200]:
+            legacy = _legacy_parse(body, days)
+            streamed = _streaming_parse(gz_body, days)
+            if legacy != streamed:
+                self.stderr.write(f"WARN: outputs differ for days={days}")
+
+            # Legacy timing excludes gunzip; the streaming path includes it.
+            lt, lp = _measure(lambda: _legacy_parse(body, days), options["repeat"])
+            st, sp = _measure(lambda: _streaming_parse(gz_body, days), options["repeat"])
+            self.stdout.write(
+                f"days={days:>5}  legacy {lt * 1000:7.1f}ms peak {lp / 1024:8.0f} KiB  |  "
+                f"streaming {st * 1000:7.1f}ms peak {sp / 1024:8.0f} KiB  "
+                f"({lt / st:.1f}x faster, {lp / max(1, sp):.0f}x less memory)"
+            )
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import random
+import statistics
+import time
+from bisect import bisect_left
+
+from django.core.management.base import BaseCommand
+
+from markets import ticks
+from markets.models import TickChunk
+
+BENCH_INSTRUMENT = "__BENCH__"
+
+
+def _synthetic_ticks(n: int, seed: int = 7) -> tuple[list[int], list[float]]:
+    rng = random.Random(seed)
+    t = 1_790_000_000_000
+    px = 65_000.0
+    ts: list[int] = []
+    prices: list[float] = []
+    for _ in range(n):
+        t += rng.randint(200, 1800)
+        px = max(1.0, px + rng.choice((-1, 1)) * rng.randint(0, 250) / 100.0)
+        ts.append(t)
+        prices.append(round(px, 2))
+    return ts, prices
+
+
+def _encode_chunks(ts: list[int], prices: list[float]) -> list[tuple[int, int, bytes]]:
+    out = []
+    for i in range(0, len(ts), ticks.CHUNK_POINTS):
+        part = ts[i : i + ticks.CHUNK_POINTS]
+        out.append((part[0], part[-1], ticks.encode_chunk(part, [prices[i : i + ticks.CHUNK_POINTS]])))
+    return out
+
+
+def _read_in_memory(chunks: list[tuple[int, int, bytes]], ends: list[int], start: int, end: int) -> int:
+    # Same selection as read_range (end_ts >= start, start_ts <= end) without the DB round trip.
+    n = 0
+    for i in range(bisect_left(ends, start), len(chunks)):
+        c_start, _c_end, data = chunks[i]
+        if c_start > end:
+            break
+        cts, _cols = ticks.slice_range(*ticks.decode_chunk(data), start, end)
+        n += len(cts)
+    return n
+
+
+def _percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"p50 {statistics.median(samples) * 1000:7.2f}ms  p95 {p95 * 1000:7.2f}ms"
+
+
+class Command(BaseCommand):
+    help = "Benchmark tick store storage per million ticks and range-read latency (synthetic data)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ticks", type=int, default=1_000_000)
+        parser.add_argument("--reads", type=int, default=50, help="Random range reads per window size.")
+        parser.add_argument(
+            "--db",
+            action="store_true",
+            help=f"Also write through append_ticks and read through read_range (uses instrument {BENCH_INSTRUMENT}).",
+        )
+
+    def handle(self, *args, **options):
+        n = options["ticks"]
+        ts, prices = _synthetic_ticks(n)
+        span_ms = ts[-1] - ts[0]
+
+        t0 = time.perf_counter()
+        chunks = _encode_chunks(ts, prices)
+        encode_s = time.perf_counter() - t0
+        stored = sum(len(c[2]) for c in chunks)
+        per_million = stored * 1_000_000 / n
+        self.stdout.write(
+            f"{n} ticks over {span_ms / 86_400_000:.1f} days in {len(chunks)} chunks; encoded in {encode_s:.2f}s"
+        )
+        self.stdout.write(
+            f"storage: {stored / 1024:.0f} KiB blobs, {per_million / 1024 / 1024:.2f} MiB per million ticks, "
+            f"{stored / n:.2f} bytes/tick (raw int64+float64: 16 bytes/tick, {16 * n / max(1, stored):.1f}x larger)"
+        )
+
+        rng = random.Random(11)
+        ends = [c[1] for c in chunks]
+        windows = {"1m": 60_000, "1h": 3_600_000, "1d": 86_400_000}
+        for label, width in windows.items():
+            if width > span_ms:
+                continue
+            samples = []
+            for _ in range(options["reads"]):
+                start = rng.randint(ts[0], ts[-1] - width)
+                t0 = time.perf_counter()
+                _read_in_memory(chunks, ends, start, start + width)
+                samples.append(time.perf_counter() - t0)
+            self.stdout.write(f"decode {label:>3} window: {_percentiles(samples)}")
+
+        if options["db"]:
+            self._bench_db(ts, prices, windows, options["reads"])
+
+    def _bench_db(self, ts, prices, windows, reads):
+        TickChunk.objects.filter(instrument=BENCH_INSTRUMENT).delete()
+        try:
+            t0 = time.perf_counter()
+            ticks.append_ticks(BENCH_INSTRUMENT, zip(ts, prices))
+            self.stdout.write(f"append_ticks (incl. 1m/5m/1h rollups): {time.perf_counter() - t0:.2f}s")
+            for resolution in ticks.RESOLUTIONS:
+                rows = TickChunk.objects.filter(instrument=BENCH_INSTRUMENT, resolution=resolution)
+                self.stdout.write(f"  {resolution:>4}: {rows.count()} chunks")
+
+            rng = random.Random(13)
+            for label, width in windows.items():
+                samples = []
+                for _ in range(reads):
+                    start = rng.randint(ts[0], max(ts[0], ts[-1] - width))
+                    t0 = time.perf_counter()
+                    ticks.read_range(BENCH_INSTRUMENT, start, start + width)
+                    samples.append(time.perf_counter() - t0)
+                self.stdout.write(f"read_range {label:>3} window: {_percentiles(samples)}")
+        finally:
+            TickChunk.objects.filter(instrument=BENCH_INSTRUMENT).delete()
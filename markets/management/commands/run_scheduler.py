@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import random
+import signal
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from markets import catalog
+from markets.management.commands.update_markets import PROVIDER_CONCURRENCY
+
+
+@dataclass(frozen=True)
+class Source:
+    provider: str
+    interval: int  # seconds
+
+
+# Floor for a provider's tick, whatever the catalog says.
+MIN_INTERVAL_SECONDS = 30
+
+# The catalog is re-read at least this often, to pick up admin edits.
+RELOAD_SECONDS = 30
+
+# Each run is delayed by up to this fraction of its interval so sources (and
+# replicas) don't hit upstreams in lockstep.
+JITTER_FRACTION = 0.1
+
+
+def effective_schedule() -> list[Source]:
+    """One source per provider with enabled instruments, ticking at their shortest refresh_interval.
+
+    update_markets then only refreshes the instruments that are actually due.
+    """
+
+    by_provider = catalog.instruments_by_provider()
+    return [
+        Source(provider=provider, interval=max(MIN_INTERVAL_SECONDS, min(i.refresh_interval for i in by_provider[provider])))
+        for provider in PROVIDER_CONCURRENCY
+        if by_provider.get(provider)
+    ]
+
+
+def _jitter(interval: int) -> float:
+    return random.uniform(0, interval * JITTER_FRACTION)
+
+
+class Command(BaseCommand):
+    help = "Run market ingest in one long-lived process, each source on its own interval."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run every source once, wait for completion and exit.",
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+
+        def request_stop(signum, _frame):
+            self.stdout.write(f"Received signal {signum}, finishing in-flight runs...")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        running: dict[str, Future] = {}
+        intervals: dict[str, int] = {}
+        last_start: dict[str, float] = {}
+        next_run: dict[str, float] = {}
+
+        pool = ThreadPoolExecutor(max_workers=len(PROVIDER_CONCURRENCY), thread_name_prefix="markets-sched")
+        try:
+            while not stop.is_set():
+                # Re-read the (cached) catalog every pass, so interval and
+                # enabled/disabled edits in the admin apply without a restart.
+                close_old_connections()
+                schedule = effective_schedule()
+                now = time.monotonic()
+                for src in schedule:
+                    if src.provider not in next_run:
+                        # A new source runs right away (plus a little jitter).
+                        next_run[src.provider] = now if options["once"] else now + _jitter(min(src.interval, 60))
+                        self.stdout.write(f"Scheduling {src.provider} every {src.interval}s")
+                    elif intervals[src.provider] != src.interval:
+                        self.stdout.write(f"{src.provider} interval changed to {src.interval}s")
+                        if src.provider in last_start:
+                            next_run[src.provider] = min(next_run[src.provider], last_start[src.provider] + src.interval)
+                    intervals[src.provider] = src.interval
+                for provider in set(next_run) - {src.provider for src in schedule}:
+                    self.stdout.write(f"No enabled instruments left for {provider}, unscheduling")
+                    del next_run[provider], intervals[provider]
+                    last_start.pop(provider, None)
+
+                for src in schedule:
+                    if now < next_run[src.provider]:
+                        continue
+                    fut = running.get(src.provider)
+                    if fut is not None and not fut.done():
+                        # Previous run is still going; skip this slot rather than pile up.
+                        self.stderr.write(f"WARN: {src.provider} still running, skipping this run")
+                    else:
+                        running[src.provider] = pool.submit(self._run_source, src.provider)
+                        last_start[src.provider] = now
+                    next_run[src.provider] = now + src.interval + _jitter(src.interval)
+
+                if options["once"]:
+                    break
+                wake = min(next_run.values(), default=now + RELOAD_SECONDS) - time.monotonic()
+                stop.wait(timeout=min(RELOAD_SECONDS, max(0.5, wake)))
+        finally:
+            pool.shutdown(wait=True)
+            self.stdout.write("Scheduler stopped.")
+
+    def _run_source(self, provider: str) -> None:
+        # Each worker thread has its own DB connection; drop stale ones between runs.
+        close_old_connections()
+        try:
+            call_command("update_markets", only=[provider], stdout=self.stdout, stderr=self.stderr)
+        except Exception as e:
+            self.stderr.write(f"WARN: {provider} run failed: {e}")
+        finally:
+            connection.close()
@@ -1,95 +1,482 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
+from markets import bars, catalog, packed, payloads, ticks, versions
+from markets.catalog import CatalogEntry
+from markets.httpclient import host_stats
+from markets.models import IngestWatermark, Instrument, MarketLatest
 from markets.services import (
+    STOOQ_QUOTE_BATCH_SIZE,
     fetch_coingecko_chart,
+    fetch_coingecko_chart_range,
+    fetch_coingecko_prices,
     fetch_fear_greed_altme,
     fetch_fx_rates_to_uzs,
     fetch_stooq_history,
+    fetch_stooq_quotes,
+    latest_from_points,
+    load_watermarks,
     persist_latest_from_points,
-    persist_points,
+    persist_latest_rows,
+    persist_series,
+    persist_watermarks,
+    previous_values,
 )
 
 
+# Max in-flight requests per upstream provider, so a single tick never bursts
+# past free-tier rate limits even when the pool has spare workers.
+PROVIDER_CONCURRENCY: dict[str, int] = {
+    Instrument.PROVIDER_COINGECKO: 1,
+    Instrument.PROVIDER_STOOQ: 2,
+    Instrument.PROVIDER_ERAPI: 1,
+    Instrument.PROVIDER_ALTME: 1,
+}
+
+DEFAULT_WORKERS = 4
+
+# Incremental fetches re-request a few days before the watermark so late
+# revisions and today's partial candle are picked up; every instrument is
+# refetched over its full window once per FULL_RECONCILE_EVERY.
+INCREMENTAL_OVERLAP_DAYS = 5
+FULL_RECONCILE_EVERY = timedelta(hours=24)
+
+# An instrument counts as due slightly before its refresh_interval elapses so
+# scheduler jitter and run time don't push it to the following tick.
+DUE_TOLERANCE = 0.2
+
+# Up-to-date instruments are refreshed from batched quote endpoints instead
+# of per-instrument history requests.
+COINGECKO_QUOTE_BATCH_SIZE = 100
+
+# (instrument, category, name, points)
+Series = tuple[str, str, str, list[tuple[date, float]]]
+
+
+@dataclass(frozen=True)
+class FetchJob:
+    label: str
+    provider: str
+    fetch: Callable[[], list[Series]]
+    # "full" (whole window), "incremental" (gap since the watermark),
+    # "batch" (one quote per instrument) or "snapshot" (FX).
+    mode: str = "full"
+
+    @property
+    def full(self) -> bool:
+        return self.mode == "full"
+
+
+@dataclass(frozen=True)
+class FetchResult:
+    job: FetchJob
+    series: list[Series]
+    elapsed: float
+    error: Exception | None = None
+
+
+def _dedup_daily(series: list[tuple[int, float]]) -> list[tuple[date, float]]:
+    # Dedup dates (keep last), stored as daily points (UTC dates)
+    dedup: dict[date, float] = {}
+    for ts_ms, price in series:
+        d = datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc).date()
+        dedup[d] = float(price)
+    return sorted(dedup.items(), key=lambda t: t[0])
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[i : i + size] for i in range(0, len(items), max(1, size))]
+
+
+def _crypto_job(inst: CatalogEntry, since: date | None) -> FetchJob:
+    def fetch():
+        if since is None:
+            series = fetch_coingecko_chart(coin_id=inst.provider_symbol, days=30)
+        else:
+            start = datetime.combine(since, datetime.min.time(), tzinfo=timezone.utc)
+            series = fetch_coingecko_chart_range(
+                coin_id=inst.provider_symbol, start=start, end=datetime.now(timezone.utc)
+            )
+        return [(inst.symbol, inst.category, inst.name, _dedup_daily(series))]
+
+    mode = "full" if since is None else "incremental"
+    return FetchJob(label=inst.symbol, provider=inst.provider, fetch=fetch, mode=mode)
+
+
+def _crypto_quotes_job(batch: list[CatalogEntry]) -> FetchJob:
+    def fetch():
+        prices = fetch_coingecko_prices([i.provider_symbol for i in batch])
+        today = datetime.now(timezone.utc).date()
+        return [
+            (i.symbol, i.category, i.name, [(today, prices[i.provider_symbol])])
+            for i in batch
+            if i.provider_symbol in prices
+        ]
+
+    label = f"coingecko quotes x{len(batch)}"
+    return FetchJob(label=label, provider=Instrument.PROVIDER_COINGECKO, fetch=fetch, mode="batch")
+
+
+def _stooq_job(inst: CatalogEntry, since: date | None) -> FetchJob:
+    def fetch():
+        points = fetch_stooq_history(symbol=inst.provider_symbol, days=45, start=since)
+        # Keep last 30-ish points
+        return [(inst.symbol, inst.category, inst.name, points[-35:])]
+
+    mode = "full" if since is None else "incremental"
+    return FetchJob(label=inst.symbol, provider=inst.provider, fetch=fetch, mode=mode)
+
+
+def _stooq_quotes_job(batch: list[CatalogEntry]) -> FetchJob:
+    def fetch():
+        quotes = fetch_stooq_quotes([i.provider_symbol for i in batch], batch_size=len(batch))
+        today = datetime.now(timezone.utc).date()
+        out = []
+        for i in batch:
+            q = quotes.get(i.provider_symbol) or {}
+            if q.get("price") is not None:
+                out.append((i.symbol, i.category, i.name, [(q.get("date") or today, q["price"])]))
+        return out
+
+    label = f"stooq quotes x{len(batch)}"
+    return FetchJob(label=label, provider=Instrument.PROVIDER_STOOQ, fetch=fetch, mode="batch")
+
+
+def _fx_job(instruments: list[CatalogEntry]) -> FetchJob:
+    def fetch():
+        fx = fetch_fx_rates_to_uzs()
+        # Persist as 1-point series at today's date so it can be charted if desired.
+        today = datetime.now(timezone.utc).date()
+        return [
+            (i.symbol, i.category, i.name, [(today, float(fx[i.provider_symbol]))])
+            for i in instruments
+            if i.provider_symbol in fx
+        ]
+
+    return FetchJob(label="FX UZS", provider=Instrument.PROVIDER_ERAPI, fetch=fetch, mode="snapshot")
+
+
+def _fng_job(inst: CatalogEntry, since: date | None) -> FetchJob:
+    def fetch():
+        days = 60
+        if since is not None:
+            days = min(days, (datetime.now(timezone.utc).date() - since).days + 1)
+        points = fetch_fear_greed_altme(days=days)
+        return [(inst.symbol, inst.category, inst.name, points[-45:])]
+
+    mode = "full" if since is None else "incremental"
+    return FetchJob(label=inst.symbol, provider=inst.provider, fetch=fetch, mode=mode)
+
+
+def _since(
+    watermarks: dict[tuple[str, str], IngestWatermark],
+    instrument: str,
+    source: str,
+    *,
+    now: datetime,
+    force_full: bool,
+) -> date | None:
+    """Start date for an incremental fetch, or None when a full fetch is due."""
+
+    w = watermarks.get((instrument, source))
+    if force_full or w is None or w.last_full_at is None:
+        return None
+    if now - w.last_full_at >= FULL_RECONCILE_EVERY:
+        return None
+    return w.last_date - timedelta(days=INCREMENTAL_OVERLAP_DAYS)
+
+
+def _is_due(w: IngestWatermark | None, inst: CatalogEntry, now: datetime) -> bool:
+    if w is None:
+        return True
+    return (now - w.updated_at).total_seconds() >= inst.refresh_interval * (1.0 - DUE_TOLERANCE)
+
+
+def build_jobs(
+    instruments: list[CatalogEntry],
+    watermarks: dict[tuple[str, str], IngestWatermark] | None = None,
+    *,
+    force_full: bool = False,
+    force_due: bool = False,
+) -> list[FetchJob]:
+    """Plan one tick: group due instruments by provider and batch them.
+
+    Instruments whose watermark is current are refreshed through batched
+    quote requests (one per 40-100 instruments); only instruments that are
+    new, behind, or due a full reconcile get their own history request.
+    """
+
+    watermarks = watermarks or {}
+    now = datetime.now(timezone.utc)
+    yesterday = now.date() - timedelta(days=1)
+
+    jobs: list[FetchJob] = []
+    quote_batches: dict[str, list[CatalogEntry]] = {}
+    fx: list[CatalogEntry] = []
+
+    for inst in instruments:
+        w = watermarks.get((inst.symbol, inst.provider))
+        if not (force_full or force_due or _is_due(w, inst, now)):
+            continue
+        if inst.provider == Instrument.PROVIDER_ERAPI:
+            fx.append(inst)
+            continue
+
+        since = _since(watermarks, inst.symbol, inst.provider, now=now, force_full=force_full)
+        caught_up = since is not None and w is not None and w.last_date >= yesterday
+        if caught_up and inst.provider in (Instrument.PROVIDER_COINGECKO, Instrument.PROVIDER_STOOQ):
+            quote_batches.setdefault(inst.provider, []).append(inst)
+        elif inst.provider == Instrument.PROVIDER_COINGECKO:
+            jobs.append(_crypto_job(inst, since))
+        elif inst.provider == Instrument.PROVIDER_STOOQ:
+            jobs.append(_stooq_job(inst, since))
+        elif inst.provider == Instrument.PROVIDER_ALTME:
+            jobs.append(_fng_job(inst, since))
+
+    for batch in _chunks(quote_batches.get(Instrument.PROVIDER_COINGECKO, []), COINGECKO_QUOTE_BATCH_SIZE):
+        jobs.append(_crypto_quotes_job(batch))
+    for batch in _chunks(quote_batches.get(Instrument.PROVIDER_STOOQ, []), STOOQ_QUOTE_BATCH_SIZE):
+        jobs.append(_stooq_quotes_job(batch))
+    if fx:
+        jobs.append(_fx_job(fx))
+    return jobs
+
+
+def run_fetch_jobs(jobs: list[FetchJob], *, workers: int = DEFAULT_WORKERS) -> list[FetchResult]:
+    """Run fetches on a bounded pool; results come back in job order.
+
+    Jobs wait in per-provider queues. A provider's next job is submitted only
+    when one of its ``PROVIDER_CONCURRENCY`` slots is free, taking providers
+    round-robin. No pool thread ever blocks on a busy provider. The pool size
+    bounds the total parallelism and the caps bound the load on each upstream.
+    """
+
+    workers = max(1, workers)
+    queues: dict[str, deque[int]] = defaultdict(deque)
+    for i, job in enumerate(jobs):
+        queues[job.provider].append(i)
+    active: dict[str, int] = defaultdict(int)
+    running: dict[Future, int] = {}
+    results: list[FetchResult | None] = [None] * len(jobs)
+
+    def run(job: FetchJob) -> FetchResult:
+        t0 = time.monotonic()
+        try:
+            series = job.fetch()
+            return FetchResult(job=job, series=series, elapsed=time.monotonic() - t0)
+        except Exception as e:
+            return FetchResult(job=job, series=[], elapsed=time.monotonic() - t0, error=e)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="markets-fetch") as pool:
+
+        def fill() -> None:
+            submitted = True
+            while submitted and len(running) < workers:
+                submitted = False
+                for provider, queue in queues.items():
+                    if queue and active[provider] < PROVIDER_CONCURRENCY.get(provider, 1) and len(running) < workers:
+                        i = queue.popleft()
+                        active[provider] += 1
+                        running[pool.submit(run, jobs[i])] = i
+                        submitted = True
+
+        fill()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                results[i] = future.result()
+                active[jobs[i].provider] -= 1
+            fill()
+    return results
+
+
 class Command(BaseCommand):
-    help = "Fetch and persist market series/latest values (best-effort)."
+    help = "Fetch and persist market series/latest values for the instrument catalog (best-effort)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=DEFAULT_WORKERS,
+            help="Max concurrent upstream fetches (per-provider caps still apply).",
+        )
+        parser.add_argument(
+            "--repair-latest",
+            action="store_true",
+            help="Recompute MarketLatest from stored MarketPoint rows instead of the fetched series.",
+        )
+        parser.add_argument(
+            "--rebuild-packed",
+            action="store_true",
+            help="Only rebuild the packed per-year history and weekly/monthly bars from MarketPoint, then exit.",
+        )
+        parser.add_argument(
+            "--only",
+            action="append",
+            choices=sorted(PROVIDER_CONCURRENCY),
+            help="Only fetch from this provider (repeatable). Defaults to all providers.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Ignore watermarks and refetch every instrument's full window.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Refresh every enabled instrument, even if its refresh interval has not elapsed.",
+        )
 
     def handle(self, *args, **options):
-        started = datetime.now(timezone.utc)
-
-        # Crypto (CoinGecko) – store as daily points (UTC dates)
-        crypto = {
-            "BTC": ("bitcoin", "Crypto", "Bitcoin"),
-            "ETH": ("ethereum", "Crypto", "Ethereum"),
-        }
-        for instrument, (coin_id, category, name) in crypto.items():
-            try:
-                series = fetch_coingecko_chart(coin_id=coin_id, days=30)
-                daily = []
-                for ts_ms, price in series:
-                    d = datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc).date()
-                    daily.append((d, float(price)))
-                # Dedup dates (keep last)
-                dedup = {}
-                for d, v in daily:
-                    dedup[d] = v
-                points = sorted(dedup.items(), key=lambda t: t[0])
-                persist_points(instrument, points)
-                persist_latest_from_points(instrument, category, name)
-                self.stdout.write(self.style.SUCCESS(f"Updated {instrument} ({len(points)} points)"))
-            except Exception as e:
-                self.stderr.write(f"WARN: {instrument} failed: {e}")
-
-        # Stooq historical (daily)
-        # Note: symbol availability varies; best-effort.
-        stooq = {
-            "SPX": ("^spx", "Indexes", "S&P 500"),
-            "NDX": ("^ndx", "Indexes", "Nasdaq 100"),
-            "VIX": ("^vix", "Volatility", "VIX"),
-            "XAU": ("xauusd", "Commodities", "Gold"),
-            "XAG": ("xagusd", "Commodities", "Silver"),
-        }
-        for instrument, (symbol, category, name) in stooq.items():
-            try:
-                points = fetch_stooq_history(symbol=symbol, days=45)
-                if not points:
-                    self.stderr.write(f"WARN: {instrument} no data")
-                    continue
-                # Keep last 30-ish points
-                points = points[-35:]
-                persist_points(instrument, points)
-                persist_latest_from_points(instrument, category, name)
-                self.stdout.write(self.style.SUCCESS(f"Updated {instrument} ({len(points)} points)"))
-            except Exception as e:
-                self.stderr.write(f"WARN: {instrument} failed: {e}")
-
-        # FX rates to UZS (store as latest only)
+        started = time.monotonic()
+
+        if options["rebuild_packed"]:
+            years = packed.rebuild()
+            bar_count = bars.rebuild()
+            self.stdout.write(
+                f"Rebuilt {years} packed years and {bar_count} bars in {time.monotonic() - started:.1f}s"
+            )
+            return
+
+        instruments = catalog.enabled_instruments()
+        if options.get("only"):
+            instruments = [i for i in instruments if i.provider in options["only"]]
+        watermarks = load_watermarks()
+        jobs = build_jobs(instruments, watermarks, force_full=options["full"], force_due=options["all"])
+        results = run_fetch_jobs(jobs, workers=options["workers"])
+        fetch_total = sum(r.elapsed for r in results)
+
+        by_instrument: dict[str, Series] = {}
+        job_of: dict[str, FetchJob] = {}
+        for r in results:
+            if r.error is not None:
+                self.stderr.write(f"WARN: {r.job.label} failed: {r.error}")
+                continue
+            if not any(points for _inst, _cat, _name, points in r.series):
+                self.stderr.write(f"WARN: {r.job.label} no data")
+                continue
+            for s in r.series:
+                if s[3]:
+                    by_instrument[s[0]] = s
+                    job_of[s[0]] = r.job
+
+        # Persistence stays on this thread: one upsert for every series.
         try:
-            fx = fetch_fx_rates_to_uzs()
-            # Persist as 1-point series at today's date so it can be charted if desired.
-            today = datetime.now(timezone.utc).date()
-            for ccy in ("USD", "EUR", "RUB"):
-                if ccy not in fx:
-                    continue
-                inst = f"{ccy}UZS"
-                persist_points(inst, [(today, float(fx[ccy]))])
-                persist_latest_from_points(inst, "FX", f"{ccy}/UZS")
-            self.stdout.write(self.style.SUCCESS("Updated FX UZS"))
+            stats = persist_series({inst: s[3] for inst, s in by_instrument.items()})
+        except Exception as e:
+            self.stderr.write(f"WARN: persist failed: {e}")
+            stats, by_instrument = {}, {}
+
+        for r in results:
+            written = [stats[s[0]] for s in r.series if s[0] in stats]
+            if not written:
+                continue
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Updated {r.job.label} [{r.job.mode}] ({sum(len(s[3]) for s in r.series)} points: "
+                    f"{sum(x.inserted for x in written)} new, {sum(x.updated for x in written)} changed, "
+                    f"{sum(x.unchanged for x in written)} unchanged; {r.elapsed:.1f}s)"
+                )
+            )
+
+        self._append_ticks(results, stats)
+
+        persisted = list(by_instrument.values())
+        try:
+            self._update_latest(persisted, repair=options["repair_latest"])
         except Exception as e:
-            self.stderr.write(f"WARN: FX failed: {e}")
+            self.stderr.write(f"WARN: latest update failed: {e}")
 
-        # Fear & Greed (crypto) – Alternative.me
+        changed = [inst for inst, st in stats.items() if st.written]
+        versions.bump(changed, latest=bool(changed) or options["repair_latest"])
         try:
-            points = fetch_fear_greed_altme(days=60)
-            points = points[-45:]
-            persist_points("FNG", points)
-            persist_latest_from_points("FNG", "Sentiment", "Fear & Greed (Crypto)")
-            self.stdout.write(self.style.SUCCESS(f"Updated FNG ({len(points)} points)"))
+            payloads.render_latest()
         except Exception as e:
-            self.stderr.write(f"WARN: FNG failed: {e}")
+            self.stderr.write(f"WARN: payload render failed: {e}")
+
+        now = datetime.now(timezone.utc)
+        try:
+            persist_watermarks(
+                [self._advance(watermarks, inst, job_of[inst], s[3], now) for inst, s in by_instrument.items()]
+            )
+        except Exception as e:
+            self.stderr.write(f"WARN: watermark update failed: {e}")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done in {elapsed:.1f}s: {len(persisted)}/{len(instruments)} instruments, "
+                f"{len(jobs)} fetches (fetch time summed: {fetch_total:.1f}s)"
+            )
+        )
+        for host, st in sorted(host_stats().items()):
+            self.stdout.write(
+                f"  {host}: {st['requests']} req, {st['errors']} errors, {st['reused']} reused, {st['not_modified']} not modified, "
+                f"avg {st['avg_ms']:.0f}ms, p95 {st['p95_ms']:.0f}ms"
+            )
+
+    def _append_ticks(self, results: list[FetchResult], stats) -> None:
+        # Batched quotes are live prices: keep them as intraday ticks too.
+        now_ms = int(time.time() * 1000)
+        n = 0
+        for r in results:
+            if r.job.mode != "batch":
+                continue
+            for instrument, _category, _name, points in r.series:
+                if instrument not in stats or not points:
+                    continue
+                try:
+                    n += ticks.append_ticks(instrument, [(now_ms, points[-1][1])])
+                except Exception as e:
+                    self.stderr.write(f"WARN: {instrument} tick append failed: {e}")
+        if n:
+            self.stdout.write(self.style.SUCCESS(f"Appended {n} intraday ticks"))
+
+    def _update_latest(self, persisted: list[Series], *, repair: bool = False) -> None:
+        if repair:
+            # Every known instrument, including ones whose fetch failed this run.
+            known = {r.instrument: (r.category, r.name) for r in MarketLatest.objects.all()}
+            for instrument, category, name, _points in persisted:
+                known[instrument] = (category, name)
+            with transaction.atomic():
+                for instrument, (category, name) in known.items():
+                    persist_latest_from_points(instrument, category, name)
+            self.stdout.write(self.style.SUCCESS(f"Repaired latest ({len(known)} instruments)"))
+            return
+
+        # Single-point series (FX, batched quotes) need the prior stored value for change_pct.
+        single = {inst: max(d for d, _v in points) for inst, _c, _n, points in persisted if len(points) < 2}
+        prev = previous_values(single)
+
+        rows = []
+        for instrument, category, name, points in persisted:
+            row = latest_from_points(instrument, category, name, points, previous=prev.get(instrument))
+            if row is not None:
+                rows.append(row)
+        with transaction.atomic():
+            n = persist_latest_rows(rows)
+        self.stdout.write(self.style.SUCCESS(f"Updated latest ({n} instruments)"))
 
-        elapsed = (datetime.now(timezone.utc) - started).total_seconds()
-        self.stdout.write(self.style.SUCCESS(f"Done in {elapsed:.1f}s"))
+    @staticmethod
+    def _advance(watermarks, instrument: str, job: FetchJob, points, now: datetime) -> IngestWatermark:
+        prev = watermarks.get((instrument, job.provider))
+        last_date = max(d for d, _v in points)
+        if prev is not None and prev.last_date > last_date:
+            last_date = prev.last_date
+        return IngestWatermark(
+            instrument=instrument,
+            source=job.provider,
+            last_date=last_date,
+            last_full_at=now if job.full else (prev.last_full_at if prev else None),
+            updated_at=now,
+        )
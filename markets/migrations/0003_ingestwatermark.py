@@ -0,0 +1,27 @@
+# Generated by Django 4.2.27 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("markets", "0002_rename_markets_mar_categor_8c1a1a_idx_markets_mar_categor_49e35c_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestWatermark",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("instrument", models.CharField(max_length=32)),
+                ("source", models.CharField(max_length=32)),
+                ("last_date", models.DateField()),
+                ("last_full_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "unique_together": {("instrument", "source")},
+            },
+        ),
+    ]
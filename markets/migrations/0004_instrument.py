@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("markets", "0003_ingestwatermark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Instrument",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("symbol", models.CharField(max_length=32, unique=True)),
+                ("provider", models.CharField(choices=[("coingecko", "CoinGecko"), ("stooq", "Stooq"), ("erapi", "open.er-api.com (FX)"), ("altme", "alternative.me (Fear & Greed)")], max_length=16)),
+                ("provider_symbol", models.CharField(max_length=64)),
+                ("category", models.CharField(max_length=32)),
+                ("name", models.CharField(max_length=64)),
+                ("refresh_interval", models.PositiveIntegerField(default=300, help_text="Seconds between ingest refreshes")),
+                ("enabled", models.BooleanField(default=True)),
+                ("show_in_ticker", models.BooleanField(default=True)),
+                ("preset", models.SlugField(blank=True, default="", max_length=32)),
+                ("preset_label", models.CharField(blank=True, default="", max_length=64)),
+                ("preset_weight", models.FloatField(default=1.0)),
+            ],
+            options={
+                "ordering": ("category", "name"),
+                "indexes": [models.Index(fields=["enabled", "provider"], name="markets_ins_enabled_3e930e_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+"""Seed the instrument catalog with what used to be hard-coded.
+
+Covers update_markets' ingest list, the get_market_snapshot extras (DJI, WTI;
+disabled so the ticker is unchanged) and the dashboard preset portfolios.
+"""
+
+from django.db import migrations
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+INSTRUMENTS = [
+    # symbol, provider, provider_symbol, category, name, refresh, enabled, ticker
+    ("BTC", "coingecko", "bitcoin", "Crypto", "Bitcoin", MINUTE, True, True),
+    ("ETH", "coingecko", "ethereum", "Crypto", "Ethereum", MINUTE, True, True),
+    ("SPX", "stooq", "^spx", "Indexes", "S&P 500", 15 * MINUTE, True, True),
+    ("NDX", "stooq", "^ndx", "Indexes", "Nasdaq 100", 15 * MINUTE, True, True),
+    ("DJI", "stooq", "^dji", "Indexes", "Dow Jones", 15 * MINUTE, False, True),
+    ("VIX", "stooq", "^vix", "Volatility", "VIX", 15 * MINUTE, True, True),
+    ("XAU", "stooq", "xauusd", "Commodities", "Gold", 15 * MINUTE, True, True),
+    ("XAG", "stooq", "xagusd", "Commodities", "Silver", 15 * MINUTE, True, True),
+    ("WTI", "stooq", "wti", "Commodities", "WTI (proxy)", 15 * MINUTE, False, True),
+    ("USDUZS", "erapi", "USD", "FX", "USD/UZS", HOUR, True, True),
+    ("EURUZS", "erapi", "EUR", "FX", "EUR/UZS", HOUR, True, True),
+    ("RUBUZS", "erapi", "RUB", "FX", "RUB/UZS", HOUR, True, True),
+    ("FNG", "altme", "fng", "Sentiment", "Fear & Greed (Crypto)", DAY, True, True),
+]
+
+PRESETS = [
+    # preset, label, symbol, provider_symbol
+    ("semi", "Semiconductors", "SMH", "smh.us"),
+    ("banking", "Banking", "XLF", "xlf.us"),
+    ("energy", "Energy", "XLE", "xle.us"),
+    ("green", "Green energy", "ICLN", "icln.us"),
+    ("staples", "Consumer staples", "XLP", "xlp.us"),
+    ("healthcare", "Healthcare", "XLV", "xlv.us"),
+]
+
+
+def seed(apps, schema_editor):
+    Instrument = apps.get_model("markets", "Instrument")
+    rows = [
+        Instrument(
+            symbol=symbol,
+            provider=provider,
+            provider_symbol=provider_symbol,
+            category=category,
+            name=name,
+            refresh_interval=refresh,
+            enabled=enabled,
+            show_in_ticker=ticker,
+        )
+        for symbol, provider, provider_symbol, category, name, refresh, enabled, ticker in INSTRUMENTS
+    ]
+    rows += [
+        Instrument(
+            symbol=symbol,
+            provider="stooq",
+            provider_symbol=provider_symbol,
+            category="Sectors",
+            name=label,
+            refresh_interval=DAY,
+            enabled=True,
+            show_in_ticker=False,
+            preset=preset,
+            preset_label=label,
+        )
+        for preset, label, symbol, provider_symbol in PRESETS
+    ]
+    Instrument.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def unseed(apps, schema_editor):
+    Instrument = apps.get_model("markets", "Instrument")
+    symbols = [row[0] for row in INSTRUMENTS] + [row[2] for row in PRESETS]
+    Instrument.objects.filter(symbol__in=symbols).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("markets", "0004_instrument"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed, unseed),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.27 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("markets", "0005_seed_instruments"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TickChunk",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("instrument", models.CharField(max_length=32)),
+                ("resolution", models.CharField(max_length=8)),
+                ("start_ts", models.BigIntegerField()),
+                ("end_ts", models.BigIntegerField()),
+                ("count", models.PositiveIntegerField()),
+                ("data", models.BinaryField()),
+            ],
+            options={
+                "indexes": [models.Index(fields=["instrument", "resolution", "end_ts"], name="markets_tic_instrum_1a3a6f_idx")],
+                "unique_together": {("instrument", "resolution", "start_ts")},
+            },
+        ),
+    ]
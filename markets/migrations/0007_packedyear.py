@@ -0,0 +1,36 @@
+# Generated by Django 4.2.27 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("markets", "0006_tickchunk"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PackedYear",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("instrument", models.CharField(max_length=32)),
+                ("year", models.PositiveSmallIntegerField()),
+                ("count", models.PositiveIntegerField()),
+                ("data", models.BinaryField()),
+            ],
+            options={
+                "unique_together": {("instrument", "year")},
+            },
+        ),
+        # Both covered by the unique (instrument, date) index.
+        migrations.RemoveIndex(
+            model_name="marketpoint",
+            name="markets_mar_instrum_00b071_idx",
+        ),
+        migrations.AlterField(
+            model_name="marketpoint",
+            name="instrument",
+            field=models.CharField(max_length=32),
+        ),
+    ]
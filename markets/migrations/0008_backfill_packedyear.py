@@ -0,0 +1,64 @@
+"""Pack existing MarketPoint history into PackedYear rows."""
+
+import struct
+import sys
+from array import array
+from collections import defaultdict
+from datetime import date
+
+from django.db import migrations
+
+# Frozen copy of the markets.packed version 1 encoding, so this migration
+# keeps producing the format it was written for.
+HEADER = struct.Struct("<BI")
+VERSION = 1
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def pack(a):
+    if sys.byteorder != "little":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def encode_year(days, values):
+    return HEADER.pack(VERSION, len(days)) + pack(array("i", days)) + pack(array("d", values))
+
+
+def backfill(apps, schema_editor):
+    MarketPoint = apps.get_model("markets", "MarketPoint")
+    PackedYear = apps.get_model("markets", "PackedYear")
+    for instrument in MarketPoint.objects.values_list("instrument", flat=True).distinct():
+        years = defaultdict(lambda: ([], []))
+        points = (
+            MarketPoint.objects.filter(instrument=instrument, value__isnull=False)
+            .order_by("date")
+            .values_list("date", "value")
+        )
+        for d, v in points.iterator():
+            days, values = years[d.year]
+            days.append(d.toordinal() - EPOCH_ORDINAL)
+            values.append(v)
+        PackedYear.objects.bulk_create(
+            [
+                PackedYear(instrument=instrument, year=year, count=len(days), data=encode_year(days, values))
+                for year, (days, values) in years.items()
+            ],
+            batch_size=200,
+        )
+
+
+def unbackfill(apps, schema_editor):
+    apps.get_model("markets", "PackedYear").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("markets", "0007_packedyear"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, unbackfill),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.27 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("markets", "0008_backfill_packedyear"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MarketBar",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("instrument", models.CharField(max_length=32)),
+                ("interval", models.CharField(max_length=4)),
+                ("start", models.DateField()),
+                ("open", models.FloatField()),
+                ("high", models.FloatField()),
+                ("low", models.FloatField()),
+                ("close", models.FloatField()),
+                ("last_date", models.DateField()),
+                ("count", models.PositiveSmallIntegerField()),
+            ],
+            options={
+                "unique_together": {("instrument", "interval", "start")},
+            },
+        ),
+    ]
@@ -0,0 +1,105 @@
+"""Build weekly/monthly MarketBar rows from the packed daily history."""
+
+import struct
+import sys
+from array import array
+from datetime import date, timedelta
+
+from django.db import migrations
+
+# Frozen copies of the markets.packed version 1 decoding and of
+# markets.bars.build_bars, so later changes there can't alter this backfill.
+HEADER = struct.Struct("<BI")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+WEEKLY = "1w"
+MONTHLY = "1mo"
+
+
+def unpack(typecode, buf):
+    a = array(typecode)
+    a.frombytes(buf)
+    if sys.byteorder != "little":
+        a.byteswap()
+    return a
+
+
+def decode_points(blobs):
+    """(date, value) pairs of consecutive packed years, oldest first."""
+
+    for data in blobs:
+        data = memoryview(data)
+        _version, n = HEADER.unpack_from(data)
+        split = HEADER.size + n * 4
+        days = unpack("i", data[HEADER.size : split])
+        values = unpack("d", data[split : split + n * 8])
+        for day, v in zip(days, values):
+            yield date.fromordinal(day + EPOCH_ORDINAL), v
+
+
+def period_start(d, interval):
+    if interval == WEEKLY:
+        return d - timedelta(days=d.weekday())
+    return d.replace(day=1)
+
+
+def build_bars(points, interval):
+    """(start, open, high, low, close, last_date, count) per period with data."""
+
+    out = []
+    bar = None
+    for d, v in points:
+        p = period_start(d, interval)
+        if bar is None or bar[0] != p:
+            if bar is not None:
+                out.append(tuple(bar))
+            bar = [p, v, v, v, v, d, 0]
+        bar[2] = max(bar[2], v)
+        bar[3] = min(bar[3], v)
+        bar[4], bar[5], bar[6] = v, d, bar[6] + 1
+    if bar is not None:
+        out.append(tuple(bar))
+    return out
+
+
+def backfill(apps, schema_editor):
+    PackedYear = apps.get_model("markets", "PackedYear")
+    MarketBar = apps.get_model("markets", "MarketBar")
+    for instrument in PackedYear.objects.values_list("instrument", flat=True).distinct():
+        points = list(
+            decode_points(
+                PackedYear.objects.filter(instrument=instrument).order_by("year").values_list("data", flat=True)
+            )
+        )
+        MarketBar.objects.bulk_create(
+            [
+                MarketBar(
+                    instrument=instrument,
+                    interval=interval,
+                    start=start,
+                    open=open_,
+                    high=high,
+                    low=low,
+                    close=close,
+                    last_date=last_date,
+                    count=count,
+                )
+                for interval in (WEEKLY, MONTHLY)
+                for start, open_, high, low, close, last_date, count in build_bars(points, interval)
+            ],
+            batch_size=500,
+        )
+
+
+def unbackfill(apps, schema_editor):
+    apps.get_model("markets", "MarketBar").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("markets", "0009_marketbar"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, unbackfill),
+    ]
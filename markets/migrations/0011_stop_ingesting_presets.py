@@ -0,0 +1,40 @@
+"""Stop ingesting the preset-only sector ETFs seeded in 0005.
+
+dashboard.history keeps their full daily history for the backtests, so the
+short ingest window in MarketPoint (and the packed copy, bars, latest row and
+watermark derived from it) was a second, shallower copy nobody read. The
+instruments stay in the catalog, disabled, to define the presets.
+"""
+
+from django.db import migrations
+
+# Symbols of the 0005 PRESETS rows.
+PRESET_SYMBOLS = ["SMH", "XLF", "XLE", "ICLN", "XLP", "XLV"]
+
+
+def preset_only(apps):
+    Instrument = apps.get_model("markets", "Instrument")
+    return Instrument.objects.filter(symbol__in=PRESET_SYMBOLS, show_in_ticker=False).exclude(preset="")
+
+
+def disable(apps, schema_editor):
+    symbols = list(preset_only(apps).values_list("symbol", flat=True))
+    preset_only(apps).update(enabled=False)
+    for model in ("MarketPoint", "PackedYear", "MarketBar", "MarketLatest", "IngestWatermark", "TickChunk"):
+        apps.get_model("markets", model).objects.filter(instrument__in=symbols).delete()
+
+
+def enable(apps, schema_editor):
+    # Ingest refetches their window on its next pass.
+    preset_only(apps).update(enabled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("markets", "0010_backfill_marketbar"),
+    ]
+
+    operations = [
+        migrations.RunPython(disable, enable),
+    ]
@@ -4,15 +4,44 @@ from django.db import models
 
 
 class MarketPoint(models.Model):
-	instrument = models.CharField(max_length=32, db_index=True)
+	instrument = models.CharField(max_length=32)
 	date = models.DateField(db_index=True)
 	value = models.FloatField(null=True, blank=True)
 
 	class Meta:
+		# The unique index on (instrument, date) also serves instrument lookups.
 		unique_together = ("instrument", "date")
-		indexes = [
-			models.Index(fields=["instrument", "date"]),
-		]
+
+
+class PackedYear(models.Model):
+	"""One instrument's daily MarketPoint values for a calendar year, packed (see markets.packed)."""
+
+	instrument = models.CharField(max_length=32)
+	year = models.PositiveSmallIntegerField()
+	count = models.PositiveIntegerField()
+	data = models.BinaryField()
+
+	class Meta:
+		unique_together = ("instrument", "year")
+
+
+class MarketBar(models.Model):
+	"""Weekly or monthly OHLC bar over an instrument's daily points (see markets.bars)."""
+
+	instrument = models.CharField(max_length=32)
+	# "1w" (weeks start on Monday) or "1mo".
+	interval = models.CharField(max_length=4)
+	start = models.DateField()
+	open = models.FloatField()
+	high = models.FloatField()
+	low = models.FloatField()
+	close = models.FloatField()
+	# Date of the last daily point in the bar; before the period's end the bar is still open.
+	last_date = models.DateField()
+	count = models.PositiveSmallIntegerField()
+
+	class Meta:
+		unique_together = ("instrument", "interval", "start")
 
 
 class MarketLatest(models.Model):
@@ -28,3 +57,75 @@ class MarketLatest(models.Model):
 		indexes = [
 			models.Index(fields=["category", "instrument"]),
 		]
+
+
+class IngestWatermark(models.Model):
+	"""Last stored date per (instrument, source), so ingest can fetch only the gap."""
+
+	instrument = models.CharField(max_length=32)
+	source = models.CharField(max_length=32)
+	last_date = models.DateField()
+	last_full_at = models.DateTimeField(null=True, blank=True)
+	updated_at = models.DateTimeField()
+
+	class Meta:
+		unique_together = ("instrument", "source")
+
+
+class Instrument(models.Model):
+	"""Catalog entry driving ingest, the ticker/snapshot and dashboard presets."""
+
+	PROVIDER_COINGECKO = "coingecko"
+	PROVIDER_STOOQ = "stooq"
+	PROVIDER_ERAPI = "erapi"
+	PROVIDER_ALTME = "altme"
+	PROVIDER_CHOICES = [
+		(PROVIDER_COINGECKO, "CoinGecko"),
+		(PROVIDER_STOOQ, "Stooq"),
+		(PROVIDER_ERAPI, "open.er-api.com (FX)"),
+		(PROVIDER_ALTME, "alternative.me (Fear & Greed)"),
+	]
+
+	# Our code, used as MarketPoint/MarketLatest.instrument (e.g. "BTC", "SPX").
+	symbol = models.CharField(max_length=32, unique=True)
+	provider = models.CharField(max_length=16, choices=PROVIDER_CHOICES)
+	# The provider's id (e.g. "bitcoin", "^spx", "USD").
+	provider_symbol = models.CharField(max_length=64)
+	category = models.CharField(max_length=32)
+	name = models.CharField(max_length=64)
+	refresh_interval = models.PositiveIntegerField(default=300, help_text="Seconds between ingest refreshes")
+	enabled = models.BooleanField(default=True)
+	show_in_ticker = models.BooleanField(default=True)
+	# Dashboard preset portfolio this instrument belongs to (blank = none). Presets
+	# read prices through dashboard.history, so preset-only rows are left disabled.
+	preset = models.SlugField(max_length=32, blank=True, default="")
+	preset_label = models.CharField(max_length=64, blank=True, default="")
+	preset_weight = models.FloatField(default=1.0)
+
+	class Meta:
+		ordering = ("category", "name")
+		indexes = [
+			models.Index(fields=["enabled", "provider"]),
+		]
+
+	def __str__(self) -> str:
+		return f"{self.symbol} ({self.provider}:{self.provider_symbol})"
+
+
+class TickChunk(models.Model):
+	"""Block of delta-encoded intraday ticks or rollup bars (see markets.ticks)."""
+
+	instrument = models.CharField(max_length=32)
+	# "tick" for raw ticks, otherwise a rollup bar size ("1m", "5m", "1h").
+	resolution = models.CharField(max_length=8)
+	# Milliseconds since the epoch (UTC) of the first and last point in the chunk.
+	start_ts = models.BigIntegerField()
+	end_ts = models.BigIntegerField()
+	count = models.PositiveIntegerField()
+	data = models.BinaryField()
+
+	class Meta:
+		unique_together = ("instrument", "resolution", "start_ts")
+		indexes = [
+			models.Index(fields=["instrument", "resolution", "end_ts"]),
+		]
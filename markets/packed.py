@@ -0,0 +1,231 @@
+"""Packed per-year daily history, kept alongside MarketPoint.
+
+Each PackedYear row holds one instrument's non-null daily values for a
+calendar year as two little-endian arrays: int32 days since 1970-01-01 and
+float64 values. Reading a year is one row fetch and two ``frombytes`` calls,
+with no per-point objects. MarketPoint stays the source of truth; ingest
+calls ``sync_years`` for every (instrument, year) it changed.
+"""
+
+from __future__ import annotations
+
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Sequence
+
+from django.db.models import F, Sum, Window
+
+from .models import MarketPoint, PackedYear
+
+# version, point count
+_HEADER = struct.Struct("<BI")
+_VERSION = 1
+_SWAP = sys.byteorder != "little"
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+DAY_MS = 86_400_000
+
+
+def epoch_day(d: date) -> int:
+    return d.toordinal() - _EPOCH_ORDINAL
+
+
+def from_epoch_day(day: int) -> date:
+    return date.fromordinal(day + _EPOCH_ORDINAL)
+
+
+@dataclass(frozen=True)
+class History:
+    days: array  # int32 days since the epoch, ascending
+    values: array  # float64
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def epoch_ms(self) -> list[int]:
+        return [d * DAY_MS for d in self.days]
+
+    def points(self) -> list[tuple[int, float]]:
+        """``(epoch_ms, value)`` pairs, as the chart endpoints serve them."""
+
+        return list(zip(self.epoch_ms(), self.values))
+
+    def tail(self, n: int) -> History:
+        if n >= len(self.days):
+            return self
+        cut = len(self.days) - n
+        return History(days=self.days[cut:], values=self.values[cut:])
+
+
+def _pack(a: array) -> bytes:
+    if _SWAP:
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _unpack(typecode: str, buf) -> array:
+    a = array(typecode)
+    a.frombytes(buf)
+    if _SWAP:
+        a.byteswap()
+    return a
+
+
+def encode_year(days: Sequence[int], values: Sequence[float]) -> bytes:
+    if len(days) != len(values):
+        raise ValueError("values length does not match days")
+    return _HEADER.pack(_VERSION, len(days)) + _pack(array("i", days)) + _pack(array("d", values))
+
+
+def decode_year(data) -> History:
+    data = memoryview(data)
+    version, n = _HEADER.unpack_from(data)
+    if version != _VERSION:
+        raise ValueError(f"unsupported packed year version {version}")
+    split = _HEADER.size + n * 4
+    return History(days=_unpack("i", data[_HEADER.size : split]), values=_unpack("d", data[split : split + n * 8]))
+
+
+def decode_years(blobs: Iterable) -> History:
+    """Consecutive years' data (oldest first) as one History."""
+
+    days, values = array("i"), array("d")
+    for data in blobs:
+        year = decode_year(data)
+        days.extend(year.days)
+        values.extend(year.values)
+    return History(days=days, values=values)
+
+
+def _years(instrument: str, start: date | None, end: date | None):
+    qs = PackedYear.objects.filter(instrument=instrument)
+    if start is not None:
+        qs = qs.filter(year__gte=start.year)
+    if end is not None:
+        qs = qs.filter(year__lte=end.year)
+    return qs.order_by("year").values_list("data", flat=True)
+
+
+def read_range(instrument: str, start: date | None = None, end: date | None = None) -> History:
+    """Daily values with ``start <= date <= end`` (either bound optional); one row per year."""
+
+    return slice_range(decode_years(_years(instrument, start, end)), start, end)
+
+
+async def aread_range(instrument: str, start: date | None = None, end: date | None = None) -> History:
+    blobs = [data async for data in _years(instrument, start, end)]
+    return slice_range(decode_years(blobs), start, end)
+
+
+def slice_range(history: History, start: date | None, end: date | None) -> History:
+    lo = 0 if start is None else bisect_left(history.days, epoch_day(start))
+    hi = len(history) if end is None else bisect_right(history.days, epoch_day(end))
+    if lo == 0 and hi == len(history):
+        return history
+    return History(days=history.days[lo:hi], values=history.values[lo:hi])
+
+
+def _newest_years(instruments: list[str], n: int):
+    # Newest years first, only as far back as needed for n points: a year is
+    # kept while the points in newer years don't yet add up to n.
+    newer = Window(Sum("count"), partition_by=[F("instrument")], order_by=F("year").desc()) - F("count")
+    return (
+        PackedYear.objects.filter(instrument__in=instruments)
+        .annotate(newer=newer)
+        .filter(newer__lt=n)
+        .order_by("instrument", "-year")
+        .values_list("instrument", "data")
+    )
+
+
+def _take_last(rows: Iterable[tuple[str, bytes]], n: int) -> dict[str, History]:
+    blobs: dict[str, list] = defaultdict(list)
+    for instrument, data in rows:
+        blobs[instrument].append(data)
+    return {instrument: decode_years(reversed(years)).tail(n) for instrument, years in blobs.items()}
+
+
+def read_last(instruments: list[str], n: int) -> dict[str, History]:
+    """Latest ``n`` daily values per instrument, in one query (instruments without data are omitted)."""
+
+    return _take_last(_newest_years(instruments, n), n)
+
+
+async def aread_last(instruments: list[str], n: int) -> dict[str, History]:
+    return _take_last([row async for row in _newest_years(instruments, n)], n)
+
+
+def sync_years(keys: Iterable[tuple[str, int]]) -> int:
+    """Rebuild the PackedYear rows for ``(instrument, year)`` pairs from MarketPoint.
+
+    Reads the affected points in one query; years left without values are
+    deleted. Returns the number of rows written. Call inside the transaction
+    that changed the points.
+    """
+
+    wanted: dict[str, set[int]] = defaultdict(set)
+    for instrument, year in keys:
+        wanted[instrument].add(year)
+    if not wanted:
+        return 0
+
+    years = {y for ys in wanted.values() for y in ys}
+    grouped: dict[tuple[str, int], tuple[list[int], list[float]]] = {}
+    qs = (
+        MarketPoint.objects.filter(
+            instrument__in=list(wanted),
+            date__gte=date(min(years), 1, 1),
+            date__lte=date(max(years), 12, 31),
+            value__isnull=False,
+        )
+        .order_by("instrument", "date")
+        .values_list("instrument", "date", "value")
+    )
+    for instrument, d, v in qs:
+        if d.year not in wanted[instrument]:
+            continue
+        days, values = grouped.setdefault((instrument, d.year), ([], []))
+        days.append(epoch_day(d))
+        values.append(v)
+
+    rows = [
+        PackedYear(instrument=instrument, year=year, count=len(days), data=encode_year(days, values))
+        for (instrument, year), (days, values) in grouped.items()
+    ]
+    if rows:
+        PackedYear.objects.bulk_create(
+            rows,
+            batch_size=200,
+            update_conflicts=True,
+            unique_fields=["instrument", "year"],
+            update_fields=["count", "data"],
+        )
+    for instrument, ys in wanted.items():
+        empty = [y for y in ys if (instrument, y) not in grouped]
+        if empty:
+            PackedYear.objects.filter(instrument=instrument, year__in=empty).delete()
+    return len(rows)
+
+
+def rebuild(instruments: Iterable[str] | None = None) -> int:
+    """Rebuild the PackedYear rows of ``instruments`` (default: all) from MarketPoint."""
+
+    points = MarketPoint.objects.filter(value__isnull=False)
+    packed = PackedYear.objects.all()
+    if instruments is not None:
+        instruments = list(instruments)
+        points = points.filter(instrument__in=instruments)
+        packed = packed.filter(instrument__in=instruments)
+    # Existing rows are included so years that lost all their values get deleted.
+    keys = set(packed.values_list("instrument", "year"))
+    keys.update((instrument, d.year) for instrument, d in points.values_list("instrument", "date").iterator())
+    by_instrument: dict[str, list[tuple[str, int]]] = defaultdict(list)
+    for key in keys:
+        by_instrument[key[0]].append(key)
+    return sum(sync_years(instrument_keys) for instrument_keys in by_instrument.values())
@@ -0,0 +1,135 @@
+"""Pre-rendered JSON bodies for the ticker and snapshot endpoints.
+
+Ingest calls ``render_latest()`` right after it updates MarketLatest, so the
+views normally return cached bytes without touching the ORM or encoding
+JSON. Each body is stored with the ``versions.latest()`` token it was built
+for and the newest ``as_of`` among its rows; when the token has moved on (or
+the cache was cleared) the next request rebuilds it from the database and
+writes it back. ``validators`` gives the views their ETag token and
+Last-Modified. ``aget`` is the same as ``get`` for async views, rebuilding
+through the async ORM.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import Callable
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import live, versions
+from .models import MarketLatest
+from .services import ticker_latest
+
+TICKER = "ticker"
+SNAPSHOT = "snapshot"
+
+
+def _cache_key(name: str) -> str:
+    return f"markets:v1:payload:{name}"
+
+
+def _row(r: MarketLatest) -> dict:
+    return {
+        "category": r.category,
+        "name": r.name,
+        "symbol": r.instrument,
+        "price": r.price,
+        "change_pct": r.change_pct,
+    }
+
+
+def _as_of(latest: list[MarketLatest]) -> str | None:
+    return latest[0].as_of.isoformat() if latest[0].as_of else None
+
+
+def _ticker(latest: list[MarketLatest]) -> dict:
+    return {"as_of": _as_of(latest), "items": [_row(r) for r in latest if r.price is not None]}
+
+
+def _snapshot(latest: list[MarketLatest]) -> dict:
+    return {"as_of": _as_of(latest), "rows": [_row(r) for r in latest]}
+
+
+_BUILDERS: dict[str, Callable[[list[MarketLatest]], dict]] = {
+    TICKER: _ticker,
+    SNAPSHOT: _snapshot,
+}
+
+
+def _encode(data: dict) -> bytes:
+    return json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+
+
+def _store(latest: list[MarketLatest], token: str, names) -> dict[str, dict]:
+    modified = max((r.as_of for r in latest if r.as_of), default=None)
+    out = {}
+    for name in names:
+        entry = {"version": token, "as_of": modified, "body": _encode(_BUILDERS[name](latest))}
+        cache.set(_cache_key(name), entry, timeout=None)
+        out[name] = entry
+    return out
+
+
+def render_latest() -> None:
+    """Render and store every payload for the current ``latest`` version.
+
+    Also publishes the ticker delta to live (SSE) subscribers.
+    """
+
+    token = versions.latest()[0]
+    latest = list(ticker_latest())
+    if not latest:
+        return
+    _store(latest, token, _BUILDERS)
+    ticker = _ticker(latest)
+    live.publish_ticker(ticker["items"], ticker["as_of"])
+
+
+def _cached(name: str) -> tuple[str, dict | None]:
+    """Current ``latest`` token and the stored entry, if it was rendered for that token."""
+
+    token = versions.latest()[0]
+    entry = cache.get(_cache_key(name))
+    if entry is not None and entry["version"] == token and "as_of" in entry:
+        return token, entry
+    return token, None
+
+
+def _entry(name: str) -> dict | None:
+    token, entry = _cached(name)
+    if entry is not None:
+        return entry
+    latest = list(ticker_latest())
+    if not latest:
+        return None
+    return _store(latest, token, [name])[name]
+
+
+def get(name: str) -> bytes | None:
+    """JSON body for ``name``; None when there is no persisted data yet."""
+
+    entry = _entry(name)
+    return entry["body"] if entry is not None else None
+
+
+def validators(name: str) -> tuple[str, datetime | None] | None:
+    """``(version token, newest as_of)`` of the body ``get`` returns; None without persisted data."""
+
+    entry = _entry(name)
+    return (entry["version"], entry["as_of"]) if entry is not None else None
+
+
+async def aget(name: str) -> bytes | None:
+    token, entry = await sync_to_async(_cached, thread_sensitive=False)(name)
+    if entry is not None:
+        return entry["body"]
+    # ticker_latest() reads the catalog (cache, maybe ORM) to build the queryset.
+    qs = await sync_to_async(ticker_latest)()
+    latest = [r async for r in qs]
+    if not latest:
+        return None
+    return (await sync_to_async(_store, thread_sensitive=False)(latest, token, [name]))[name]["body"]
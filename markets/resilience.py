@@ -0,0 +1,315 @@
+"""Circuit breakers and hedged requests for upstream market data providers.
+
+Breaker state lives in the ``shared`` cache alias (file-backed by default),
+so every gunicorn worker and the scheduler see the same open/closed state.
+``try_lock``/``release_lock`` are the cross-process locks used here and by
+markets.caching; ``locked`` is a blocking mutex for short read-modify-writes.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, TypeVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+T = TypeVar("T")
+
+FAILURE_THRESHOLD = 3
+BASE_COOLDOWN_SECONDS = 30
+MAX_COOLDOWN_SECONDS = 15 * 60
+# How long a half-open probe may take before another caller may probe again.
+PROBE_SECONDS = 15
+
+# Lock files are guarded by one of this many flock'd stripe files.
+LOCK_STRIPES = 64
+
+# Hedging only kicks in once a host has enough latency samples.
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_BUDGET_SECONDS = 0.25
+
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="markets-hedge")
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"circuit open for {name} (retry in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def shared_cache():
+    try:
+        return caches["shared"]
+    except Exception:
+        return caches["default"]
+
+
+def _lock_dir(cache: FileBasedCache) -> str:
+    path = os.path.join(cache._dir, "locks")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def _file_lock_state(cache: FileBasedCache, name: str):
+    """Path of ``name``'s lock file, held under its stripe's exclusive flock."""
+
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    lock_dir = _lock_dir(cache)
+    fd = os.open(os.path.join(lock_dir, f"stripe-{int(digest[:8], 16) % LOCK_STRIPES}"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield os.path.join(lock_dir, f"{digest}.lock")
+    finally:
+        # Closing the descriptor releases the flock.
+        os.close(fd)
+
+
+def try_lock(name: str, timeout: float) -> bool:
+    """Take the cross-process lock ``name`` for ``timeout`` seconds, unless someone holds it.
+
+    On Redis this is the shared cache's ``add`` (SET NX). FileBasedCache.add
+    is a has_key() then a set(), so two processes can both win it. With that
+    backend the lock is instead a file under the cache directory, and it is
+    only checked and written while holding an exclusive flock.
+    """
+
+    cache = shared_cache()
+    if not isinstance(cache, FileBasedCache):
+        return cache.add(name, 1, timeout=max(1, math.ceil(timeout)))
+    with _file_lock_state(cache, name) as path:
+        now = time.time()
+        try:
+            with open(path) as f:
+                if float(f.read() or 0) > now:
+                    return False
+        except (FileNotFoundError, ValueError):
+            pass
+        with open(path, "w") as f:
+            f.write(f"{now + timeout:.6f}")
+        return True
+
+
+def release_lock(name: str) -> None:
+    cache = shared_cache()
+    if not isinstance(cache, FileBasedCache):
+        cache.delete(name)
+        return
+    with _file_lock_state(cache, name) as path:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+@contextmanager
+def locked(name: str, timeout: float = 5.0):
+    """Hold the cross-process mutex ``name`` for a short read-modify-write, waiting for it.
+
+    With the file-backed cache this is the stripe's flock itself, so no
+    try_lock/release_lock on a name in the same stripe may run inside it.
+    Elsewhere it spins on ``add``; the key expires after ``timeout`` should
+    its holder die.
+    """
+
+    cache = shared_cache()
+    if isinstance(cache, FileBasedCache):
+        with _file_lock_state(cache, name):
+            yield
+        return
+    while not cache.add(name, 1, timeout=max(1, math.ceil(timeout))):
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        cache.delete(name)
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures.
+
+    While open, calls fail fast with CircuitOpenError. Once the cooldown
+    elapses one caller is let through as a half-open probe; success closes the
+    breaker, failure reopens it with an exponentially longer cooldown.
+    State changes are read-modify-writes under ``locked``, so concurrent
+    failures across processes are all counted.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        base_cooldown: float = BASE_COOLDOWN_SECONDS,
+        max_cooldown: float = MAX_COOLDOWN_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._key = f"breaker:v1:{name}"
+        self._probe_key = f"breaker:v1:{name}:probe"
+        self._mutex_key = f"breaker:v1:{name}:mutex"
+
+    def _state(self) -> dict[str, float]:
+        return shared_cache().get(self._key) or {"failures": 0, "open_until": 0.0, "trips": 0}
+
+    def _save(self, state: dict[str, float]) -> None:
+        shared_cache().set(self._key, state, timeout=None)
+
+    def status(self) -> str:
+        state = self._state()
+        if state["open_until"] <= 0:
+            return "closed"
+        return "open" if time.time() < state["open_until"] else "half-open"
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError unless the call may go ahead.
+
+        Returns True when this caller took the half-open probe lock; pass it
+        on as ``probe`` to ``record_success``/``record_failure``.
+        """
+
+        state = self._state()
+        if state["open_until"] <= 0:
+            return False
+        remaining = state["open_until"] - time.time()
+        if remaining > 0:
+            raise CircuitOpenError(self.name, remaining)
+        # Half-open: only one caller (across all processes) probes at a time.
+        if not try_lock(self._probe_key, PROBE_SECONDS):
+            raise CircuitOpenError(self.name, PROBE_SECONDS)
+        return True
+
+    def record_success(self, *, probe: bool = False) -> None:
+        state = self._state()
+        if state["failures"] or state["open_until"] or state["trips"]:
+            with locked(self._mutex_key):
+                self._save({"failures": 0, "open_until": 0.0, "trips": 0})
+        if probe:
+            release_lock(self._probe_key)
+
+    def record_failure(self, *, probe: bool = False) -> None:
+        with locked(self._mutex_key):
+            state = self._state()
+            state["failures"] += 1
+            half_open = state["open_until"] > 0
+            if half_open or state["failures"] >= self.failure_threshold:
+                state["trips"] += 1
+                cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** (state["trips"] - 1)))
+                state["open_until"] = time.time() + cooldown
+            self._save(state)
+        if probe:
+            release_lock(self._probe_key)
+
+    def _settle(self, error: Exception | None, probe: bool, is_failure) -> None:
+        if error is None:
+            self.record_success(probe=probe)
+        elif is_failure is None or is_failure(error):
+            self.record_failure(probe=probe)
+        elif probe:
+            # Says nothing about upstream health: leave the state as it is and
+            # let the next caller probe.
+            release_lock(self._probe_key)
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        *,
+        is_failure: Callable[[Exception], bool] | None = None,
+    ) -> T:
+        """Run ``fn`` through the breaker.
+
+        ``is_failure`` lets callers exclude errors that say nothing about
+        upstream health (e.g. a 404 for an unknown symbol); those leave the
+        breaker state untouched.
+        """
+
+        probe = self.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            self._settle(e, probe, is_failure)
+            raise
+        self._settle(None, probe, is_failure)
+        return result
+
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        *,
+        is_failure: Callable[[Exception], bool] | None = None,
+    ) -> T:
+        """``call`` for a coroutine function; breaker state I/O runs off the event loop."""
+
+        probe = await sync_to_async(self.before_call, thread_sensitive=False)()
+        try:
+            result = await fn()
+        except Exception as e:
+            await sync_to_async(self._settle, thread_sensitive=False)(e, probe, is_failure)
+            raise
+        await sync_to_async(self._settle, thread_sensitive=False)(None, probe, is_failure)
+        return result
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        b = _breakers.get(name)
+        if b is None:
+            b = _breakers[name] = CircuitBreaker(name)
+        return b
+
+
+def hedge_enabled() -> bool:
+    return bool(getattr(settings, "MARKETS_HEDGED_REQUESTS", False))
+
+
+def hedged_call(fn: Callable[[], T], budget_seconds: float | None) -> T:
+    """Run ``fn``; if it hasn't finished within the budget, race a second copy.
+
+    Only for idempotent calls (GETs). Returns the first successful result; if
+    both attempts fail the first error is raised.
+    """
+
+    if not budget_seconds or budget_seconds <= 0:
+        return fn()
+
+    first = _hedge_pool.submit(fn)
+    done, _pending = wait([first], timeout=budget_seconds)
+    if done:
+        return first.result()
+
+    second = _hedge_pool.submit(fn)
+    pending = {first, second}
+    error: BaseException | None = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            exc = fut.exception()
+            if exc is None:
+                return fut.result()
+            error = error or exc
+    raise error  # type: ignore[misc]
+
+
+def hedge_budget(host_stats: dict[str, float] | None) -> float | None:
+    """Latency budget (p95) after which a hedged request is sent, if known."""
+
+    if not host_stats or host_stats.get("requests", 0) < HEDGE_MIN_SAMPLES:
+        return None
+    return max(HEDGE_MIN_BUDGET_SECONDS, host_stats["p95_ms"] / 1000.0)
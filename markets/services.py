@@ -1,19 +1,24 @@
 from __future__ import annotations
 
 import csv
+import hashlib
 import json
 import time
 import urllib.parse
-import urllib.request
+from collections import deque
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from datetime import date as date_type
-from typing import Any
+from typing import Any, Callable, Iterable, TypeVar
 
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import transaction
 
-from .models import MarketLatest, MarketPoint
+from . import bars, caching, catalog, httpclient, packed, resilience
+from .models import IngestWatermark, Instrument, MarketLatest, MarketPoint
+
+T = TypeVar("T")
 
 
 @dataclass(frozen=True)
@@ -26,34 +31,120 @@ class MarketRow:
     as_of: datetime | None
 
 
-def _http_get_json(url: str, timeout_seconds: int = 10) -> Any:
-    req = urllib.request.Request(
-        url,
-        headers={
-            "User-Agent": "uzwire/1.0 (+https://uzwire.uz)",
-            "Accept": "application/json",
-        },
-    )
-    with urllib.request.urlopen(req, timeout=timeout_seconds) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+def _coingecko_api_url() -> str:
+    return getattr(settings, "MARKETS_COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
 
 
-def _http_get_text(url: str, timeout_seconds: int = 10) -> str:
-    req = urllib.request.Request(
-        url,
-        headers={
-            "User-Agent": "uzwire/1.0 (+https://uzwire.uz)",
-            "Accept": "text/plain,*/*",
-        },
-    )
-    with urllib.request.urlopen(req, timeout=timeout_seconds) as resp:
-        return resp.read().decode("utf-8", errors="replace")
+# Last successful body per URL, served while a provider's circuit is open.
+LAST_GOOD_SECONDS = 24 * 60 * 60
+
+
+def _counts_as_upstream_failure(e: Exception) -> bool:
+    """5xx responses, timeouts and connection errors.
+
+    Client errors (4xx) mean a bad request, not a sick provider; like any
+    other error they don't trip the breaker and aren't papered over with the
+    last good result.
+    """
+
+    if isinstance(e, httpclient.HttpError):
+        return e.status >= 500
+    return isinstance(e, httpclient.TRANSPORT_ERRORS)
+
+
+def _serves_last_good(e: Exception) -> bool:
+    return isinstance(e, resilience.CircuitOpenError) or _counts_as_upstream_failure(e)
+
+
+def _guarded(host: str, fetch: Callable[[], T], *, last_good_key: str) -> T:
+    """Run ``fetch`` through the host's circuit breaker, with optional hedging.
+
+    On an upstream failure (including an open circuit) the last good result
+    stored under ``last_good_key`` is returned if there is one; otherwise, and
+    for any other error such as a 4xx, the error propagates.
+    """
+
+    breaker = resilience.breaker_for(host)
+
+    def attempt() -> T:
+        if not resilience.hedge_enabled():
+            return fetch()
+        budget = resilience.hedge_budget(httpclient.host_stats().get(host))
+        return resilience.hedged_call(fetch, budget)
+
+    try:
+        result = breaker.call(attempt, is_failure=_counts_as_upstream_failure)
+    except Exception as e:
+        if not _serves_last_good(e):
+            raise
+        stale = resilience.shared_cache().get(last_good_key)
+        if stale is not None:
+            return stale
+        raise
+    resilience.shared_cache().set(last_good_key, result, timeout=LAST_GOOD_SECONDS)
+    return result
+
+
+def _last_good_key(*parts: str) -> str:
+    return "markets:v1:last_good:" + hashlib.sha1(":".join(parts).encode("utf-8")).hexdigest()
+
+
+def _guarded_get(
+    url: str,
+    timeout_seconds: int,
+    *,
+    accept: str,
+    conditional: bool = False,
+    last_good_key: str | None = None,
+) -> bytes:
+    """GET ``url`` through ``_guarded``; the last good body is kept per URL unless keyed otherwise.
+
+    ``conditional`` stores validators and the body for a 304 fast path, so
+    only pass it for stable URLs whose payload changes now and then.
+    """
+
+    def get() -> bytes:
+        return httpclient.client.get(url, accept=accept, timeout=timeout_seconds, conditional=conditional).body
+
+    host = urllib.parse.urlsplit(url).hostname or ""
+    return _guarded(host, get, last_good_key=last_good_key or _last_good_key(url))
+
+
+async def _aguarded_get(url: str, timeout_seconds: int, *, accept: str) -> bytes:
+    """Async ``_guarded_get`` (no hedging: slow requests don't tie up threads here)."""
+
+    async def get() -> bytes:
+        return (await httpclient.aget(url, accept=accept, timeout=timeout_seconds)).body
+
+    breaker = resilience.breaker_for(urllib.parse.urlsplit(url).hostname or "")
+    last_good_key = _last_good_key(url)
+    try:
+        result = await breaker.acall(get, is_failure=_counts_as_upstream_failure)
+    except Exception as e:
+        if not _serves_last_good(e):
+            raise
+        stale = await resilience.shared_cache().aget(last_good_key)
+        if stale is not None:
+            return stale
+        raise
+    await resilience.shared_cache().aset(last_good_key, result, timeout=LAST_GOOD_SECONDS)
+    return result
+
+
+def _http_get_json(url: str, timeout_seconds: int = 10, **guard: Any) -> Any:
+    # Pooled keep-alive connection and gzip; ``guard`` goes to _guarded_get.
+    return json.loads(_guarded_get(url, timeout_seconds, accept="application/json", **guard).decode("utf-8"))
+
+
+def _http_get_text(url: str, timeout_seconds: int = 10, **guard: Any) -> str:
+    body = _guarded_get(url, timeout_seconds, accept="text/plain,*/*", **guard)
+    return body.decode("utf-8", errors="replace")
 
 
 def fetch_coingecko_prices(ids: list[str], vs_currency: str = "usd") -> dict[str, float]:
     # Public endpoint; keep calls low using caching.
     q = urllib.parse.urlencode({"ids": ",".join(ids), "vs_currencies": vs_currency})
-    url = f"https://api.coingecko.com/api/v3/simple/price?{q}"
+    url = f"{_coingecko_api_url()}/simple/price?{q}"
     data = _http_get_json(url)
     out: dict[str, float] = {}
     for coin_id in ids:
@@ -64,10 +155,7 @@ def fetch_coingecko_prices(ids: list[str], vs_currency: str = "usd") -> dict[str
     return out
 
 
-def fetch_coingecko_chart(coin_id: str, days: int = 30, vs_currency: str = "usd") -> list[tuple[int, float]]:
-    q = urllib.parse.urlencode({"vs_currency": vs_currency, "days": str(days)})
-    url = f"https://api.coingecko.com/api/v3/coins/{urllib.parse.quote(coin_id)}/market_chart?{q}"
-    data = _http_get_json(url)
+def _parse_coingecko_prices(data: Any) -> list[tuple[int, float]]:
     prices = data.get("prices") or []
     series: list[tuple[int, float]] = []
     for point in prices:
@@ -80,53 +168,312 @@ def fetch_coingecko_chart(coin_id: str, days: int = 30, vs_currency: str = "usd"
     return series
 
 
-def fetch_stooq_quotes(symbols: list[str]) -> dict[str, dict[str, float | None]]:
+def _coingecko_chart_url(coin_id: str, days: int, vs_currency: str) -> str:
+    q = urllib.parse.urlencode({"vs_currency": vs_currency, "days": str(days)})
+    return f"{_coingecko_api_url()}/coins/{urllib.parse.quote(coin_id)}/market_chart?{q}"
+
+
+def fetch_coingecko_chart(coin_id: str, days: int = 30, vs_currency: str = "usd") -> list[tuple[int, float]]:
+    return _parse_coingecko_prices(_http_get_json(_coingecko_chart_url(coin_id, days, vs_currency)))
+
+
+async def afetch_coingecko_chart(coin_id: str, days: int = 30, vs_currency: str = "usd") -> list[tuple[int, float]]:
+    body = await _aguarded_get(_coingecko_chart_url(coin_id, days, vs_currency), 10, accept="application/json")
+    return _parse_coingecko_prices(json.loads(body.decode("utf-8")))
+
+
+def fetch_coingecko_chart_range(
+    coin_id: str,
+    start: datetime,
+    end: datetime,
+    vs_currency: str = "usd",
+) -> list[tuple[int, float]]:
+    """Price points between two instants via the ``market_chart/range`` endpoint."""
+
+    q = urllib.parse.urlencode(
+        {
+            "vs_currency": vs_currency,
+            "from": str(int(start.timestamp())),
+            "to": str(int(end.timestamp())),
+        }
+    )
+    url = f"{_coingecko_api_url()}/coins/{urllib.parse.quote(coin_id)}/market_chart/range?{q}"
+    # from/to change on every call: one last-good entry per coin, not per URL.
+    last_good_key = _last_good_key("coingecko_range", coin_id, vs_currency)
+    return _parse_coingecko_prices(_http_get_json(url, last_good_key=last_good_key))
+
+
+# crypto_chart ranges are rounded up to one of these buckets (days -> cache TTL
+# in seconds) so arbitrary ``days`` values share a handful of cache entries.
+CRYPTO_CHART_BUCKETS: dict[int, int] = {
+    1: 60,
+    7: 5 * 60,
+    30: 15 * 60,
+    90: 30 * 60,
+    180: 60 * 60,
+    365: 60 * 60,
+}
+# Ranges this long are served from ingested daily points (markets.packed) when the
+# coin is in the catalog and the stored history covers the range.
+CRYPTO_CHART_DB_MIN_DAYS = 30
+
+
+def crypto_chart_bucket(days: int) -> int:
+    for bucket in CRYPTO_CHART_BUCKETS:
+        if days <= bucket:
+            return bucket
+    return max(CRYPTO_CHART_BUCKETS)
+
+
+def _crypto_chart_points(history: packed.History, since: date_type) -> list[tuple[int, float]] | None:
+    # Only when the stored history reaches back to the start of the range.
+    if not history or history.days[0] - packed.epoch_day(since) > 1:
+        return None
+    return history.points()
+
+
+def _crypto_chart_from_db(instrument: str, days: int) -> list[tuple[int, float]] | None:
+    since = datetime.now(timezone.utc).date() - timedelta(days=days)
+    return _crypto_chart_points(packed.read_range(instrument, since), since)
+
+
+def get_crypto_chart(coin_id: str, days: int) -> tuple[list[tuple[int, float]], str] | None:
+    """``(points, source)`` for a catalog coin over the last ``days`` days, or None if unknown.
+
+    ``source`` is ``"db"`` when served from ingested daily points, otherwise
+    ``"coingecko"``. Upstream responses are cached per (coin, days bucket) in
+    the shared cache and concurrent misses are coalesced into one request.
+    """
+
+    coins = {
+        i.provider_symbol: i.symbol for i in catalog.all_instruments() if i.provider == Instrument.PROVIDER_COINGECKO
+    }
+    instrument = coins.get(coin_id)
+    if instrument is None:
+        return None
+
+    if days >= CRYPTO_CHART_DB_MIN_DAYS:
+        points = caching.get_or_set_coalesced(
+            f"markets:v1:crypto_chart:db:{instrument}:{days}",
+            lambda: _crypto_chart_from_db(instrument, days) or [],
+            timeout=5 * 60,
+        )
+        if points:
+            return points, "db"
+
+    bucket = crypto_chart_bucket(days)
+    points = caching.get_or_set_coalesced(
+        f"markets:v1:crypto_chart:upstream:{coin_id}:{bucket}",
+        lambda: fetch_coingecko_chart(coin_id=coin_id, days=bucket),
+        timeout=CRYPTO_CHART_BUCKETS[bucket],
+    )
+    cutoff = int((time.time() - days * 86400) * 1000)
+    return [p for p in points if p[0] >= cutoff], "coingecko"
+
+
+async def _acrypto_chart_from_db(instrument: str, days: int) -> list[tuple[int, float]] | None:
+    since = datetime.now(timezone.utc).date() - timedelta(days=days)
+    return _crypto_chart_points(await packed.aread_range(instrument, since), since)
+
+
+async def aget_crypto_chart(coin_id: str, days: int) -> tuple[list[tuple[int, float]], str] | None:
+    """Async ``get_crypto_chart``: async ORM for stored points, async HTTP upstream.
+
+    Shares its cache keys with the sync version.
+    """
+
+    instruments = await sync_to_async(catalog.all_instruments)()
+    coins = {i.provider_symbol: i.symbol for i in instruments if i.provider == Instrument.PROVIDER_COINGECKO}
+    instrument = coins.get(coin_id)
+    if instrument is None:
+        return None
+
+    if days >= CRYPTO_CHART_DB_MIN_DAYS:
+
+        async def from_db() -> list[tuple[int, float]]:
+            return await _acrypto_chart_from_db(instrument, days) or []
+
+        points = await caching.aget_or_set_coalesced(
+            f"markets:v1:crypto_chart:db:{instrument}:{days}", from_db, timeout=5 * 60
+        )
+        if points:
+            return points, "db"
+
+    bucket = crypto_chart_bucket(days)
+    points = await caching.aget_or_set_coalesced(
+        f"markets:v1:crypto_chart:upstream:{coin_id}:{bucket}",
+        lambda: afetch_coingecko_chart(coin_id=coin_id, days=bucket),
+        timeout=CRYPTO_CHART_BUCKETS[bucket],
+    )
+    cutoff = int((time.time() - days * 86400) * 1000)
+    return [p for p in points if p[0] >= cutoff], "coingecko"
+
+
+# Symbols per /q/l/ request; keeps URLs well under common length limits.
+STOOQ_QUOTE_BATCH_SIZE = 40
+
+
+def _parse_quote_value(raw: str | None) -> float | None:
+    raw = (raw or "").strip()
+    # Stooq marks unknown symbols / missing fields with N/D or N/A.
+    if not raw or raw in ("N/A", "N/D"):
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def parse_stooq_quotes_csv(text: str, symbols: list[str]) -> dict[str, dict[str, Any]]:
+    """Parse a multi-row /q/l/ CSV in one pass and map rows back to ``symbols``.
+
+    Rows are matched on the Symbol column (case-insensitive); if the column is
+    missing, rows are matched by position. Unknown symbols are omitted. Each
+    value holds ``price``, ``change_pct`` (vs. open) and the quote ``date``.
+    """
+
+    by_key = {sym.strip().lower(): sym for sym in symbols}
+    out: dict[str, dict[str, float | None]] = {}
+    reader = csv.reader(text.splitlines())
+    header = next(reader, None)
+    if not header:
+        return out
+    cols = {name.strip().lower(): i for i, name in enumerate(header)}
+    i_sym, i_open, i_close = cols.get("symbol"), cols.get("open"), cols.get("close")
+    i_date = cols.get("date")
+    if i_close is None:
+        return out
+
+    for pos, row in enumerate(reader):
+        if not row:
+            continue
+        if i_sym is not None and i_sym < len(row):
+            sym = by_key.get(row[i_sym].strip().lower())
+        else:
+            sym = symbols[pos] if pos < len(symbols) else None
+        if sym is None:
+            continue
+        if all(c.strip() in ("N/D", "") for c in row[1:]):
+            # Symbol not known to Stooq at all.
+            continue
+        close = _parse_quote_value(row[i_close]) if i_close < len(row) else None
+        open_ = _parse_quote_value(row[i_open]) if i_open is not None and i_open < len(row) else None
+        quote_date = None
+        if i_date is not None and i_date < len(row):
+            try:
+                quote_date = date_type.fromisoformat(row[i_date].strip())
+            except ValueError:
+                quote_date = None
+        out[sym] = {"price": close, "change_pct": _change_pct(close, open_), "date": quote_date}
+    return out
+
+
+def fetch_stooq_quotes(
+    symbols: list[str],
+    batch_size: int = STOOQ_QUOTE_BATCH_SIZE,
+) -> dict[str, dict[str, Any]]:
     # Stooq free CSV endpoint. Symbols examples:
     # - Indexes: ^spx, ^ndx, ^dji (availability can vary)
     # - FX/metals may vary by provider; treat as best-effort.
     # Docs: https://stooq.com/q/l/
-    out: dict[str, dict[str, float | None]] = {}
-    for sym in symbols:
-        url = f"https://stooq.com/q/l/?s={urllib.parse.quote(sym)}&f=sd2t2ohlcv&h&e=csv"
+    # Several symbols are requested at once (s=a+b+c), so the number of
+    # requests grows with len(symbols) / batch_size.
+    unique = list(dict.fromkeys(sym for sym in symbols if sym and sym.strip()))
+    out: dict[str, dict[str, Any]] = {}
+    for i in range(0, len(unique), max(1, batch_size)):
+        batch = unique[i : i + batch_size]
+        s = "+".join(urllib.parse.quote(sym) for sym in batch)
+        url = f"https://stooq.com/q/l/?s={s}&f=sd2t2ohlcv&h&e=csv"
         try:
-            text = _http_get_text(url)
-            rows = list(csv.DictReader(text.splitlines()))
-            if not rows:
-                continue
-            row = rows[0]
-            close_str = (row.get("Close") or "").strip()
-            open_str = (row.get("Open") or "").strip()
-            close = float(close_str) if close_str and close_str != "N/A" else None
-            open_ = float(open_str) if open_str and open_str != "N/A" else None
-            change_pct = None
-            if close is not None and open_ not in (None, 0):
-                change_pct = (close - open_) / open_ * 100.0
-            out[sym] = {"price": close, "change_pct": change_pct}
+            out.update(parse_stooq_quotes_csv(_http_get_text(url, conditional=True), batch))
         except Exception:
             continue
     return out
 
 
-def fetch_stooq_history(symbol: str, days: int = 45) -> list[tuple[date_type, float]]:
+def fetch_stooq_history(
+    symbol: str,
+    days: int = 45,
+    *,
+    start: date_type | None = None,
+    end: date_type | None = None,
+) -> list[tuple[date_type, float]]:
     """Fetch daily close history from Stooq.
 
+    Pass ``start``/``end`` to download only that range (Stooq's d1/d2
+    parameters) instead of the full history.
     Returns a list of (date, close) sorted ascending.
     """
 
     # i=d for daily candles.
     url = f"https://stooq.com/q/d/l/?s={urllib.parse.quote(symbol)}&i=d"
-    text = _http_get_text(url)
-    rows = list(csv.DictReader(text.splitlines()))
+    if start is not None:
+        url += f"&d1={start:%Y%m%d}&d2={(end or datetime.now(timezone.utc).date()):%Y%m%d}"
+    keep = max(2, days)
+    # The parsed tail with the validators it was fetched under, for the 304 fast path.
+    validated_key = "markets:v1:stooq_history:" + hashlib.sha1(f"{url}:{keep}".encode("utf-8")).hexdigest()
+
+    def fetch() -> list[tuple[date_type, float]]:
+        shared = resilience.shared_cache()
+        stored = shared.get(validated_key)
+        # Streamed: the full-history CSV is never held in memory at once.
+        with httpclient.client.stream_lines(
+            url, accept="text/plain,*/*", validators=stored["validators"] if stored else None
+        ) as lines:
+            if lines.not_modified:
+                return stored["rows"]
+            rows = parse_stooq_history_tail(lines, keep)
+        if lines.validators:
+            shared.set(
+                validated_key,
+                {"validators": lines.validators, "rows": rows},
+                timeout=httpclient.VALIDATOR_CACHE_SECONDS,
+            )
+        return rows
+
+    # Only the parsed tail is kept as last-good, not the raw CSV.
+    return _guarded("stooq.com", fetch, last_good_key=_last_good_key(url, str(keep)))
+
+
+def parse_stooq_history_tail(lines: Iterable[bytes | str], n: int) -> list[tuple[date_type, float]]:
+    """Parse a Stooq daily CSV keeping only the last ``n`` rows.
+
+    Rows are split by hand (Stooq CSVs are unquoted) into a bounded deque, so
+    memory stays proportional to ``n`` however long the history is; only the
+    surviving rows are converted to (date, close). Returns them ascending.
+    """
+
+    it = iter(lines)
+    header = next(it, None)
+    if header is None:
+        return []
+    if isinstance(header, bytes):
+        header = header.decode("utf-8", errors="replace")
+    cols = [c.strip().lower() for c in header.split(",")]
+    try:
+        i_date, i_close = cols.index("date"), cols.index("close")
+    except ValueError:
+        # "No data" or an error page instead of a CSV.
+        return []
+    width = max(i_date, i_close) + 1
+
+    tail: deque[list] = deque(maxlen=max(1, n))
+    for line in it:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        parts = line.split(",")
+        if len(parts) >= width:
+            tail.append(parts)
+
     out: list[tuple[date_type, float]] = []
-    for row in rows[-max(2, days):]:
-        ds = (row.get("Date") or "").strip()
-        close_s = (row.get("Close") or "").strip()
+    for parts in tail:
+        ds = parts[i_date].strip()
+        close_s = parts[i_close].strip()
         if not ds or not close_s or close_s == "N/A":
             continue
         try:
-            d = datetime.strptime(ds, "%Y-%m-%d").date()
-            out.append((d, float(close_s)))
-        except Exception:
+            out.append((date_type.fromisoformat(ds), float(close_s)))
+        except ValueError:
             continue
     out.sort(key=lambda t: t[0])
     return out
@@ -137,7 +484,7 @@ def fetch_fear_greed_altme(days: int = 30) -> list[tuple[date_type, float]]:
 
     q = urllib.parse.urlencode({"limit": str(max(1, min(days, 365))), "format": "json"})
     url = f"https://api.alternative.me/fng/?{q}"
-    data = _http_get_json(url)
+    data = _http_get_json(url, conditional=True)
     items = data.get("data") or []
     out: list[tuple[date_type, float]] = []
     for it in items:
@@ -156,60 +503,66 @@ def fetch_fear_greed_altme(days: int = 30) -> list[tuple[date_type, float]]:
     return sorted(dedup.items(), key=lambda t: t[0])
 
 
+def ticker_latest():
+    """MarketLatest rows for catalog instruments shown in the ticker, display-ordered."""
+
+    qs = MarketLatest.objects.all()
+    symbols = catalog.ticker_symbols()
+    if symbols:
+        qs = qs.filter(instrument__in=symbols)
+    return qs.order_by("category", "name")
+
+
 def get_market_snapshot(cache_seconds: int = 120) -> list[MarketRow]:
-    cache_key = "markets:v1:snapshot"
-    cached = cache.get(cache_key)
-    if cached is not None:
-        return cached
+    return caching.get_stale_while_revalidate(
+        "markets:v2:snapshot",
+        _build_market_snapshot,
+        soft_ttl=cache_seconds,
+        hard_ttl=cache_seconds * 10,
+        name="snapshot",
+    )
 
+
+def _build_market_snapshot() -> list[MarketRow]:
     now = datetime.now(timezone.utc)
 
-    # Best-effort selection: keep it minimal and robust.
-    # Crypto via CoinGecko, traditional/commodities via Stooq.
-    crypto_ids = ["bitcoin", "ethereum"]
+    # Best-effort: ticker instruments from the catalog, one batched request
+    # per provider (crypto via CoinGecko, the rest via Stooq quotes).
+    instruments = catalog.ticker_instruments()
+    crypto_ids = [i.provider_symbol for i in instruments if i.provider == Instrument.PROVIDER_COINGECKO]
+    stooq_symbols = [i.provider_symbol for i in instruments if i.provider == Instrument.PROVIDER_STOOQ]
+
     try:
-        crypto_prices = fetch_coingecko_prices(crypto_ids)
+        crypto_prices = fetch_coingecko_prices(crypto_ids) if crypto_ids else {}
     except Exception:
         crypto_prices = {}
-
-    stooq_symbols = [
-        "^spx",  # S&P 500 (may vary)
-        "^ndx",  # Nasdaq 100
-        "^dji",  # Dow Jones
-        "xauusd",  # Gold (spot) - availability can vary
-        "wti",  # Crude oil proxy (availability can vary)
-    ]
     try:
-        stooq = fetch_stooq_quotes(stooq_symbols)
+        stooq = fetch_stooq_quotes(stooq_symbols) if stooq_symbols else {}
     except Exception:
         stooq = {}
 
     rows: list[MarketRow] = []
-
-    def add_row(category: str, name: str, symbol: str, price: float | None, change_pct: float | None):
+    for i in instruments:
+        if i.provider == Instrument.PROVIDER_COINGECKO:
+            price, change_pct = crypto_prices.get(i.provider_symbol), None
+        elif i.provider == Instrument.PROVIDER_STOOQ:
+            quote = stooq.get(i.provider_symbol, {})
+            price, change_pct = quote.get("price"), quote.get("change_pct")
+        else:
+            # FX / sentiment are only available once ingested.
+            continue
         rows.append(
             MarketRow(
-                category=category,
-                name=name,
-                symbol=symbol,
+                category=i.category,
+                name=i.name,
+                symbol=i.symbol,
                 price=price,
                 change_pct=change_pct,
                 as_of=now,
             )
         )
 
-    add_row("Crypto", "Bitcoin", "BTC", crypto_prices.get("bitcoin"), None)
-    add_row("Crypto", "Ethereum", "ETH", crypto_prices.get("ethereum"), None)
-
-    add_row("Traditional", "S&P 500", "^SPX", stooq.get("^spx", {}).get("price"), stooq.get("^spx", {}).get("change_pct"))
-    add_row("Traditional", "Nasdaq 100", "^NDX", stooq.get("^ndx", {}).get("price"), stooq.get("^ndx", {}).get("change_pct"))
-    add_row("Traditional", "Dow Jones", "^DJI", stooq.get("^dji", {}).get("price"), stooq.get("^dji", {}).get("change_pct"))
-
-    add_row("Commodities", "Gold", "XAUUSD", stooq.get("xauusd", {}).get("price"), stooq.get("xauusd", {}).get("change_pct"))
-    add_row("Commodities", "WTI (proxy)", "WTI", stooq.get("wti", {}).get("price"), stooq.get("wti", {}).get("change_pct"))
-
-    # Cache even partial/empty results to avoid hammering upstreams.
-    cache.set(cache_key, rows, timeout=cache_seconds)
+    # Partial/empty results are cached too, to avoid hammering upstreams.
     return rows
 
 
@@ -219,15 +572,20 @@ def fetch_fx_rates_to_uzs(cache_seconds: int = 3600) -> dict[str, float]:
     Returns a mapping like: {"USD": uzs_per_usd, "EUR": uzs_per_eur, "RUB": uzs_per_rub}
     """
 
-    cache_key = "markets:v1:fx:uzs"
-    cached = cache.get(cache_key)
-    if cached is not None:
-        return cached
+    return caching.get_stale_while_revalidate(
+        "markets:v2:fx:uzs",
+        _build_fx_rates_to_uzs,
+        soft_ttl=cache_seconds,
+        hard_ttl=cache_seconds * 6,
+        name="fx",
+    )
+
 
+def _build_fx_rates_to_uzs() -> dict[str, float]:
     out: dict[str, float] = {}
     try:
         # Free endpoint, no API key. Base USD simplifies cross-rates.
-        data = _http_get_json("https://open.er-api.com/v6/latest/USD")
+        data = _http_get_json("https://open.er-api.com/v6/latest/USD", conditional=True)
         rates = data.get("rates") or {}
 
         usd_uzs = float(rates.get("UZS")) if rates.get("UZS") else None
@@ -242,8 +600,6 @@ def fetch_fx_rates_to_uzs(cache_seconds: int = 3600) -> dict[str, float]:
             out["RUB"] = usd_uzs / usd_rub
     except Exception:
         out = {}
-
-    cache.set(cache_key, out, timeout=cache_seconds)
     return out
 
 
@@ -251,31 +607,175 @@ def fetch_fx_rates_to_uzs(cache_seconds: int = 3600) -> dict[str, float]:
 get_fx_rates_to_uzs = fetch_fx_rates_to_uzs
 
 
-def persist_points(instrument: str, points: list[tuple[date_type, float]]) -> None:
-    if not points:
-        return
+@dataclass(frozen=True)
+class PersistStats:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    @property
+    def written(self) -> int:
+        return self.inserted + self.updated
+
+
+def persist_points(instrument: str, points: list[tuple[date_type, float]]) -> PersistStats:
+    """Upsert a daily series for one instrument; see ``persist_series``."""
+
+    return persist_series({instrument: points}).get(instrument, PersistStats())
 
+
+def persist_series(series: dict[str, list[tuple[date_type, float]]]) -> dict[str, PersistStats]:
+    """Upsert daily series for many instruments in a few statements.
+
+    Existing values for the incoming (instrument, date) pairs are read in one
+    query; only new or changed rows are sent to a single
+    ``bulk_create(update_conflicts=True)`` on (instrument, date), and the
+    affected PackedYear rows and MarketBar periods are rebuilt. Returns
+    inserted/updated/unchanged counts per instrument.
+    """
+
+    # Dedup dates (keep last) so one statement never conflicts with itself.
+    incoming: dict[str, dict[date_type, float]] = {}
+    for instrument, points in series.items():
+        if points:
+            by_date = incoming.setdefault(instrument, {})
+            for d, v in points:
+                by_date[d] = v
+    if not incoming:
+        return {}
+
+    all_dates = [d for by_date in incoming.values() for d in by_date]
+    out: dict[str, PersistStats] = {}
     with transaction.atomic():
-        for d, v in points:
-            MarketPoint.objects.update_or_create(
-                instrument=instrument,
-                date=d,
-                defaults={"value": v},
+        existing: dict[tuple[str, date_type], float | None] = {
+            (inst, d): v
+            for inst, d, v in MarketPoint.objects.filter(
+                instrument__in=list(incoming.keys()),
+                date__gte=min(all_dates),
+                date__lte=max(all_dates),
+            ).values_list("instrument", "date", "value")
+        }
+        rows: list[MarketPoint] = []
+        for instrument, by_date in incoming.items():
+            inserted = updated = unchanged = 0
+            for d, v in by_date.items():
+                key = (instrument, d)
+                if key not in existing:
+                    inserted += 1
+                elif existing[key] == v:
+                    unchanged += 1
+                    continue
+                else:
+                    updated += 1
+                rows.append(MarketPoint(instrument=instrument, date=d, value=v))
+            out[instrument] = PersistStats(inserted=inserted, updated=updated, unchanged=unchanged)
+
+        if rows:
+            MarketPoint.objects.bulk_create(
+                rows,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["instrument", "date"],
+                update_fields=["value"],
             )
+            # Keep the packed per-year copy and the weekly/monthly bars in step.
+            packed.sync_years({(r.instrument, r.date.year) for r in rows})
+            changed_since: dict[str, date_type] = {}
+            for r in rows:
+                if r.instrument not in changed_since or r.date < changed_since[r.instrument]:
+                    changed_since[r.instrument] = r.date
+            bars.refresh(changed_since)
+
+    return out
+
+
+def _as_of_from_date(d: date_type) -> datetime:
+    return datetime.combine(d, datetime.min.time(), tzinfo=timezone.utc)
+
+
+def _change_pct(latest: float | None, prev: float | None) -> float | None:
+    if latest is None or prev in (None, 0):
+        return None
+    try:
+        return (float(latest) - float(prev)) / float(prev) * 100.0
+    except Exception:
+        return None
+
+
+def latest_from_points(
+    instrument: str,
+    category: str,
+    name: str,
+    points: list[tuple[date_type, float]],
+    *,
+    previous: float | None = None,
+) -> MarketLatest | None:
+    """Build an unsaved MarketLatest from a freshly fetched series.
+
+    ``previous`` is only used when the series holds a single point (e.g. FX
+    snapshots), where the prior value has to come from storage.
+    """
+
+    values = [(d, v) for d, v in points if v is not None]
+    if not values:
+        return None
+    values.sort(key=lambda t: t[0])
+    latest_d, latest_v = values[-1]
+    prev_v = values[-2][1] if len(values) > 1 else previous
+    return MarketLatest(
+        instrument=instrument,
+        category=category,
+        name=name,
+        price=latest_v,
+        change_pct=_change_pct(latest_v, prev_v),
+        as_of=_as_of_from_date(latest_d),
+    )
+
+
+def previous_values(before: dict[str, date_type], lookback_days: int = 14) -> dict[str, float]:
+    """Last stored value strictly before the given date, per instrument (one query)."""
+
+    if not before:
+        return {}
+    start = min(before.values()) - timedelta(days=lookback_days)
+    out: dict[str, float] = {}
+    qs = (
+        MarketPoint.objects.filter(instrument__in=list(before.keys()), value__isnull=False, date__gte=start)
+        .order_by("instrument", "date")
+        .values_list("instrument", "date", "value")
+    )
+    for instrument, d, v in qs:
+        if d < before[instrument]:
+            out[instrument] = v
+    return out
+
+
+def persist_latest_rows(rows: list[MarketLatest]) -> int:
+    """Write all MarketLatest rows for an ingest run in one upsert."""
+
+    if not rows:
+        return 0
+    MarketLatest.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["instrument"],
+        update_fields=["category", "name", "price", "change_pct", "as_of"],
+    )
+    return len(rows)
 
 
 def persist_latest_from_points(instrument: str, category: str, name: str) -> None:
-    qs = MarketPoint.objects.filter(instrument=instrument, value__isnull=False).order_by("-date")
-    latest = qs.first()
-    if not latest:
+    """Recompute MarketLatest from stored MarketPoint rows.
+
+    Ingest derives latest values in memory (see ``latest_from_points``); this
+    DB-side path is kept for repairs (``update_markets --repair-latest``).
+    """
+
+    last_two = list(MarketPoint.objects.filter(instrument=instrument, value__isnull=False).order_by("-date")[:2])
+    if not last_two:
         return
-    prev = qs[1] if qs.count() > 1 else None
-    change_pct = None
-    if prev and prev.value not in (None, 0):
-        try:
-            change_pct = (float(latest.value) - float(prev.value)) / float(prev.value) * 100.0
-        except Exception:
-            change_pct = None
+    latest = last_two[0]
+    prev = last_two[1] if len(last_two) > 1 else None
 
     MarketLatest.objects.update_or_create(
         instrument=instrument,
@@ -283,7 +783,25 @@ def persist_latest_from_points(instrument: str, category: str, name: str) -> Non
             "category": category,
             "name": name,
             "price": latest.value,
-            "change_pct": change_pct,
-            "as_of": datetime.combine(latest.date, datetime.min.time(), tzinfo=timezone.utc),
+            "change_pct": _change_pct(latest.value, prev.value if prev else None),
+            "as_of": _as_of_from_date(latest.date),
         },
     )
+
+
+def load_watermarks() -> dict[tuple[str, str], IngestWatermark]:
+    return {(w.instrument, w.source): w for w in IngestWatermark.objects.all()}
+
+
+def persist_watermarks(rows: list[IngestWatermark]) -> int:
+    """Upsert ingest watermarks for a run in one statement."""
+
+    if not rows:
+        return 0
+    IngestWatermark.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["instrument", "source"],
+        update_fields=["last_date", "last_full_at", "updated_at"],
+    )
+    return len(rows)
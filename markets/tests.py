@@ -1,3 +1,1170 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+import zlib
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import Resolver404, resolve
+from django.utils.http import http_date
+
+from config import cache_backends
+from config.cache_backends import TieredCache
+
+from . import bars, caching, catalog, httpclient, live, packed, payloads, resilience, services, ticks, versions, views
+from .context_processors import live_ticker
+from .downsample import MAX_POINTS, MIN_POINTS, lttb, lttb_indices, parse_max_points
+from .management.commands import run_scheduler, update_markets
+from .models import IngestWatermark, Instrument, MarketBar, MarketLatest, MarketPoint, PackedYear, TickChunk
+
+
+# Version tokens and payloads live in the cache; keep tests off the shared cache directory.
+TEST_CACHES = {
+    # L1_TTL 0: each thread has its own L1, and tests expect other threads' writes at once.
+    "default": {"BACKEND": "config.cache_backends.TieredCache", "LOCATION": "shared", "OPTIONS": {"L1_TTL": 0}},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "markets-tests"},
+}
+
+CSV = b"Date,Close\n" + b"".join(b"2024-01-%02d,%d.5\n" % (d, d) for d in range(1, 29))
+
+
+class _UpstreamHandler(BaseHTTPRequestHandler):
+    """Serves ``CSV`` framed and encoded as the request path asks."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/missing":
+            self._send(404, b"not found")
+        elif self.path == "/moved":
+            self.send_response(302)
+            self.send_header("Location", "/length")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/gzip":
+            self._send(200, gzip.compress(CSV), {"Content-Encoding": "gzip"})
+        elif self.path == "/deflate":
+            self._send(200, zlib.compress(CSV), {"Content-Encoding": "deflate"})
+        elif self.path == "/raw-deflate":
+            # zlib stream without its header and checksum, as some servers send.
+            self._send(200, zlib.compress(CSV)[2:-4], {"Content-Encoding": "deflate"})
+        elif self.path == "/etag":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self._send(304, b"", {"ETag": '"v1"'})
+            else:
+                self._send(200, gzip.compress(CSV), {"ETag": '"v1"', "Content-Encoding": "gzip"})
+        elif self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(CSV), 50):
+                part = CSV[i : i + 50]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send(200, CSV)
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _UpstreamTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _UpstreamHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+class AsyncGetTests(_UpstreamTestCase):
+    def aget(self, path):
+        return asyncio.run(httpclient.aget(self.base + path, timeout=5))
+
+    def test_content_length(self):
+        self.assertEqual(self.aget("/length").body, CSV)
+
+    def test_chunked(self):
+        self.assertEqual(self.aget("/chunked").body, CSV)
+
+    def test_gzip_and_deflate_are_decoded(self):
+        self.assertEqual(self.aget("/gzip").body, CSV)
+        self.assertEqual(self.aget("/deflate").body, CSV)
+
+    def test_follows_redirects(self):
+        self.assertEqual(self.aget("/moved").body, CSV)
+
+    def test_client_error_raises(self):
+        with self.assertRaises(httpclient.HttpError) as ctx:
+            self.aget("/missing")
+        self.assertEqual(ctx.exception.status, 404)
+
+    def test_records_host_stats(self):
+        before = httpclient.host_stats().get("127.0.0.1", {}).get("requests", 0)
+        self.aget("/length")
+        self.assertEqual(httpclient.host_stats()["127.0.0.1"]["requests"], before + 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StreamLinesTests(_UpstreamTestCase):
+    def lines(self, path, **kwargs):
+        with httpclient.client.stream_lines(self.base + path, chunk_size=7, **kwargs) as stream:
+            return list(stream)
+
+    def test_encodings(self):
+        expected = CSV.rstrip(b"\n").split(b"\n")
+        for path in ("/length", "/chunked", "/gzip", "/deflate", "/raw-deflate"):
+            self.assertEqual(self.lines(path), expected, path)
+
+    def test_validators_give_304(self):
+        with httpclient.client.stream_lines(self.base + "/etag") as stream:
+            self.assertEqual(len(list(stream)), 29)
+            validators = stream.validators
+        self.assertEqual(validators, {"etag": '"v1"', "last_modified": None})
+        with httpclient.client.stream_lines(self.base + "/etag", validators=validators) as stream:
+            self.assertTrue(stream.not_modified)
+            self.assertEqual(list(stream), [])
+
+    def test_stooq_history_served_from_tail_on_304(self):
+        stream_lines = httpclient.client.stream_lines
+        urls = []
+
+        def local(url, **kwargs):
+            urls.append(url)
+            return stream_lines(self.base + "/etag", **kwargs)
+
+        with mock.patch.object(httpclient.client, "stream_lines", local):
+            first = services.fetch_stooq_history("^spx", days=3)
+            stats = httpclient.host_stats()["127.0.0.1"]["not_modified"]
+            self.assertEqual(services.fetch_stooq_history("^spx", days=3), first)
+        self.assertEqual(httpclient.host_stats()["127.0.0.1"]["not_modified"], stats + 1)
+        self.assertEqual(first, [(date(2024, 1, d), d + 0.5) for d in (26, 27, 28)])
+        self.assertTrue(urls[0].startswith("https://stooq.com/q/d/l/?s=%5Espx&i=d"))
+
+    def test_history_tail_parser(self):
+        rows = [b"Date,Open,Close", b"2024-01-01,1,1.5", b"bad", b"2024-01-02,2,N/A", b"2024-01-03,3,3.5"]
+        self.assertEqual(services.parse_stooq_history_tail(rows, 2), [(date(2024, 1, 3), 3.5)])
+        self.assertEqual(services.parse_stooq_history_tail([b"No data"], 5), [])
+
+
+class PackedYearTests(TestCase):
+    def test_encode_decode_round_trip(self):
+        days = [packed.epoch_day(date(2024, 1, 1)) + i for i in range(0, 366, 3)]
+        values = [i * 1.25 - 40.0 for i in range(len(days))]
+        history = packed.decode_year(packed.encode_year(days, values))
+        self.assertEqual(history.days, array("i", days))
+        self.assertEqual(history.values, array("d", values))
+        self.assertEqual(len(packed.decode_year(packed.encode_year([], []))), 0)
+
+    def test_mismatched_lengths_are_rejected(self):
+        with self.assertRaises(ValueError):
+            packed.encode_year([1, 2], [1.0])
+
+    def test_sync_years_matches_market_points(self):
+        start = date(2022, 12, 25)
+        points = [(start + timedelta(days=i), 100.0 + i) for i in range(20)]
+        MarketPoint.objects.bulk_create(MarketPoint(instrument="BTC", date=d, value=v) for d, v in points)
+        MarketPoint.objects.create(instrument="BTC", date=date(2023, 2, 1), value=None)
+
+        self.assertEqual(packed.sync_years({("BTC", 2022), ("BTC", 2023)}), 2)
+        expected = [(packed.epoch_day(d) * packed.DAY_MS, v) for d, v in points]
+        self.assertEqual(packed.read_range("BTC").points(), expected)
+        self.assertEqual(list(packed.read_last(["BTC", "ETH"], 3)["BTC"].values), [117.0, 118.0, 119.0])
+        window = packed.read_range("BTC", date(2022, 12, 30), date(2023, 1, 2))
+        self.assertEqual(window.values, array("d", [105.0, 106.0, 107.0, 108.0]))
+
+        MarketPoint.objects.filter(date__year=2022).delete()
+        packed.sync_years({("BTC", 2022)})
+        self.assertEqual(list(PackedYear.objects.values_list("year", flat=True)), [2023])
+
+
+class TickStoreTests(TestCase):
+    def test_chunk_round_trip(self):
+        ts = [1_700_000_000_000 + i * 250 for i in range(1000)]
+        prices = [43_000.12345678 + (i % 17) * 0.5 - (i % 5) * 1.75 for i in range(1000)]
+        lows = [p - 3.0 for p in prices]
+        dts, (dprices, dlows) = ticks.decode_chunk(ticks.encode_chunk(ts, [prices, lows]))
+        self.assertEqual(list(dts), ts)
+        for got, want in ((dprices, prices), (dlows, lows)):
+            self.assertEqual(len(got), len(want))
+            for g, w in zip(got, want):
+                self.assertAlmostEqual(g, w, places=8)
+
+    @mock.patch.object(ticks, "CHUNK_POINTS", 5)
+    def test_appends_across_chunks(self):
+        t0 = 1_700_000_000_000
+        first = [(t0 + i * 1000, 100.0 + i) for i in range(7)]
+        self.assertEqual(ticks.append_ticks("BTC", first), 7)
+        # Overlapping re-send: only the two newer ticks are written.
+        self.assertEqual(ticks.append_ticks("BTC", first[-3:] + [(t0 + 7000, 107.0), (t0 + 8000, 108.0)]), 2)
+        chunks = TickChunk.objects.filter(resolution=ticks.RESOLUTION_TICK).order_by("start_ts")
+        self.assertEqual(list(chunks.values_list("count", flat=True)), [5, 4])
+
+        data = ticks.read_range("BTC", t0 + 2000, t0 + 6000)
+        self.assertEqual(list(data.ts), [t0 + i * 1000 for i in range(2, 7)])
+        self.assertEqual(list(data.columns[0]), [102.0, 103.0, 104.0, 105.0, 106.0])
+        self.assertEqual(ticks.last_tick_ts("BTC"), t0 + 8000)
+
+    def test_rollups_match_raw_ticks(self):
+        t0 = 1_700_000_040_000
+        batch = [(t0 + i * 7_000, 50.0 + (i * 7) % 11) for i in range(40)]
+        ticks.append_ticks("ETH", batch[:25])
+        ticks.append_ticks("ETH", batch[25:])
+        bar_ts, (o, h, lo, c) = ticks.rollup([t for t, _ in batch], [p for _, p in batch], ticks.ROLLUPS["1m"])
+        stored = ticks.read_range("ETH", 0, t0 + 10**7, resolution="1m")
+        self.assertEqual(list(stored.ts), bar_ts)
+        self.assertEqual([list(col) for col in stored.columns], [o, h, lo, c])
+
+
+def _bar_rows(instrument):
+    return list(
+        MarketBar.objects.filter(instrument=instrument)
+        .order_by("interval", "start")
+        .values_list("interval", "start", "open", "high", "low", "close", "last_date", "count")
+    )
+
+
+class BarTests(TestCase):
+    def setUp(self):
+        start = date(2023, 11, 1)
+        MarketPoint.objects.bulk_create(
+            MarketPoint(instrument="SPX", date=start + timedelta(days=i), value=100.0 + (i * 37) % 23)
+            for i in range(120)
+        )
+        packed.rebuild(["SPX"])
+        bars.rebuild(["SPX"])
+
+    def test_build_bars_ohlc(self):
+        history = packed.read_range("SPX", date(2024, 1, 1), date(2024, 1, 31))
+        (month,) = bars.build_bars(history, bars.MONTHLY)
+        self.assertEqual(month.start, date(2024, 1, 1))
+        self.assertEqual(month.last_date, date(2024, 1, 31))
+        self.assertEqual(month.count, 31)
+        self.assertEqual((month.open, month.close), (history.values[0], history.values[-1]))
+        self.assertEqual((month.high, month.low), (max(history.values), min(history.values)))
+        weeks = bars.build_bars(history, bars.WEEKLY)
+        self.assertTrue(all(w.start.weekday() == 0 for w in weeks))
+        self.assertEqual(sum(w.count for w in weeks), 31)
+
+    def test_refresh_matches_rebuild(self):
+        # Revise a mid-history close and append new days, as an ingest run would.
+        MarketPoint.objects.filter(instrument="SPX", date=date(2024, 1, 17)).update(value=250.0)
+        last = MarketPoint.objects.filter(instrument="SPX").latest("date").date
+        MarketPoint.objects.bulk_create(
+            MarketPoint(instrument="SPX", date=last + timedelta(days=i), value=90.0 + i) for i in range(1, 40)
+        )
+        # Empty a whole week by nulling and a whole month (February) by deleting.
+        MarketPoint.objects.filter(instrument="SPX", date__range=(date(2024, 1, 22), date(2024, 1, 28))).update(
+            value=None
+        )
+        MarketPoint.objects.filter(instrument="SPX", date__range=(date(2024, 2, 1), date(2024, 2, 29))).delete()
+        packed.sync_years({("SPX", 2024)})
+        bars.refresh({"SPX": date(2024, 1, 17)})
+        refreshed = _bar_rows("SPX")
+        starts = {row[1] for row in refreshed}
+        self.assertNotIn(date(2024, 1, 22), starts)
+        self.assertNotIn(date(2024, 2, 1), starts)
+
+        bars.rebuild(["SPX"])
+        self.assertEqual(refreshed, _bar_rows("SPX"))
+
+    def test_read_bars_overlapping_range(self):
+        weeks = bars.read_bars("SPX", bars.WEEKLY, date(2024, 1, 3), date(2024, 1, 10))
+        self.assertEqual([w.start for w in weeks], [date(2024, 1, 1), date(2024, 1, 8)])
+
+    def test_pick_interval(self):
+        self.assertEqual(bars.pick_interval(date(2024, 1, 1), date(2024, 3, 1), 500), bars.DAILY)
+        self.assertEqual(bars.pick_interval(date(2010, 1, 1), date(2024, 1, 1), 500), bars.WEEKLY)
+        self.assertEqual(bars.pick_interval(date(1900, 1, 1), date(2024, 1, 1), 500), bars.MONTHLY)
+
+
+class LttbTests(SimpleTestCase):
+    xs = list(range(1000))
+    ys = [((i * 7919) % 211) - 100.0 for i in range(1000)]
+
+    def test_keeps_endpoints_and_count(self):
+        for threshold in (MIN_POINTS, 10, 99, 500, 999):
+            idx = lttb_indices(self.xs, self.ys, threshold)
+            self.assertEqual(len(idx), threshold)
+            self.assertEqual((idx[0], idx[-1]), (0, 999))
+            self.assertEqual(idx, sorted(set(idx)))
+
+    def test_keeps_the_spike(self):
+        ys = [0.0] * 1000
+        ys[437] = 50.0
+        self.assertIn(437, lttb_indices(self.xs, ys, 20))
+
+    def test_small_inputs_pass_through(self):
+        points = list(zip(self.xs[:50], self.ys[:50]))
+        self.assertEqual(lttb(points, 50), points)
+        self.assertEqual(lttb(points, None), points)
+        self.assertEqual(lttb_indices(self.xs[:50], self.ys[:50], 2), list(range(50)))
+
+    def test_parse_max_points(self):
+        self.assertIsNone(parse_max_points(None))
+        self.assertIsNone(parse_max_points("abc"))
+        self.assertIsNone(parse_max_points("0"))
+        self.assertEqual(parse_max_points("1"), MIN_POINTS)
+        self.assertEqual(parse_max_points("250"), 250)
+        self.assertEqual(parse_max_points(str(MAX_POINTS * 10)), MAX_POINTS)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        MarketPoint.objects.bulk_create(
+            MarketPoint(instrument="BTC", date=date(2024, 3, 1) + timedelta(days=i), value=60_000.0 + i)
+            for i in range(10)
+        )
+        packed.rebuild(["BTC"])
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_series_304_until_bumped(self):
+        url = "/api/markets/series/BTC/?days=5"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.json()["series"]), 5)
+        self.assertIn("public", first["Cache-Control"])
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        versions.bump(["ETH"])
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        versions.bump(["BTC"])
+        fresh = self.revalidate(url, first)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh["ETag"], first["ETag"])
+
+    def test_series_batch_304_until_bumped(self):
+        url = "/api/markets/series/?instruments=BTC,ETH&days=5"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        versions.bump(["ETH"])
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_errors_are_not_cacheable(self):
+        for url in ("/api/markets/series/BTC/?from=2024-03-05&to=2024-03-01", "/api/markets/series/?instruments="):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.has_header("ETag"))
+            self.assertIn("no-store", response["Cache-Control"])
+
+    def test_snapshot_304_until_latest_bumped(self):
+        as_of = datetime(2024, 3, 10, 16, 30, tzinfo=dt_timezone.utc)
+        MarketLatest.objects.create(instrument="BTC", category="Crypto", name="Bitcoin", price=1.0, as_of=as_of)
+        url = "/api/markets/snapshot/"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Last-Modified"], http_date(as_of.timestamp()))
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        versions.bump(["BTC"])
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        versions.bump(latest=True)
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    @mock.patch("markets.views.get_market_snapshot", return_value=[])
+    def test_snapshot_fallback_has_no_validators(self, _snapshot):
+        response = self.client.get("/api/markets/snapshot/")
+        self.assertEqual(response.json(), {"as_of": None, "rows": []})
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Last-Modified"))
+
+
+class PersistSeriesTests(TestCase):
+    def test_counts_and_storage(self):
+        d = date(2024, 5, 1)
+        first = services.persist_series({
+            "BTC": [(d, 1.0), (d + timedelta(days=1), 2.0)],
+            "ETH": [(d, 10.0)],
+            "SOL": [],
+        })
+        self.assertEqual(first, {"BTC": services.PersistStats(2, 0, 0), "ETH": services.PersistStats(1, 0, 0)})
+
+        # Duplicate dates keep the last value.
+        second = services.persist_series({
+            "BTC": [(d, 1.0), (d + timedelta(days=1), 2.5), (d + timedelta(days=2), 3.0), (d + timedelta(days=2), 3.5)],
+            "ETH": [(d, 10.0)],
+        })
+        self.assertEqual(second["BTC"], services.PersistStats(inserted=1, updated=1, unchanged=1))
+        self.assertEqual(second["ETH"], services.PersistStats(inserted=0, updated=0, unchanged=1))
+        self.assertEqual(second["BTC"].written, 2)
+
+        stored = list(MarketPoint.objects.filter(instrument="BTC").order_by("date").values_list("value", flat=True))
+        self.assertEqual(stored, [1.0, 2.5, 3.5])
+        # The packed copy and the bars follow the points.
+        self.assertEqual(list(packed.read_range("BTC").values), stored)
+        (week,) = bars.read_bars("BTC", bars.WEEKLY, d, d + timedelta(days=2))
+        self.assertEqual((week.open, week.high, week.close, week.count), (1.0, 3.5, 3.5, 3))
+
+    def test_empty_input(self):
+        self.assertEqual(services.persist_series({}), {})
+        self.assertEqual(services.persist_points("BTC", []), services.PersistStats())
+
+
+class LatestFromPointsTests(TestCase):
+    def latest(self, instrument):
+        return MarketLatest.objects.values("price", "change_pct", "as_of").get(instrument=instrument)
+
+    def test_matches_the_stored_points_path(self):
+        d = date(2024, 3, 1)
+        points = [(d + timedelta(days=2), None), (d + timedelta(days=1), 105.0), (d, 100.0)]
+        services.persist_points("SPX", points)
+        row = services.latest_from_points("SPX", "Indexes", "S&P 500", points)
+        self.assertEqual((row.price, row.change_pct), (105.0, 5.0))
+        services.persist_latest_rows([row])
+        in_memory = self.latest("SPX")
+
+        services.persist_latest_from_points("SPX", "Indexes", "S&P 500")
+        self.assertEqual(self.latest("SPX"), in_memory)
+
+    def test_single_point_uses_the_previous_stored_value(self):
+        d = date(2024, 3, 1)
+        services.persist_points("USDUZS", [(d - timedelta(days=3), 12_500.0), (d - timedelta(days=1), 12_600.0)])
+        prev = services.previous_values({"USDUZS": d, "EURUZS": d})
+        self.assertEqual(prev, {"USDUZS": 12_600.0})
+        row = services.latest_from_points("USDUZS", "FX", "USD/UZS", [(d, 12_663.0)], previous=prev["USDUZS"])
+        self.assertAlmostEqual(row.change_pct, 0.5)
+        self.assertIsNone(services.latest_from_points("EURUZS", "FX", "EUR/UZS", [(d, 13_500.0)]).change_pct)
+        self.assertIsNone(services.latest_from_points("EURUZS", "FX", "EUR/UZS", [(d, None)]))
+
+class ResilienceTests(SimpleTestCase):
+    def setUp(self):
+        # The file-backed shared cache is the backend whose locks need flock.
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        shared = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": cache_dir}
+        override = override_settings(CACHES={**TEST_CACHES, "shared": shared})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_try_lock(self):
+        self.assertTrue(resilience.try_lock("job", 30))
+        self.assertFalse(resilience.try_lock("job", 30))
+        self.assertTrue(resilience.try_lock("other", 30))
+        resilience.release_lock("job")
+        self.assertTrue(resilience.try_lock("job", 0.05))
+        time.sleep(0.1)
+        self.assertTrue(resilience.try_lock("job", 30))
+
+    def test_breaker_opens_probes_and_closes(self):
+        breaker = resilience.CircuitBreaker("upstream", failure_threshold=2, base_cooldown=60)
+
+        def boom():
+            raise OSError("down")
+
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                breaker.call(boom)
+        self.assertEqual(breaker.status(), "open")
+        with self.assertRaises(resilience.CircuitOpenError):
+            breaker.call(lambda: 1)
+
+        # Cooldown over: a single caller gets through as the probe.
+        breaker._save({**breaker._state(), "open_until": time.time() - 1})
+        probe = breaker.before_call()
+        self.assertTrue(probe)
+        with self.assertRaises(resilience.CircuitOpenError):
+            breaker.before_call()
+        # A call that started before the breaker opened doesn't free the probe.
+        breaker.record_failure()
+        self.assertFalse(resilience.try_lock(breaker._probe_key, 1))
+        breaker.record_failure(probe=probe)
+        self.assertGreater(breaker._state()["open_until"], time.time() + 100)
+
+        breaker._save({**breaker._state(), "open_until": time.time() - 1})
+        self.assertEqual(breaker.call(lambda: 1), 1)
+        self.assertEqual(breaker.status(), "closed")
+
+    def test_breaker_ignores_non_failures(self):
+        breaker = resilience.CircuitBreaker("upstream", failure_threshold=2, base_cooldown=60)
+
+        def down():
+            raise OSError("down")
+
+        def not_found():
+            raise httpclient.HttpError("https://example.com/", 404)
+
+        with self.assertRaises(OSError):
+            breaker.call(down)
+        with self.assertRaises(httpclient.HttpError):
+            breaker.call(not_found, is_failure=services._counts_as_upstream_failure)
+        self.assertEqual(breaker._state()["failures"], 1)
+
+        # In half-open the prober's 404 keeps the breaker as it was and frees the probe.
+        state = {"failures": 2, "open_until": time.time() - 1, "trips": 1}
+        breaker._save(state)
+        with self.assertRaises(httpclient.HttpError):
+            breaker.call(not_found, is_failure=services._counts_as_upstream_failure)
+        self.assertEqual(breaker._state(), state)
+        self.assertTrue(breaker.before_call())
+
+    def test_concurrent_failures_all_count(self):
+        breaker = resilience.CircuitBreaker("upstream", failure_threshold=1000)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda _: breaker.record_failure(), range(40)))
+        self.assertEqual(breaker._state()["failures"], 40)
+
+    def test_last_good_only_for_upstream_failures(self):
+        key = services._last_good_key("test")
+        self.assertEqual(services._guarded("example.com", lambda: [1], last_good_key=key), [1])
+
+        def failing(error):
+            def fetch():
+                raise error
+
+            return fetch
+
+        for error in (httpclient.HttpError("https://example.com/", 503), TimeoutError()):
+            self.assertEqual(services._guarded("example.com", failing(error), last_good_key=key), [1])
+        not_found = failing(httpclient.HttpError("https://example.com/", 404))
+        with self.assertRaises(httpclient.HttpError):
+            services._guarded("example.com", not_found, last_good_key=key)
+
+    def test_range_last_good_is_per_coin(self):
+        body = b'{"prices": [[1700000000000, 1.5]]}'
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        with mock.patch.object(
+            httpclient.client, "get", return_value=httpclient.HttpResponse(url="", status=200, body=body, headers={})
+        ) as get:
+            first = services.fetch_coingecko_chart_range("bitcoin", start, start + timedelta(days=30))
+        self.assertFalse(get.call_args.kwargs["conditional"])
+
+        # Another range while the upstream is down falls back to the coin's last good points.
+        with mock.patch.object(httpclient.client, "get", side_effect=TimeoutError()):
+            later = services.fetch_coingecko_chart_range("bitcoin", start, start + timedelta(days=31))
+            self.assertEqual(later, first)
+            with self.assertRaises(TimeoutError):
+                services.fetch_coingecko_chart_range("ethereum", start, start + timedelta(days=31))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CoalescingTests(SimpleTestCase):
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"v": 1}
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: caching.get_or_set_coalesced("k", compute, 60), range(8)))
+        self.assertEqual(results, [{"v": 1}] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_async_concurrent_misses_compute_once(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return 42
+
+        async def run():
+            return await asyncio.gather(*(caching.aget_or_set_coalesced("ak", compute, 60) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), [42] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_value_served_while_one_refresh_runs(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return len(calls)
+
+        get = caching.get_stale_while_revalidate
+        self.assertEqual(get("swr", compute, soft_ttl=0, hard_ttl=60), 1)
+        # Past the soft TTL: every caller gets the stale value, one refresh starts.
+        self.assertEqual([get("swr", compute, soft_ttl=0, hard_ttl=60) for _ in range(3)], [1, 1, 1])
+        deadline = time.monotonic() + 5
+        while cache.get("swr")["value"] == 1 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(cache.get("swr")["value"], 2)
+        self.assertEqual(len(calls), 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LiveTickerTests(SimpleTestCase):
+    def setUp(self):
+        resilience.shared_cache().clear()
+
+    def stream(self, last_event_id, count, publish=()):
+        """The first ``count`` events after the retry hint; ``publish`` goes out once subscribed."""
+
+        async def read():
+            events = live.event_stream(last_event_id)
+            try:
+                self.assertEqual(await events.__anext__(), f"retry: {live.RETRY_MS}\n\n".encode())
+                for event in publish:
+                    live.publish(*event)
+                return [await asyncio.wait_for(events.__anext__(), timeout=2) for _ in range(count)]
+            finally:
+                await events.aclose()
+
+        with mock.patch.object(live, "POLL_SECONDS", 0.01):
+            return asyncio.run(read())
+
+    def test_streams_published_events(self):
+        live.publish("ticker", {"n": 1})
+        self.assertEqual(
+            self.stream(None, 2, publish=[("ticker", {"n": 2}), ("ticker", {"n": 3})]),
+            [b'id: 2\nevent: ticker\ndata: {"n":2}\n\n', b'id: 3\nevent: ticker\ndata: {"n":3}\n\n'],
+        )
+
+    def test_replays_after_last_event_id(self):
+        for n in range(1, 4):
+            live.publish("ticker", {"n": n})
+        self.assertEqual(
+            self.stream(1, 2),
+            [b'id: 2\nevent: ticker\ndata: {"n":2}\n\n', b'id: 3\nevent: ticker\ndata: {"n":3}\n\n'],
+        )
+
+    def test_rotated_or_unknown_last_event_id_resets(self):
+        with mock.patch.object(live, "LOG_SIZE", 2):
+            for n in range(1, 6):
+                live.publish("ticker", {"n": n})
+        reset = b"event: reset\ndata: {}\n\n"
+        self.assertEqual(self.stream(1, 1), [reset])
+        self.assertEqual(self.stream(99, 1), [reset])
+
+    def test_full_buffer_is_replaced_by_reset(self):
+        sub = live.Subscriber()
+        for n in range(live.CLIENT_BUFFER + 1):
+            sub.offer((n, "ticker", "{}"))
+        self.assertEqual(sub.queue.qsize(), 1)
+        self.assertIs(sub.queue.get_nowait(), live.RESET)
+
+    def test_ticker_deltas(self):
+        btc = {"symbol": "BTC", "price": 1.0}
+        self.assertIsNone(live.publish_ticker([btc], None))
+        self.assertIsNone(live.publish_ticker([btc], None))
+        event_id = live.publish_ticker([{**btc, "price": 2.0}, {"symbol": "ETH", "price": 3.0}], None)
+        ((logged_id, event, payload),) = resilience.shared_cache().get(live.LOG_KEY)
+        self.assertEqual((logged_id, event), (event_id, "ticker"))
+        self.assertEqual(len(json.loads(payload)["items"]), 2)
+        self.assertEqual(live.ticker_delta([btc], []), {"items": [], "removed": ["BTC"]})
+
+    def test_stream_route_needs_async_views(self):
+        # MARKETS_ASYNC_VIEWS is off in tests: no route, and pages poll instead.
+        with self.assertRaises(Resolver404):
+            resolve("/api/markets/ticker/stream/")
+        self.assertEqual(live_ticker(None), {"markets_ticker_stream": False})
+
+
+class RunFetchJobsTests(SimpleTestCase):
+    def test_results_in_job_order_within_provider_caps(self):
+        lock = threading.Lock()
+        active = defaultdict(int)
+        peak = defaultdict(int)
+
+        def job(provider, n, error=None):
+            def fetch():
+                with lock:
+                    active[provider] += 1
+                    peak[provider] = max(peak[provider], active[provider])
+                time.sleep(0.02)
+                with lock:
+                    active[provider] -= 1
+                if error is not None:
+                    raise error
+                return [(f"{provider}-{n}", "Test", "Test", [])]
+
+            return update_markets.FetchJob(label=f"{provider}-{n}", provider=provider, fetch=fetch)
+
+        jobs = [job(Instrument.PROVIDER_STOOQ, n) for n in range(6)]
+        jobs += [job(Instrument.PROVIDER_COINGECKO, n) for n in range(3)]
+        jobs.append(job(Instrument.PROVIDER_ALTME, 0, error=OSError("down")))
+        results = update_markets.run_fetch_jobs(jobs, workers=4)
+
+        self.assertEqual([r.job for r in results], jobs)
+        self.assertEqual(dict(peak), {provider: update_markets.PROVIDER_CONCURRENCY[provider] for provider in peak})
+        self.assertEqual(peak[Instrument.PROVIDER_STOOQ], 2)
+        self.assertEqual([r.series[0][0] for r in results[:2]], ["stooq-0", "stooq-1"])
+        self.assertIsInstance(results[-1].error, OSError)
+        self.assertEqual(results[-1].series, [])
+
+
+def _catalog_entry(symbol, provider, refresh_interval=15 * 60):
+    return catalog.CatalogEntry(
+        symbol=symbol,
+        provider=provider,
+        provider_symbol=symbol.lower(),
+        category="Test",
+        name=symbol,
+        refresh_interval=refresh_interval,
+        enabled=True,
+        show_in_ticker=True,
+        preset="",
+        preset_label="",
+        preset_weight=1.0,
+    )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class WatermarkPlanningTests(TestCase):
+    now = datetime(2024, 3, 10, 12, tzinfo=dt_timezone.utc)
+
+    def watermark(self, symbol, provider, *, behind_days=1, full_hours_ago=1, updated_minutes_ago=60):
+        return IngestWatermark(
+            instrument=symbol,
+            source=provider,
+            last_date=self.now.date() - timedelta(days=behind_days),
+            last_full_at=self.now - timedelta(hours=full_hours_ago) if full_hours_ago is not None else None,
+            updated_at=self.now - timedelta(minutes=updated_minutes_ago),
+        )
+
+    def test_since(self):
+        stooq = Instrument.PROVIDER_STOOQ
+        marks = {("SPX", stooq): self.watermark("SPX", stooq, behind_days=3)}
+
+        def since(force_full=False):
+            return update_markets._since(marks, "SPX", stooq, now=self.now, force_full=force_full)
+
+        # Re-requests INCREMENTAL_OVERLAP_DAYS before the watermark.
+        self.assertEqual(since(), self.now.date() - timedelta(days=3 + update_markets.INCREMENTAL_OVERLAP_DAYS))
+        self.assertIsNone(since(force_full=True))
+        marks[("SPX", stooq)] = self.watermark("SPX", stooq, full_hours_ago=24)
+        self.assertIsNone(since())
+        marks[("SPX", stooq)] = self.watermark("SPX", stooq, full_hours_ago=None)
+        self.assertIsNone(since())
+        self.assertIsNone(update_markets._since({}, "SPX", stooq, now=self.now, force_full=False))
+
+    def test_build_jobs_modes(self):
+        stooq = Instrument.PROVIDER_STOOQ
+        instruments = [_catalog_entry(s, stooq) for s in ("NEW", "BEHIND", "CURRENT", "RECONCILE", "FRESH")]
+        marks = {
+            ("BEHIND", stooq): self.watermark("BEHIND", stooq, behind_days=5),
+            ("CURRENT", stooq): self.watermark("CURRENT", stooq),
+            ("RECONCILE", stooq): self.watermark("RECONCILE", stooq, full_hours_ago=30),
+            # Refreshed 5 minutes ago with a 15 minute interval: not due.
+            ("FRESH", stooq): self.watermark("FRESH", stooq, updated_minutes_ago=5),
+        }
+
+        def plan(**kwargs):
+            with mock.patch.object(update_markets, "datetime", wraps=datetime) as clock:
+                clock.now.return_value = self.now
+                return [(j.label, j.mode) for j in update_markets.build_jobs(instruments, marks, **kwargs)]
+
+        self.assertEqual(
+            plan(),
+            [("NEW", "full"), ("BEHIND", "incremental"), ("RECONCILE", "full"), ("stooq quotes x1", "batch")],
+        )
+        self.assertEqual(plan(force_full=True), [(i.symbol, "full") for i in instruments])
+
+    def test_advance(self):
+        stooq = Instrument.PROVIDER_STOOQ
+        prev = self.watermark("SPX", stooq, behind_days=1, full_hours_ago=5)
+        incremental = update_markets.FetchJob(label="SPX", provider=stooq, fetch=list, mode="incremental")
+        stale = [(self.now.date() - timedelta(days=4), 1.0)]
+        w = update_markets.Command._advance({("SPX", stooq): prev}, "SPX", incremental, stale, self.now)
+        # Never moves backwards, and only full fetches move last_full_at.
+        self.assertEqual((w.last_date, w.last_full_at, w.updated_at), (prev.last_date, prev.last_full_at, self.now))
+        full = update_markets.FetchJob(label="SPX", provider=stooq, fetch=list, mode="full")
+        w = update_markets.Command._advance({}, "SPX", full, [(self.now.date(), 1.0)], self.now)
+        self.assertEqual((w.last_date, w.last_full_at), (self.now.date(), self.now))
+
+    @mock.patch.object(update_markets, "fetch_fear_greed_altme", side_effect=OSError("down"))
+    def test_repair_latest_recomputes_from_stored_points(self, _fetch):
+        d = date(2024, 3, 1)
+        services.persist_points("SPX", [(d, 100.0), (d + timedelta(days=1), 110.0)])
+        MarketLatest.objects.create(instrument="SPX", category="Indexes", name="S&P 500", price=1.0)
+        before = versions.latest()[0]
+        call_command("update_markets", "--repair-latest", "--only", "altme", stdout=StringIO(), stderr=StringIO())
+        latest = MarketLatest.objects.get(instrument="SPX")
+        self.assertEqual((latest.price, latest.change_pct), (110.0, 10.0))
+        self.assertNotEqual(versions.latest()[0], before)
+
+
+class StooqQuotesTests(SimpleTestCase):
+    def test_parse_matches_rows_by_symbol(self):
+        text = (
+            "Symbol,Date,Time,Open,High,Low,Close,Volume\n"
+            "^SPX,2024-03-08,22:00:00,100,110,90,105,0\n"
+            "XAUUSD,2024-03-08,22:00:00,N/D,N/D,N/D,2000.5,N/D\n"
+            "NOPE.US,N/D,N/D,N/D,N/D,N/D,N/D,N/D\n"
+            "OTHER,2024-03-08,22:00:00,1,1,1,1,0\n"
+        )
+        quotes = services.parse_stooq_quotes_csv(text, ["^spx", "xauusd", "nope.us"])
+        self.assertEqual(quotes["^spx"], {"price": 105.0, "change_pct": 5.0, "date": date(2024, 3, 8)})
+        self.assertEqual(quotes["xauusd"], {"price": 2000.5, "change_pct": None, "date": date(2024, 3, 8)})
+        self.assertEqual(set(quotes), {"^spx", "xauusd"})
+
+    def test_parse_without_symbol_column_goes_by_position(self):
+        quotes = services.parse_stooq_quotes_csv("Date,Close\n2024-03-08,1.5\n2024-03-08,2.5\n", ["a", "b", "c"])
+        self.assertEqual({s: q["price"] for s, q in quotes.items()}, {"a": 1.5, "b": 2.5})
+        self.assertEqual(services.parse_stooq_quotes_csv("Date,Open\n2024-03-08,1\n", ["a"]), {})
+        self.assertEqual(services.parse_stooq_quotes_csv("", ["a"]), {})
+
+    def test_fetch_batches_symbols(self):
+        urls = []
+
+        def get_text(url, **kwargs):
+            urls.append(url)
+            symbols = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)["s"][0].split(" ")
+            if "fail" in symbols:
+                raise OSError("down")
+            return "Symbol,Close\n" + "".join(f"{sym},1\n" for sym in symbols)
+
+        with mock.patch.object(services, "_http_get_text", side_effect=get_text):
+            quotes = services.fetch_stooq_quotes(["a", "b", "a", " ", "c", "fail", "d"], batch_size=2)
+        # Duplicates and blanks dropped; one request per batch ([a, b], [c, fail], [d]);
+        # a failed batch is skipped and the others still count.
+        self.assertEqual(len(urls), 3)
+        self.assertEqual(set(quotes), {"a", "b", "d"})
+
+
+class SchedulerTests(SimpleTestCase):
+    def test_effective_schedule(self):
+        stooq, coingecko = Instrument.PROVIDER_STOOQ, Instrument.PROVIDER_COINGECKO
+        by_provider = {
+            stooq: [_catalog_entry("SPX", stooq, 900), _catalog_entry("NDX", stooq, 600)],
+            coingecko: [_catalog_entry("BTC", coingecko, 5)],
+        }
+        with mock.patch.object(catalog, "instruments_by_provider", return_value=by_provider):
+            schedule = run_scheduler.effective_schedule()
+        self.assertEqual(
+            schedule,
+            [run_scheduler.Source(coingecko, run_scheduler.MIN_INTERVAL_SECONDS), run_scheduler.Source(stooq, 600)],
+        )
+
+    def test_runs_due_sources_and_skips_busy_ones(self):
+        clock = [0.0]
+        runs = []
+        release = threading.Event()
+
+        class Stop:
+            # Stands in for the loop's threading.Event: waiting advances the clock.
+            passes = 0
+
+            def is_set(self):
+                return self.passes >= 3
+
+            def set(self):
+                self.passes = 3
+
+            def wait(self, timeout):
+                clock[0] += timeout
+                self.passes += 1
+                if self.is_set():
+                    release.set()
+
+        def run_source(_command, provider):
+            runs.append(provider)
+            if provider == "stooq":
+                # Still running when its next two slots come up.
+                release.wait(5)
+
+        sources = [run_scheduler.Source("stooq", 30), run_scheduler.Source("coingecko", 60)]
+        stderr = StringIO()
+        with mock.patch.multiple(
+            run_scheduler,
+            effective_schedule=mock.Mock(return_value=sources),
+            _jitter=mock.Mock(return_value=0),
+            time=mock.Mock(monotonic=lambda: clock[0]),
+            threading=mock.Mock(Event=Stop),
+            close_old_connections=mock.Mock(),
+        ), mock.patch.object(run_scheduler.Command, "_run_source", run_source):
+            call_command("run_scheduler", stdout=StringIO(), stderr=stderr)
+
+        # Passes at t=0, 30 and 60: coingecko (every 60s) runs twice, stooq once
+        # and its slots at 30 and 60 are skipped while that run is in flight.
+        self.assertEqual(sorted(runs), ["coingecko", "coingecko", "stooq"])
+        self.assertEqual(stderr.getvalue().count("stooq still running"), 2)
+        self.assertEqual(clock[0], 90.0)
+
+    def test_once_runs_every_source(self):
+        runs = []
+        sources = [run_scheduler.Source("stooq", 30), run_scheduler.Source("altme", 3600)]
+        with mock.patch.object(run_scheduler, "effective_schedule", return_value=sources), mock.patch.object(
+            run_scheduler.Command, "_run_source", lambda _command, provider: runs.append(provider)
+        ):
+            call_command("run_scheduler", "--once", stdout=StringIO())
+        self.assertEqual(sorted(runs), ["altme", "stooq"])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_save_and_delete_invalidate_the_cache(self):
+        symbols = {i.symbol for i in catalog.all_instruments()}
+        with self.assertNumQueries(0):
+            catalog.all_instruments()
+        before = versions.latest()[0]
+
+        inst = Instrument.objects.create(
+            symbol="TEST", provider=Instrument.PROVIDER_STOOQ, provider_symbol="test.us", category="Test", name="Test"
+        )
+        self.assertEqual({i.symbol for i in catalog.all_instruments()}, symbols | {"TEST"})
+        self.assertIn("TEST", catalog.ticker_symbols())
+        self.assertNotEqual(versions.latest()[0], before)
+
+        inst.show_in_ticker = False
+        inst.save()
+        self.assertNotIn("TEST", catalog.ticker_symbols())
+        inst.delete()
+        self.assertEqual({i.symbol for i in catalog.all_instruments()}, symbols)
+
+    def test_caught_up_instruments_share_quote_requests(self):
+        stooq = Instrument.PROVIDER_STOOQ
+        now = datetime.now(dt_timezone.utc)
+        instruments = [_catalog_entry(f"S{n}", stooq) for n in range(services.STOOQ_QUOTE_BATCH_SIZE + 5)]
+        marks = {
+            (i.symbol, stooq): IngestWatermark(
+                instrument=i.symbol,
+                source=stooq,
+                last_date=now.date(),
+                last_full_at=now - timedelta(hours=1),
+                updated_at=now - timedelta(hours=1),
+            )
+            for i in instruments
+        }
+        jobs = update_markets.build_jobs(instruments, marks)
+        batch = services.STOOQ_QUOTE_BATCH_SIZE
+        self.assertEqual([j.label for j in jobs], [f"stooq quotes x{batch}", "stooq quotes x5"])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CryptoChartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        today = datetime.now(dt_timezone.utc).date()
+        MarketPoint.objects.bulk_create(
+            MarketPoint(instrument="BTC", date=today - timedelta(days=i), value=60_000.0 + i) for i in range(60)
+        )
+        packed.rebuild(["BTC"])
+        now_ms = int(time.time() * 1000)
+        # Hourly points (on the half hour) over the last 8 days, as for a 7 day bucket.
+        self.upstream = [(now_ms - h * 3_600_000 - 1_800_000, 1.0 + h) for h in range(8 * 24, -1, -1)]
+
+    def test_long_ranges_come_from_stored_points(self):
+        with mock.patch.object(services, "fetch_coingecko_chart") as fetch:
+            points, source = services.get_crypto_chart("bitcoin", 45)
+        fetch.assert_not_called()
+        self.assertEqual(source, "db")
+        self.assertEqual(len(points), 46)
+
+    def test_short_or_uncovered_ranges_go_upstream_once_per_bucket(self):
+        with mock.patch.object(services, "fetch_coingecko_chart", return_value=self.upstream) as fetch:
+            points, source = services.get_crypto_chart("bitcoin", 2)
+            self.assertEqual(source, "coingecko")
+            self.assertEqual(len(points), 2 * 24)
+            # 5 days falls in the same 7 day bucket: no second request.
+            self.assertEqual(len(services.get_crypto_chart("bitcoin", 5)[0]), 5 * 24)
+            fetch.assert_called_once_with(coin_id="bitcoin", days=7)
+
+            # ETH has no stored points, so even a long range is fetched.
+            _points, source = services.get_crypto_chart("ethereum", 90)
+            self.assertEqual(source, "coingecko")
+            fetch.assert_called_with(coin_id="ethereum", days=90)
+        self.assertIsNone(services.get_crypto_chart("not-a-coin", 30))
+
+    def test_async_routes_the_same_way(self):
+        afetch = mock.AsyncMock(return_value=self.upstream)
+        with mock.patch.object(services, "afetch_coingecko_chart", afetch):
+            self.assertEqual(async_to_sync(services.aget_crypto_chart)("bitcoin", 45)[1], "db")
+            self.assertEqual(async_to_sync(services.aget_crypto_chart)("bitcoin", 2)[1], "coingecko")
+        afetch.assert_awaited_once_with(coin_id="bitcoin", days=7)
+
+    def test_view_errors(self):
+        self.assertEqual(self.client.get("/api/markets/crypto/not-a-coin/").status_code, 404)
+        with mock.patch.object(services, "fetch_coingecko_chart", side_effect=TimeoutError()):
+            self.assertEqual(self.client.get("/api/markets/crypto/bitcoin/?days=2").status_code, 503)
+
+
+@override_settings(CACHES={**TEST_CACHES, "tiered-l2": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["tiered-l2"].clear()
+        self.clock = [1000.0]
+        clock = mock.patch.object(
+            cache_backends, "time", SimpleNamespace(monotonic=lambda: self.clock[0], time_ns=time.time_ns)
+        )
+        clock.start()
+        self.addCleanup(clock.stop)
+        # Two processes' caches over one L2.
+        self.a, self.b = (TieredCache("tiered-l2", {"OPTIONS": {"L1_TTL": 5}}) for _ in range(2))
+
+    def test_other_writes_seen_after_l1_ttl(self):
+        self.a.set("k", "one")
+        self.assertEqual(self.b.get("k"), "one")
+        self.a.set("k", "two")
+        self.assertEqual(self.b.get("k"), "one")
+        self.clock[0] += 6
+        self.assertEqual(self.b.get("k"), "two")
+
+        self.a.delete("k")
+        self.assertEqual(self.b.get("k"), "two")
+        self.clock[0] += 6
+        self.assertIsNone(self.b.get("k"))
+
+    def test_unchanged_value_revalidated_from_the_version_key(self):
+        self.a.set("k", list(range(1000)))
+        self.assertEqual(len(self.b.get("k")), 1000)
+        self.clock[0] += 6
+        with mock.patch.object(caches["tiered-l2"], "get", wraps=caches["tiered-l2"].get) as l2_get:
+            self.assertEqual(len(self.b.get("k")), 1000)
+            self.assertEqual(len(self.b.get("k")), 1000)
+        self.assertEqual([c.args[0] for c in l2_get.call_args_list], ["k:l2ver"])
+
+    def test_touch_extends_l2_but_not_l1(self):
+        self.a.set("k", "v", timeout=1)
+        self.a.touch("k", timeout=100)
+        # The L1 entry still rechecks after the original timeout...
+        self.assertEqual(self.a._l1_get(self.a.make_key("k"))[0], 1001.0)
+        # ...and finds both L2 keys alive past it.
+        time.sleep(1.1)
+        self.clock[0] += 2
+        self.assertEqual(self.a.get("k"), "v")
+        self.assertEqual(self.b.get("k"), "v")
+
+
+class RenderLatestTests(TestCase):
+    as_of = datetime(2024, 3, 10, 16, 30, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        cache.clear()
+        resilience.shared_cache().clear()
+        MarketLatest.objects.create(instrument="BTC", category="Crypto", name="Bitcoin", price=1.0, as_of=self.as_of)
+        MarketLatest.objects.create(
+            instrument="ETH", category="Crypto", name="Ethereum", as_of=self.as_of - timedelta(hours=1)
+        )
+        # Not in the catalog's ticker, so left out of both payloads.
+        MarketLatest.objects.create(instrument="ZZZ", category="Other", name="Unlisted", price=3.0)
+
+    def body(self, name):
+        return json.loads(payloads.get(name))
+
+    def test_serves_rendered_bodies_without_queries(self):
+        payloads.render_latest()
+        with self.assertNumQueries(0):
+            ticker, snapshot = self.body(payloads.TICKER), self.body(payloads.SNAPSHOT)
+            validators = payloads.validators(payloads.TICKER)
+        self.assertEqual([i["symbol"] for i in ticker["items"]], ["BTC"])
+        self.assertEqual([r["symbol"] for r in snapshot["rows"]], ["BTC", "ETH"])
+        self.assertEqual(validators, (versions.latest()[0], self.as_of))
+
+    def test_rebuilds_after_latest_bump(self):
+        payloads.render_latest()
+        MarketLatest.objects.filter(instrument="BTC").update(price=2.0)
+        self.assertEqual(self.body(payloads.TICKER)["items"][0]["price"], 1.0)
+        versions.bump(latest=True)
+        self.assertEqual(self.body(payloads.TICKER)["items"][0]["price"], 2.0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.body(payloads.TICKER)["items"][0]["price"], 2.0)
+
+    def test_publishes_ticker_delta(self):
+        payloads.render_latest()
+        self.assertIsNone(resilience.shared_cache().get(live.LOG_KEY))
+        MarketLatest.objects.filter(instrument="ETH").update(price=3000.0)
+        payloads.render_latest()
+        ((_, event, data),) = resilience.shared_cache().get(live.LOG_KEY)
+        self.assertEqual(event, "ticker")
+        self.assertEqual(
+            json.loads(data),
+            {
+                "as_of": self.as_of.isoformat(),
+                "items": [
+                    {"category": "Crypto", "name": "Ethereum", "symbol": "ETH", "price": 3000.0, "change_pct": None}
+                ],
+                "removed": [],
+            },
+        )
+
+    def test_nothing_persisted(self):
+        MarketLatest.objects.all().delete()
+        payloads.render_latest()
+        self.assertIsNone(payloads.get(payloads.TICKER))
+        self.assertIsNone(payloads.validators(payloads.SNAPSHOT))
+
+
+class SeriesViewTests(TestCase):
+    first = date(2024, 1, 1)  # a Monday
+
+    def setUp(self):
+        cache.clear()
+        services.persist_series({
+            "BTC": [(self.first + timedelta(days=i), 100.0 + i) for i in range(91)],
+            "ETH": [(date(2024, 3, 27) + timedelta(days=i), 10.0 + i) for i in range(5)],
+        })
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_batch_is_columnar_per_instrument(self):
+        body = self.get("/api/markets/series/?instruments=ETH,BTC,,NOPE,BTC&days=3")
+        self.assertEqual(body["instruments"], ["BTC", "ETH", "NOPE"])
+        self.assertEqual(body["series"]["BTC"]["p"], [188.0, 189.0, 190.0])
+        self.assertEqual(body["series"]["ETH"]["p"], [12.0, 13.0, 14.0])
+        self.assertEqual(body["series"]["NOPE"], {"t": [], "p": []})
+        march_29 = int(datetime(2024, 3, 29, tzinfo=dt_timezone.utc).timestamp() * 1000)
+        self.assertEqual(body["series"]["BTC"]["t"][0], march_29)
+
+        # The async view builds the same payload.
+        request = RequestFactory().get("/api/markets/series/", {"instruments": "ETH,BTC,NOPE", "days": "3"})
+        self.assertEqual(json.loads(async_to_sync(views.series_batch_async)(request).content), body)
+
+    def test_batch_rejects_missing_or_too_many_instruments(self):
+        names = ",".join(f"I{n}" for n in range(views.SERIES_BATCH_MAX_INSTRUMENTS + 1))
+        for query in ("", "instruments=,,", f"instruments={names}"):
+            self.assertEqual(self.client.get(f"/api/markets/series/?{query}").status_code, 400)
+
+    def test_range_intervals(self):
+        url = "/api/markets/series/BTC/?from=2024-01-01&to=2024-03-31"
+        monthly = self.get(url + "&interval=1mo")
+        self.assertEqual(monthly["interval"], bars.MONTHLY)
+        self.assertEqual(
+            [(p["o"], p["h"], p["l"], p["p"]) for p in monthly["series"]],
+            [(100.0, 130.0, 100.0, 130.0), (131.0, 159.0, 131.0, 159.0), (160.0, 190.0, 160.0, 190.0)],
+        )
+        weekly = self.get(url + "&interval=1w")
+        self.assertEqual(len(weekly["series"]), 13)
+        self.assertEqual(weekly["series"][0]["p"], 106.0)
+
+        # auto picks the coarsest interval still giving the point budget.
+        self.assertEqual(self.get(url)["interval"], bars.DAILY)
+        self.assertEqual(len(self.get(url)["series"]), 91)
+        auto = self.get(url + "&max_points=10")
+        self.assertEqual((auto["interval"], len(auto["series"])), (bars.WEEKLY, 10))
+        wider = self.get("/api/markets/series/BTC/?from=2024-01-01&to=2024-04-15&max_points=3")
+        self.assertEqual((wider["interval"], len(wider["series"])), (bars.MONTHLY, 3))
+
+        self.assertEqual(self.client.get(url + "&interval=1h").status_code, 400)
@@ -0,0 +1,249 @@
+"""Compact intraday tick store (the ``high_frequency`` plan feature).
+
+Ticks are kept per instrument in TickChunk rows of up to ``CHUNK_POINTS``
+points. A chunk holds millisecond timestamps plus one or more value columns
+(price for raw ticks; open/high/low/close for rollup bars), each stored as
+int64 deltas (values fixed-point at ``SCALE_DIGITS`` decimals) and
+zlib-compressed as one blob. Decoding goes straight into ``array`` columns.
+
+Writes are append-only: points at or before the instrument's last stored
+tick are dropped, and a partly filled tail chunk is rewritten in place until
+it is full. Every append refreshes the 1m/5m/1h rollups from the first
+affected bucket onwards.
+"""
+
+from __future__ import annotations
+
+import math
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from itertools import accumulate, chain
+from operator import sub
+from typing import Iterable, Sequence
+
+from django.db import transaction
+
+from .models import TickChunk
+
+RESOLUTION_TICK = "tick"
+# Rollup bar sizes in milliseconds.
+ROLLUPS: dict[str, int] = {
+    "1m": 60_000,
+    "5m": 5 * 60_000,
+    "1h": 60 * 60_000,
+}
+RESOLUTIONS = (RESOLUTION_TICK, *ROLLUPS)
+
+CHUNK_POINTS = 4096
+SCALE_DIGITS = 8
+ZLIB_LEVEL = 6
+
+# version, column count, scale digits, point count
+_HEADER = struct.Struct("<BBBI")
+_VERSION = 1
+_SWAP = sys.byteorder != "little"
+
+
+@dataclass(frozen=True)
+class TickRange:
+    ts: array  # int64 ms since epoch, ascending
+    columns: tuple[array, ...]  # float64; (price,) for ticks, (open, high, low, close) for bars
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+
+def _deltas(values: Sequence[int]) -> array:
+    return array("q", map(sub, values, chain((0,), values)))
+
+
+def _to_bytes(a: array) -> bytes:
+    if _SWAP:
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_bytes(buf: bytes) -> array:
+    a = array("q")
+    a.frombytes(buf)
+    if _SWAP:
+        a.byteswap()
+    return a
+
+
+def encode_chunk(ts: Sequence[int], columns: Sequence[Sequence[float]], *, digits: int = SCALE_DIGITS) -> bytes:
+    n = len(ts)
+    scale = 10**digits
+    parts = [_to_bytes(_deltas(ts))]
+    for col in columns:
+        if len(col) != n:
+            raise ValueError("column length does not match timestamps")
+        parts.append(_to_bytes(_deltas([round(v * scale) for v in col])))
+    return _HEADER.pack(_VERSION, len(columns), digits, n) + zlib.compress(b"".join(parts), ZLIB_LEVEL)
+
+
+def decode_chunk(data: bytes) -> tuple[array, tuple[array, ...]]:
+    version, ncols, digits, n = _HEADER.unpack_from(data)
+    if version != _VERSION:
+        raise ValueError(f"unsupported tick chunk version {version}")
+    body = zlib.decompress(memoryview(data)[_HEADER.size :])
+    width = n * 8
+    ts = array("q", accumulate(_from_bytes(body[:width])))
+    scale = float(10**digits)
+    columns = tuple(
+        array("d", map(scale.__rtruediv__, accumulate(_from_bytes(body[width * (c + 1) : width * (c + 2)]))))
+        for c in range(ncols)
+    )
+    return ts, columns
+
+
+def slice_range(ts: array, columns: Sequence[array], start_ms: int, end_ms: int) -> tuple[array, tuple[array, ...]]:
+    """Points with ``start_ms <= ts <= end_ms``."""
+
+    lo, hi = bisect_left(ts, start_ms), bisect_right(ts, end_ms)
+    if lo == 0 and hi == len(ts):
+        return ts, tuple(columns)
+    return ts[lo:hi], tuple(c[lo:hi] for c in columns)
+
+
+def read_range(instrument: str, start_ms: int, end_ms: int, *, resolution: str = RESOLUTION_TICK) -> TickRange:
+    """Ticks (or rollup bars) for ``instrument`` with ``start_ms <= ts <= end_ms``."""
+
+    ncols = 1 if resolution == RESOLUTION_TICK else 4
+    ts = array("q")
+    columns = tuple(array("d") for _ in range(ncols))
+    chunks = (
+        TickChunk.objects.filter(
+            instrument=instrument, resolution=resolution, end_ts__gte=start_ms, start_ts__lte=end_ms
+        )
+        .order_by("start_ts")
+        .values_list("data", flat=True)
+    )
+    for data in chunks:
+        cts, ccols = slice_range(*decode_chunk(bytes(data)), start_ms, end_ms)
+        ts.extend(cts)
+        for dst, src in zip(columns, ccols):
+            dst.extend(src)
+    return TickRange(ts=ts, columns=columns)
+
+
+def last_tick_ts(instrument: str, resolution: str = RESOLUTION_TICK) -> int | None:
+    return (
+        TickChunk.objects.filter(instrument=instrument, resolution=resolution)
+        .order_by("-end_ts")
+        .values_list("end_ts", flat=True)
+        .first()
+    )
+
+
+def _write(
+    instrument: str,
+    resolution: str,
+    ts: Sequence[int],
+    columns: Sequence[Sequence[float]],
+    *,
+    replace_from: int | None = None,
+) -> int:
+    """Append points to a stream, optionally replacing the stored tail from ``replace_from``.
+
+    Must run inside a transaction. Returns the number of points written.
+    """
+
+    tail = (
+        TickChunk.objects.select_for_update()
+        .filter(instrument=instrument, resolution=resolution)
+        .order_by("-start_ts")
+        .first()
+    )
+    head_ts: list[int] = []
+    head_cols: list[list[float]] = [[] for _ in columns]
+    if tail is not None:
+        if replace_from is None:
+            keep = bisect_right(ts, tail.end_ts)
+            ts, columns = ts[keep:], [c[keep:] for c in columns]
+        if tail.count < CHUNK_POINTS or (replace_from is not None and replace_from <= tail.end_ts):
+            tts, tcols = decode_chunk(bytes(tail.data))
+            cut = len(tts) if replace_from is None else bisect_left(tts, replace_from)
+            head_ts = list(tts[:cut])
+            head_cols = [list(c[:cut]) for c in tcols]
+        else:
+            tail = None
+    if not ts:
+        return 0
+
+    all_ts = head_ts + list(ts)
+    all_cols = [h + list(c) for h, c in zip(head_cols, columns)]
+    new_rows = []
+    for i in range(0, len(all_ts), CHUNK_POINTS):
+        part_ts = all_ts[i : i + CHUNK_POINTS]
+        data = encode_chunk(part_ts, [c[i : i + CHUNK_POINTS] for c in all_cols])
+        if i == 0 and tail is not None:
+            tail.start_ts, tail.end_ts, tail.count, tail.data = part_ts[0], part_ts[-1], len(part_ts), data
+            tail.save(update_fields=["start_ts", "end_ts", "count", "data"])
+        else:
+            new_rows.append(
+                TickChunk(
+                    instrument=instrument,
+                    resolution=resolution,
+                    start_ts=part_ts[0],
+                    end_ts=part_ts[-1],
+                    count=len(part_ts),
+                    data=data,
+                )
+            )
+    TickChunk.objects.bulk_create(new_rows)
+    return len(ts)
+
+
+def rollup(ts: Sequence[int], prices: Sequence[float], bar_ms: int) -> tuple[list[int], list[list[float]]]:
+    """OHLC bars keyed by bucket start."""
+
+    bars_ts: list[int] = []
+    o: list[float] = []
+    h: list[float] = []
+    lo: list[float] = []
+    c: list[float] = []
+    for t, p in zip(ts, prices):
+        bucket = t - t % bar_ms
+        if bars_ts and bars_ts[-1] == bucket:
+            if p > h[-1]:
+                h[-1] = p
+            if p < lo[-1]:
+                lo[-1] = p
+            c[-1] = p
+        else:
+            bars_ts.append(bucket)
+            o.append(p)
+            h.append(p)
+            lo.append(p)
+            c.append(p)
+    return bars_ts, [o, h, lo, c]
+
+
+def append_ticks(instrument: str, ticks: Iterable[tuple[int, float]]) -> int:
+    """Append ``(ts_ms, price)`` ticks and refresh rollups; returns ticks written.
+
+    Ticks at or before the last stored tick (and non-finite prices) are
+    dropped, so re-sending an overlapping batch is harmless.
+    """
+
+    points = sorted({int(t): float(p) for t, p in ticks if p is not None and math.isfinite(p)}.items())
+    if not points:
+        return 0
+    with transaction.atomic():
+        written = _write(instrument, RESOLUTION_TICK, [t for t, _p in points], [[p for _t, p in points]])
+        if not written:
+            return 0
+        first_new = points[-written][0]
+        last = points[-1][0]
+        for resolution, bar_ms in ROLLUPS.items():
+            bucket = first_new - first_new % bar_ms
+            recent = read_range(instrument, bucket, last)
+            bars_ts, bars = rollup(recent.ts, recent.columns[0], bar_ms)
+            _write(instrument, resolution, bars_ts, bars, replace_from=bucket)
+    return written
@@ -1,12 +1,39 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
 app_name = "markets"
 
+# Async variants for ASGI deployments; the sync ones remain for WSGI.
+if settings.MARKETS_ASYNC_VIEWS:
+    snapshot, ticker, series, series_batch, crypto_chart = (
+        views.snapshot_async,
+        views.ticker_async,
+        views.series_async,
+        views.series_batch_async,
+        views.crypto_chart_async,
+    )
+else:
+    snapshot, ticker, series, series_batch, crypto_chart = (
+        views.snapshot,
+        views.ticker,
+        views.series,
+        views.series_batch,
+        views.crypto_chart,
+    )
+
 urlpatterns = [
-    path("api/markets/snapshot/", views.snapshot, name="snapshot"),
-    path("api/markets/ticker/", views.ticker, name="ticker"),
-    path("api/markets/series/<str:instrument>/", views.series, name="series"),
-    path("api/markets/crypto/<str:coin_id>/", views.crypto_chart, name="crypto_chart"),
+    path("api/markets/snapshot/", snapshot, name="snapshot"),
+    path("api/markets/ticker/", ticker, name="ticker"),
+    path("api/markets/series/", series_batch, name="series_batch"),
+    path("api/markets/series/<str:instrument>/", series, name="series"),
+    path("api/markets/ticks/<str:instrument>/", views.ticks, name="ticks"),
+    path("api/markets/cache-stats/", views.cache_stats, name="cache_stats"),
+    path("api/markets/crypto/<str:coin_id>/", crypto_chart, name="crypto_chart"),
 ]
+
+if settings.MARKETS_ASYNC_VIEWS:
+    # SSE only under ASGI: with WSGI each open stream would pin a worker.
+    # static/app.js polls the ticker instead (see markets.context_processors).
+    urlpatterns.append(path("api/markets/ticker/stream/", views.ticker_stream, name="ticker_stream"))
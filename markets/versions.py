@@ -0,0 +1,96 @@
+"""Data version tokens for conditional GETs on the market APIs.
+
+Ingest bumps the version of every instrument whose stored points changed, and
+of ``LATEST`` (ticker/snapshot) when any did. Views derive ETags from these
+tokens and series Last-Modified from the bump time (ticker/snapshot use their
+rows' as_of, see markets.payloads), so an unchanged poll is answered from
+cache reads without touching the ORM.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from datetime import datetime, timezone
+from typing import Iterable
+
+from django.core.cache import cache
+
+# Each version is its own cache entry, so processes bumping different names
+# never overwrite each other: ``add`` creates one, ``set`` bumps it.
+KEY_PREFIX = "markets:v1:data_version:"
+LATEST = "latest"
+
+
+def _token() -> str:
+    return f"{time.time_ns():x}"
+
+
+def _key(name: str) -> str:
+    # Names carry instrument ids straight from URLs; hash them into safe keys.
+    return KEY_PREFIX + hashlib.sha1(name.encode("utf-8")).hexdigest()
+
+
+def _series_name(instrument: str) -> str:
+    return f"series:{instrument}"
+
+
+def _as_version(entry: tuple[str, float]) -> tuple[str, datetime]:
+    return entry[0], datetime.fromtimestamp(entry[1], tz=timezone.utc)
+
+
+def _entry(name: str) -> tuple[str, float]:
+    entry = cache.get(_key(name))
+    if entry is None:
+        entry = (_token(), time.time())
+        if not cache.add(_key(name), entry, timeout=None):
+            # Another process created it first; use theirs.
+            entry = cache.get(_key(name)) or entry
+    return entry
+
+
+def get(name: str) -> tuple[str, datetime]:
+    """``(token, modified_at)`` for a version name, creating one if unknown.
+
+    A token created on first read (e.g. after the cache was cleared) is safe:
+    any later data change bumps it.
+    """
+
+    return _as_version(_entry(name))
+
+
+def latest() -> tuple[str, datetime]:
+    return get(LATEST)
+
+
+def series(instrument: str) -> tuple[str, datetime]:
+    # Instruments that were never bumped share one base token, so arbitrary
+    # instrument names in URLs don't create version entries.
+    entry = cache.get(_key(_series_name(instrument)))
+    if entry is None:
+        return get(_series_name("*"))
+    return _as_version(entry)
+
+
+def series_batch(instruments: Iterable[str]) -> tuple[str, datetime]:
+    """Combined ``series`` version of several instruments, from one ``get_many``.
+
+    The token changes whenever any of them is bumped.
+    """
+
+    keys = [_key(_series_name(i)) for i in instruments]
+    found = cache.get_many(keys + [_key(_series_name("*"))])
+    base = found.get(_key(_series_name("*"))) or _entry(_series_name("*"))
+    entries = [found.get(k, base) for k in keys]
+    token = hashlib.sha1(",".join(e[0] for e in entries).encode("ascii")).hexdigest()[:16]
+    return token, datetime.fromtimestamp(max((e[1] for e in entries), default=base[1]), tz=timezone.utc)
+
+
+def bump(instruments: Iterable[str] = (), *, latest: bool = False) -> None:
+    names = [_series_name(i) for i in instruments]
+    if latest:
+        names.append(LATEST)
+    if not names:
+        return
+    entry = (_token(), time.time())
+    cache.set_many({_key(name): entry for name in names}, timeout=None)
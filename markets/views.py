@@ -1,89 +1,294 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import asyncio
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from functools import wraps
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
 
-from .models import MarketLatest, MarketPoint
-from .services import fetch_coingecko_chart, get_fx_rates_to_uzs, get_market_snapshot
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
+from billing.decorators import require_feature
+from billing.features import FEATURE_HIGH_FREQUENCY
 
-def snapshot(request):
-	latest = list(MarketLatest.objects.all().order_by("category", "name"))
-	if latest:
-		rows = latest
-		as_of = latest[0].as_of.isoformat() if latest and latest[0].as_of else None
-		return JsonResponse(
+from . import bars, live, packed, payloads, versions
+from . import ticks as tick_store
+from .caching import cache_stats as swr_cache_stats
+from .downsample import lttb, lttb_indices, parse_max_points
+from .services import aget_crypto_chart, get_crypto_chart, get_fx_rates_to_uzs, get_market_snapshot
+
+
+# Polled endpoints: browsers/Caddy may reuse a response briefly, then revalidate
+# with If-None-Match, which is answered with a 304 from the version cache.
+POLL_CACHE_CONTROL = {"public": True, "max_age": 60, "stale_while_revalidate": 300}
+
+
+# Ticker/snapshot validators come from the rendered payload: the ``latest``
+# version token and the newest as_of of its rows. The on-demand fallback
+# (nothing persisted yet) changes without a version bump, so it gets none.
+def _latest_etag(name: str):
+	def etag(request, *args, **kwargs) -> str | None:
+		found = payloads.validators(name)
+		return f'"{found[0]}"' if found else None
+
+	return etag
+
+
+def _latest_modified(name: str):
+	def modified(request, *args, **kwargs) -> datetime | None:
+		found = payloads.validators(name)
+		return found[1] if found else None
+
+	return modified
+
+
+def _series_params(request) -> tuple[int, int | None]:
+	try:
+		days = int(request.GET.get("days", "30"))
+	except ValueError:
+		days = 30
+	return max(1, min(days, 365)), parse_max_points(request.GET.get("max_points"))
+
+
+# from/to queries pick their interval for this many points unless max_points is given.
+SERIES_RANGE_POINTS = 500
+SERIES_INTERVALS = ("auto", bars.DAILY, *bars.BAR_INTERVALS)
+
+
+@dataclass(frozen=True)
+class SeriesRange:
+	start: date
+	end: date
+	interval: str  # resolved: never "auto"
+	max_points: int | None
+
+	def key(self) -> str:
+		return f"{self.start.isoformat()}:{self.end.isoformat()}:{self.interval}:{self.max_points or 0}"
+
+
+def _series_range(request) -> SeriesRange | None:
+	"""``from``/``to``/``interval`` params, or None without ``from`` (``days`` applies).
+
+	Raises ValueError for malformed dates, an unknown interval or from > to.
+	"""
+
+	raw_from = request.GET.get("from")
+	if not raw_from:
+		return None
+	start = date.fromisoformat(raw_from)
+	raw_to = request.GET.get("to")
+	end = date.fromisoformat(raw_to) if raw_to else datetime.now(timezone.utc).date()
+	interval = request.GET.get("interval") or "auto"
+	if interval not in SERIES_INTERVALS or start > end:
+		raise ValueError("bad series range")
+	max_points = parse_max_points(request.GET.get("max_points"))
+	if interval == "auto":
+		# The coarsest interval still giving the budget, downsampled to it.
+		max_points = max_points or SERIES_RANGE_POINTS
+		interval = bars.pick_interval(start, end, max_points)
+	return SeriesRange(start=start, end=end, interval=interval, max_points=max_points)
+
+
+def _series_etag(request, instrument: str) -> str:
+	days, max_points = _series_params(request)
+	rng = _series_range(request)
+	params = rng.key() if rng is not None else f"{days}-{max_points or 0}"
+	return f'"{versions.series(instrument)[0]}-{params.replace(":", "-")}"'
+
+
+def _series_modified(request, instrument: str) -> datetime:
+	return versions.series(instrument)[1]
+
+
+# Most instruments one series_batch request may ask for.
+SERIES_BATCH_MAX_INSTRUMENTS = 20
+
+
+def _batch_instruments(request) -> list[str]:
+	raw = request.GET.get("instruments", "")
+	return sorted({i.strip() for i in raw.split(",") if i.strip()})
+
+
+def _series_batch_etag(request) -> str:
+	days, max_points = _series_params(request)
+	return f'"{versions.series_batch(_batch_instruments(request))[0]}-{days}-{max_points or 0}"'
+
+
+def _series_batch_modified(request) -> datetime:
+	return versions.series_batch(_batch_instruments(request))[1]
+
+
+def reject_invalid(check):
+	"""Answer requests ``check`` finds invalid before the caching decorators below run.
+
+	``check(request, *args, **kwargs)`` returns an error response or None. Errors
+	get no ETag or Last-Modified, and ``no-store`` instead of the public
+	Cache-Control, so neither browsers nor Caddy keep them.
+	"""
+
+	def rejected(request, *args, **kwargs):
+		response = check(request, *args, **kwargs)
+		if response is not None:
+			add_never_cache_headers(response)
+		return response
+
+	def decorator(view):
+		if asyncio.iscoroutinefunction(view):
+
+			@wraps(view)
+			async def async_inner(request, *args, **kwargs):
+				return rejected(request, *args, **kwargs) or await view(request, *args, **kwargs)
+
+			return async_inner
+
+		@wraps(view)
+		def inner(request, *args, **kwargs):
+			return rejected(request, *args, **kwargs) or view(request, *args, **kwargs)
+
+		return inner
+
+	return decorator
+
+
+def async_condition(*, etag_func, last_modified_func, **cache_control_kwargs):
+	"""``@cache_control`` + ``@condition`` for async views.
+
+	Django 4.2's decorators only wrap sync views. The validator functions are
+	the same sync ones, run off the event loop.
+	"""
+
+	def decorator(view):
+		@wraps(view)
+		async def inner(request, *args, **kwargs):
+			def validators():
+				return etag_func(request, *args, **kwargs), last_modified_func(request, *args, **kwargs)
+
+			etag, modified = await sync_to_async(validators, thread_sensitive=False)()
+			last_modified = int(modified.timestamp()) if modified else None
+			response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+			if response is None:
+				response = await view(request, *args, **kwargs)
+			if request.method in ("GET", "HEAD"):
+				if last_modified and not response.has_header("Last-Modified"):
+					response.headers["Last-Modified"] = http_date(last_modified)
+				if etag:
+					response.headers.setdefault("ETag", etag)
+			patch_cache_control(response, **cache_control_kwargs)
+			return response
+
+		return inner
+
+	return decorator
+
+
+def _snapshot_fallback() -> dict:
+	# For first boot / no persisted data yet
+	rows = get_market_snapshot()
+	return {
+		"as_of": rows[0].as_of.isoformat() if rows else None,
+		"rows": [
 			{
-				"as_of": as_of,
-				"rows": [
-					{
-						"category": r.category,
-						"name": r.name,
-						"symbol": r.instrument,
-						"price": r.price,
-						"change_pct": r.change_pct,
-					}
-					for r in rows
-				],
+				"category": r.category,
+				"name": r.name,
+				"symbol": r.symbol,
+				"price": r.price,
+				"change_pct": r.change_pct,
 			}
-		)
+			for r in rows
+		],
+	}
 
-	# Fallback for first boot / no persisted data yet
-	rows = get_market_snapshot()
-	return JsonResponse(
-		{
-			"as_of": rows[0].as_of.isoformat() if rows else None,
-			"rows": [
-				{
-					"category": r.category,
-					"name": r.name,
-					"symbol": r.symbol,
-					"price": r.price,
-					"change_pct": r.change_pct,
-				}
-				for r in rows
-			],
-		}
-	)
 
+@cache_control(**POLL_CACHE_CONTROL)
+@condition(etag_func=_latest_etag(payloads.SNAPSHOT), last_modified_func=_latest_modified(payloads.SNAPSHOT))
+def snapshot(request):
+	body = payloads.get(payloads.SNAPSHOT)
+	if body is not None:
+		return HttpResponse(body, content_type="application/json")
+	return JsonResponse(_snapshot_fallback())
 
-def crypto_chart(request, coin_id: str):
-	days = int(request.GET.get("days", "30"))
+
+@async_condition(
+	etag_func=_latest_etag(payloads.SNAPSHOT),
+	last_modified_func=_latest_modified(payloads.SNAPSHOT),
+	**POLL_CACHE_CONTROL,
+)
+async def snapshot_async(request):
+	body = await payloads.aget(payloads.SNAPSHOT)
+	if body is not None:
+		return HttpResponse(body, content_type="application/json")
+	return JsonResponse(await sync_to_async(_snapshot_fallback)())
+
+
+# Downsampled chart payloads are cached per (instrument, range, max_points).
+SERIES_CACHE_SECONDS = 60
+CRYPTO_CHART_CACHE_SECONDS = 60
+
+
+def _crypto_chart_params(request, coin_id: str) -> tuple[int, int | None, str]:
+	try:
+		days = int(request.GET.get("days", "30"))
+	except ValueError:
+		days = 30
 	days = max(1, min(days, 365))
-	series = fetch_coingecko_chart(coin_id=coin_id, days=days)
-	return JsonResponse(
-		{
-			"coin_id": coin_id,
-			"days": days,
-			"series": [{"t": ts, "p": price} for ts, price in series],
-		}
-	)
+	max_points = parse_max_points(request.GET.get("max_points"))
+	return days, max_points, f"markets:v1:crypto_chart:{coin_id}:{days}:{max_points or 0}"
 
 
-def ticker(request):
-	items = []
-	latest = list(MarketLatest.objects.all().order_by("category", "name"))
-	if latest:
-		for r in latest:
-			if r.price is None:
-				continue
-			items.append(
-				{
-					"category": r.category,
-					"name": r.name,
-					"symbol": r.instrument,
-					"price": r.price,
-					"change_pct": r.change_pct,
-				}
-			)
-		return JsonResponse(
-			{
-				"as_of": latest[0].as_of.isoformat() if latest[0].as_of else None,
-				"items": items,
-			}
-		)
+def _crypto_chart_payload(coin_id: str, days: int, max_points: int | None, chart) -> dict:
+	points, source = chart
+	return {
+		"coin_id": coin_id,
+		"days": days,
+		"max_points": max_points,
+		"source": source,
+		"series": [{"t": ts, "p": price} for ts, price in lttb(points, max_points)],
+	}
+
 
+def crypto_chart(request, coin_id: str):
+	days, max_points, cache_key = _crypto_chart_params(request, coin_id)
+	payload = cache.get(cache_key)
+	if payload is None:
+		try:
+			chart = get_crypto_chart(coin_id, days)
+		except Exception:
+			return JsonResponse({"error": "upstream unavailable"}, status=503)
+		if chart is None:
+			return JsonResponse({"error": "unknown coin"}, status=404)
+		payload = _crypto_chart_payload(coin_id, days, max_points, chart)
+		cache.set(cache_key, payload, timeout=CRYPTO_CHART_CACHE_SECONDS)
+	return JsonResponse(payload)
+
+
+async def crypto_chart_async(request, coin_id: str):
+	# A slow upstream only holds this coroutine, not a worker thread.
+	days, max_points, cache_key = _crypto_chart_params(request, coin_id)
+	payload = await cache.aget(cache_key)
+	if payload is None:
+		try:
+			chart = await aget_crypto_chart(coin_id, days)
+		except Exception:
+			return JsonResponse({"error": "upstream unavailable"}, status=503)
+		if chart is None:
+			return JsonResponse({"error": "unknown coin"}, status=404)
+		payload = _crypto_chart_payload(coin_id, days, max_points, chart)
+		await cache.aset(cache_key, payload, timeout=CRYPTO_CHART_CACHE_SECONDS)
+	return JsonResponse(payload)
+
+
+def _ticker_fallback() -> dict:
+	items = []
 	# Fallback: old on-demand snapshot + FX cache
 	rows = get_market_snapshot()
 	fx = get_fx_rates_to_uzs()
@@ -97,21 +302,230 @@ def ticker(request):
 		items.append({"category": "FX", "name": "EUR/UZS", "symbol": "EURUZS", "price": fx["EUR"], "change_pct": None})
 	if fx.get("RUB"):
 		items.append({"category": "FX", "name": "RUB/UZS", "symbol": "RUBUZS", "price": fx["RUB"], "change_pct": None})
-	return JsonResponse({"as_of": rows[0].as_of.isoformat() if rows else None, "items": items})
+	return {"as_of": rows[0].as_of.isoformat() if rows else None, "items": items}
+
+
+@cache_control(**POLL_CACHE_CONTROL)
+@condition(etag_func=_latest_etag(payloads.TICKER), last_modified_func=_latest_modified(payloads.TICKER))
+def ticker(request):
+	body = payloads.get(payloads.TICKER)
+	if body is not None:
+		return HttpResponse(body, content_type="application/json")
+	return JsonResponse(_ticker_fallback())
+
+
+@async_condition(
+	etag_func=_latest_etag(payloads.TICKER),
+	last_modified_func=_latest_modified(payloads.TICKER),
+	**POLL_CACHE_CONTROL,
+)
+async def ticker_async(request):
+	body = await payloads.aget(payloads.TICKER)
+	if body is not None:
+		return HttpResponse(body, content_type="application/json")
+	return JsonResponse(await sync_to_async(_ticker_fallback)())
+
+
+async def ticker_stream(request):
+	"""SSE stream of ticker deltas (``ticker`` events) and ``reset`` resync hints.
+
+	Only routed with MARKETS_ASYNC_VIEWS (ASGI workers); under WSGI each open
+	stream would pin a worker.
+	"""
+
+	try:
+		last_event_id = int(request.headers.get("Last-Event-ID", ""))
+	except ValueError:
+		last_event_id = None
+	response = StreamingHttpResponse(live.event_stream(last_event_id), content_type="text/event-stream")
+	response["Cache-Control"] = "no-cache"
+	# Tell buffering proxies to pass events straight through.
+	response["X-Accel-Buffering"] = "no"
+	return response
+
+
+SERIES_CACHE_CONTROL = {"public": True, "max_age": 300, "stale_while_revalidate": 600}
+
+
+def _series_cache_key(instrument: str, days: int, max_points: int | None, rng: SeriesRange | None) -> str:
+	# Keyed by data version so a bump never serves an old payload under a new ETag.
+	params = rng.key() if rng is not None else f"{days}:{max_points or 0}"
+	return f"markets:v1:series:{instrument}:{versions.series(instrument)[0]}:{params}"
+
+
+def _series_payload(instrument: str, days: int, max_points: int | None, history: packed.History | None) -> dict:
+	points = history.points() if history is not None else []
+	return {
+		"instrument": instrument,
+		"days": days,
+		"max_points": max_points,
+		"series": [{"t": t, "p": v} for t, v in lttb(points, max_points)],
+	}
 
 
+def _series_range_payload(instrument: str, rng: SeriesRange, data: packed.History | list[bars.Bar]) -> dict:
+	if rng.interval == bars.DAILY:
+		series = [{"t": t, "p": v} for t, v in lttb(data.points(), rng.max_points)]
+	else:
+		ts = [int(datetime.combine(b.start, datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000) for b in data]
+		keep = lttb_indices(ts, [b.close for b in data], rng.max_points) if rng.max_points else range(len(data))
+		series = [
+			{"t": ts[i], "p": data[i].close, "o": data[i].open, "h": data[i].high, "l": data[i].low} for i in keep
+		]
+	return {
+		"instrument": instrument,
+		"from": rng.start.isoformat(),
+		"to": rng.end.isoformat(),
+		"interval": rng.interval,
+		"max_points": rng.max_points,
+		"series": series,
+	}
+
+
+SERIES_RANGE_ERROR = {
+	"error": "from/to must be YYYY-MM-DD dates (from <= to); interval one of " + ", ".join(SERIES_INTERVALS),
+}
+
+
+def _series_error(request, instrument: str) -> JsonResponse | None:
+	try:
+		_series_range(request)
+	except ValueError:
+		return JsonResponse(SERIES_RANGE_ERROR, status=400)
+	return None
+
+
+@reject_invalid(_series_error)
+@cache_control(**SERIES_CACHE_CONTROL)
+@condition(etag_func=_series_etag, last_modified_func=_series_modified)
 def series(request, instrument: str):
-	days = int(request.GET.get("days", "30"))
-	days = max(1, min(days, 365))
-	qs = MarketPoint.objects.filter(instrument=instrument, value__isnull=False).order_by("-date")[:days]
-	points = list(reversed(list(qs)))
-	return JsonResponse(
-		{
-			"instrument": instrument,
-			"days": days,
-			"series": [
-				{"t": int(datetime.combine(p.date, datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000), "p": p.value}
-				for p in points
-			],
-		}
-	)
+	"""Latest ``days`` daily points, or ``from``/``to`` at a daily, weekly or monthly ``interval``."""
+
+	rng = _series_range(request)
+	days, max_points = _series_params(request)
+	cache_key = _series_cache_key(instrument, days, max_points, rng)
+	payload = cache.get(cache_key)
+	if payload is None:
+		if rng is None:
+			history = packed.read_last([instrument], days).get(instrument)
+			payload = _series_payload(instrument, days, max_points, history)
+		elif rng.interval == bars.DAILY:
+			payload = _series_range_payload(instrument, rng, packed.read_range(instrument, rng.start, rng.end))
+		else:
+			payload = _series_range_payload(
+				instrument, rng, bars.read_bars(instrument, rng.interval, rng.start, rng.end)
+			)
+		cache.set(cache_key, payload, timeout=SERIES_CACHE_SECONDS)
+	return JsonResponse(payload)
+
+
+@reject_invalid(_series_error)
+@async_condition(etag_func=_series_etag, last_modified_func=_series_modified, **SERIES_CACHE_CONTROL)
+async def series_async(request, instrument: str):
+	rng = _series_range(request)
+	days, max_points = _series_params(request)
+	cache_key = await sync_to_async(_series_cache_key, thread_sensitive=False)(instrument, days, max_points, rng)
+	payload = await cache.aget(cache_key)
+	if payload is None:
+		if rng is None:
+			history = (await packed.aread_last([instrument], days)).get(instrument)
+			payload = _series_payload(instrument, days, max_points, history)
+		elif rng.interval == bars.DAILY:
+			history = await packed.aread_range(instrument, rng.start, rng.end)
+			payload = _series_range_payload(instrument, rng, history)
+		else:
+			bar_rows = await bars.aread_bars(instrument, rng.interval, rng.start, rng.end)
+			payload = _series_range_payload(instrument, rng, bar_rows)
+		await cache.aset(cache_key, payload, timeout=SERIES_CACHE_SECONDS)
+	return JsonResponse(payload)
+
+
+def _batch_error(request) -> JsonResponse | None:
+	instruments = _batch_instruments(request)
+	if not instruments:
+		return JsonResponse({"error": "instruments is required"}, status=400)
+	if len(instruments) > SERIES_BATCH_MAX_INSTRUMENTS:
+		return JsonResponse({"error": f"at most {SERIES_BATCH_MAX_INSTRUMENTS} instruments"}, status=400)
+	return None
+
+
+def _series_batch_cache_key(instruments: list[str], days: int, max_points: int | None) -> str:
+	names = hashlib.sha1(",".join(instruments).encode("utf-8")).hexdigest()
+	return f"markets:v1:series_batch:{versions.series_batch(instruments)[0]}:{names}:{days}:{max_points or 0}"
+
+
+def _series_batch_payload(
+	instruments: list[str], days: int, max_points: int | None, histories: dict[str, packed.History]
+) -> dict:
+	series = {}
+	for instrument in instruments:
+		history = histories.get(instrument)
+		sampled = lttb(history.points(), max_points) if history is not None else []
+		series[instrument] = {"t": [t for t, _ in sampled], "p": [v for _, v in sampled]}
+	return {"instruments": instruments, "days": days, "max_points": max_points, "series": series}
+
+
+@reject_invalid(_batch_error)
+@cache_control(**SERIES_CACHE_CONTROL)
+@condition(etag_func=_series_batch_etag, last_modified_func=_series_batch_modified)
+def series_batch(request):
+	"""Several instruments' series in one columnar payload (``?instruments=BTC,ETH&days=30``)."""
+
+	instruments = _batch_instruments(request)
+	days, max_points = _series_params(request)
+	cache_key = _series_batch_cache_key(instruments, days, max_points)
+	payload = cache.get(cache_key)
+	if payload is None:
+		payload = _series_batch_payload(instruments, days, max_points, packed.read_last(instruments, days))
+		cache.set(cache_key, payload, timeout=SERIES_CACHE_SECONDS)
+	return JsonResponse(payload)
+
+
+@reject_invalid(_batch_error)
+@async_condition(etag_func=_series_batch_etag, last_modified_func=_series_batch_modified, **SERIES_CACHE_CONTROL)
+async def series_batch_async(request):
+	instruments = _batch_instruments(request)
+	days, max_points = _series_params(request)
+	cache_key = await sync_to_async(_series_batch_cache_key, thread_sensitive=False)(instruments, days, max_points)
+	payload = await cache.aget(cache_key)
+	if payload is None:
+		payload = _series_batch_payload(instruments, days, max_points, await packed.aread_last(instruments, days))
+		await cache.aset(cache_key, payload, timeout=SERIES_CACHE_SECONDS)
+	return JsonResponse(payload)
+
+
+# Longest window served per resolution, in milliseconds.
+TICK_MAX_SPAN_MS = {
+	tick_store.RESOLUTION_TICK: 2 * 86_400_000,
+	"1m": 7 * 86_400_000,
+	"5m": 31 * 86_400_000,
+	"1h": 366 * 86_400_000,
+}
+
+
+@require_feature(FEATURE_HIGH_FREQUENCY)
+def ticks(request, instrument: str):
+	resolution = request.GET.get("res", tick_store.RESOLUTION_TICK)
+	if resolution not in TICK_MAX_SPAN_MS:
+		return JsonResponse({"error": "unknown resolution"}, status=400)
+	try:
+		end = int(request.GET.get("to") or time.time() * 1000)
+		start = int(request.GET.get("from") or end - 86_400_000)
+	except ValueError:
+		return JsonResponse({"error": "from/to must be epoch milliseconds"}, status=400)
+	start = max(start, end - TICK_MAX_SPAN_MS[resolution])
+
+	data = tick_store.read_range(instrument, start, end, resolution=resolution)
+	payload = {"instrument": instrument, "resolution": resolution, "from": start, "to": end, "t": data.ts.tolist()}
+	if resolution == tick_store.RESOLUTION_TICK:
+		payload["p"] = data.columns[0].tolist()
+	else:
+		for key, col in zip(("o", "h", "l", "c"), data.columns):
+			payload[key] = col.tolist()
+	return JsonResponse(payload)
+
+
+@staff_member_required
+def cache_stats(request):
+	# Counters are per process; repeated calls may land on different workers.
+	return JsonResponse({"pid": os.getpid(), "caches": swr_cache_stats()})
@@ -9,7 +9,8 @@ import urllib.request
 
 import feedparser
 from django.conf import settings
-from django.core.cache import cache
+
+from markets.caching import get_stale_while_revalidate
 
 
 @dataclass(frozen=True)
@@ -41,11 +42,16 @@ def _fetch_url_bytes(url: str, timeout_seconds: int = 8) -> bytes:
 
 
 def fetch_news(limit: int = 40, cache_seconds: int = 300) -> list[NewsItem]:
-    cache_key = f"news:v1:limit={limit}"
-    cached = cache.get(cache_key)
-    if cached is not None:
-        return cached
+    return get_stale_while_revalidate(
+        f"news:v2:limit={limit}",
+        lambda: _fetch_news(limit),
+        soft_ttl=cache_seconds,
+        hard_ttl=cache_seconds * 12,
+        name="news",
+    )
 
+
+def _fetch_news(limit: int) -> list[NewsItem]:
     items: list[NewsItem] = []
 
     for src in getattr(settings, "NEWS_FEEDS", []):
@@ -81,7 +87,4 @@ def fetch_news(limit: int = 40, cache_seconds: int = 300) -> list[NewsItem]:
         return item.published_at or datetime.min.replace(tzinfo=timezone.utc)
 
     items.sort(key=sort_key, reverse=True)
-    items = items[:limit]
-
-    cache.set(cache_key, items, timeout=cache_seconds)
-    return items
+    return items[:limit]
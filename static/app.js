@@ -117,6 +117,33 @@
     return parts.join('<span class="uz-ticker-sep">•</span>');
   }
 
+  // Current ticker items, kept so live deltas can be merged in.
+  let tickerItems = [];
+
+  function renderTicker(items) {
+    const el = document.getElementById('uzTicker');
+    const track = document.getElementById('uzTickerTrack');
+    if (!el || !track) return;
+
+    const row = buildTickerRowHtml(items);
+    if (!row) {
+      el.style.display = 'none';
+      return;
+    }
+    track.innerHTML = `<div class="uz-ticker-seq">${row}</div><div class="uz-ticker-seq" aria-hidden="true">${row}</div>`;
+    el.style.display = '';
+  }
+
+  function applyTickerDelta(delta) {
+    const bySymbol = new Map(tickerItems.map((it) => [it.symbol, it]));
+    (delta.removed || []).forEach((sym) => bySymbol.delete(sym));
+    (delta.items || []).forEach((it) => bySymbol.set(it.symbol, it));
+    tickerItems = Array.from(bySymbol.values()).sort((a, b) =>
+      (a.category || '').localeCompare(b.category || '') || (a.name || '').localeCompare(b.name || '')
+    );
+    renderTicker(tickerItems);
+  }
+
   async function refreshTicker() {
     const el = document.getElementById('uzTicker');
     const track = document.getElementById('uzTickerTrack');
@@ -128,7 +155,8 @@
       const resp = await fetch('/api/markets/ticker/', { headers: { 'Accept': 'application/json' } });
       if (!resp.ok) throw new Error('bad status');
       const data = await resp.json();
-      const row = buildTickerRowHtml(data.items);
+      tickerItems = data.items || [];
+      const row = buildTickerRowHtml(tickerItems);
       if (!row) {
         el.style.display = 'none';
         return;
@@ -147,10 +175,29 @@
     }
   }
 
+  function startTicker() {
+    refreshTicker();
+    // The stream is only served by ASGI deployments (data-ticker-stream on <body>).
+    const live = document.body.dataset.tickerStream === '1';
+    if (!live || !('EventSource' in window) || !document.getElementById('uzTicker')) {
+      window.setInterval(refreshTicker, 5 * 60 * 1000);
+      return;
+    }
+    // Live deltas; EventSource reconnects on its own and resumes via Last-Event-ID.
+    const stream = new EventSource('/api/markets/ticker/stream/');
+    stream.addEventListener('ticker', (ev) => {
+      try {
+        applyTickerDelta(JSON.parse(ev.data));
+      } catch (e) {
+        refreshTicker();
+      }
+    });
+    stream.addEventListener('reset', refreshTicker);
+  }
+
   if (document.readyState === 'loading') {
-    document.addEventListener('DOMContentLoaded', refreshTicker);
+    document.addEventListener('DOMContentLoaded', startTicker);
   } else {
-    refreshTicker();
+    startTicker();
   }
-  window.setInterval(refreshTicker, 5 * 60 * 1000);
 })();